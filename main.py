@@ -4,7 +4,7 @@ import os.path
 import aiohttp
 
 from utils.websocket import WebSocket
-from utils.model import database, Task
+from utils.model import database, Task, TaskRun
 from utils.logger import logger
 
 ws: WebSocket
@@ -34,5 +34,5 @@ if __name__ == '__main__':
         """)
     if not os.path.exists('data'):
         os.mkdir('data')
-    database.create_tables([Task])
+    database.create_tables([Task, TaskRun])
     asyncio.run(main())
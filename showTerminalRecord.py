@@ -1,10 +1,41 @@
+import argparse
 import os
+import sys
+import time
 
-session = input("session_id:")
+from utils.terminalRecord import TerminalRecordReader, RECORD_SUFFIX
 
-with open(str(os.path.join(os.getcwd(), f'terminal_record/{session}.txt')), 'r+') as fd:
-    while True:
-        text = fd.read(1024)
-        if text == "":
-            break
-        print(text, end='')
\ No newline at end of file
+parser = argparse.ArgumentParser(description="回放终端录像")
+parser.add_argument("session", nargs="?", help="终端会话uuid")
+parser.add_argument("--path", default=os.path.join(os.getcwd(), "data", "terminal_record"), help="录像保存目录")
+parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示不等待直接输出")
+parser.add_argument("--seek", type=float, default=0.0, help="从第几秒开始回放")
+args = parser.parse_args()
+
+session = args.session or input("session_id:")
+path = os.path.join(args.path, session)
+out = sys.stdout.buffer
+
+if not os.path.exists(path + RECORD_SUFFIX):
+    # 旧版录像为原始输出，没有时间信息
+    with open(path, 'rb') as fd:
+        while True:
+            data = fd.read(65536)
+            if not data:
+                break
+            out.write(data)
+    out.flush()
+    sys.exit(0)
+
+reader = TerminalRecordReader(path)
+print(f"录像开始时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reader.start_time))} "
+      f"时长: {reader.duration:.1f}s", file=sys.stderr)
+begin = time.monotonic()
+for offset, data in reader.chunks(args.seek):
+    if args.speed > 0:
+        delay = (offset - args.seek) / args.speed - (time.monotonic() - begin)
+        if delay > 0:
+            time.sleep(delay)
+    out.write(data)
+    out.flush()
+reader.close()
@@ -0,0 +1,41 @@
+"""
+节点占用采样耗时对比
+
+python tests/bench_usage_sampler.py [次数]
+"""
+import os
+import sys
+import timeit
+
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.procfs import PsutilUsageSource, ProcfsUsageSource
+from utils.usageSampler import UsageSampler
+
+
+def legacy_tick():
+    """原实现每次上报调用的 psutil 接口"""
+    psutil.cpu_percent()
+    psutil.cpu_percent(percpu=True)
+    psutil.virtual_memory()
+    psutil.swap_memory()
+    psutil.disk_io_counters()
+    psutil.net_io_counters()
+    psutil.net_io_counters(pernic=True)
+
+
+def bench(name, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{name:<28}{best / number * 1e6:>10.1f} us/tick")
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    bench("legacy psutil calls", legacy_tick, number)
+    bench("psutil source", PsutilUsageSource().read, number)
+    bench("UsageSampler(psutil)", UsageSampler(fast_path=False).sample, number)
+    if psutil.LINUX:
+        bench("procfs source", ProcfsUsageSource().read, number)
+        bench("UsageSampler(procfs)", UsageSampler(fast_path=True).sample, number)
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+
+# 以仓库根目录导入 utils，并在临时目录中运行，避免日志与配置文件写入仓库
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="servermanager-node-tests-"))
+# 与 WebSocket 初始化时一致创建数据目录
+os.mkdir("data")
+
+# 首次加载配置时生成默认配置文件后退出，预先生成
+from utils.config import config  # noqa: E402
+
+try:
+    config()
+except SystemExit:
+    pass
+
+# 与 main.py 一致先导入 websocket，避免单独导入 tty/executeUtils 时循环导入
+import utils.websocket  # noqa: E402, F401
+
+# 以下为手动运行的调试脚本，导入时即执行，不作为测试收集
+collect_ignore = [
+    "bench_usage_sampler.py",
+    "test_func.py",
+    "test_platform.py",
+    "test_psutil.py",
+    "test_subprocess.py",
+    "test_terminal.py",
+    "test_ws_server.py",
+]
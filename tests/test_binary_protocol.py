@@ -0,0 +1,67 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+import utils.binaryProtocol as binaryProtocol
+import utils.websocket as websocket
+
+
+def test_session_frame_round_trip():
+    session_id = str(uuid.uuid1())
+    payload = "ls -la\r\n中文".encode("utf-8")
+    frame = binaryProtocol.pack_session_frame(binaryProtocol.FRAME_TERMINAL_OUTPUT, session_id, payload)
+    # | 1 byte 帧类型 | 16 bytes 会话uuid | 原始字节数据 |
+    assert frame[0] == binaryProtocol.FRAME_TERMINAL_OUTPUT
+    assert frame[1:1 + binaryProtocol.SESSION_ID_SIZE] == uuid.UUID(session_id).bytes
+    assert len(frame) == 1 + binaryProtocol.SESSION_ID_SIZE + len(payload)
+    assert binaryProtocol.get_frame_type(frame) == binaryProtocol.FRAME_TERMINAL_OUTPUT
+    assert binaryProtocol.unpack_session_frame(frame) == (session_id, payload)
+    # 数据可以为空，也可以来自 memoryview
+    frame = binaryProtocol.pack_session_frame(binaryProtocol.FRAME_TERMINAL_INPUT, session_id, b"")
+    assert binaryProtocol.unpack_session_frame(memoryview(frame)) == (session_id, b"")
+
+
+def test_invalid_frames():
+    with pytest.raises(ValueError):
+        binaryProtocol.get_frame_type(b"")
+    with pytest.raises(ValueError):
+        binaryProtocol.unpack_session_frame(bytes((binaryProtocol.FRAME_TERMINAL_INPUT,)) + b"\x00" * 15)
+    with pytest.raises(ValueError):
+        binaryProtocol.pack_session_frame(binaryProtocol.FRAME_TERMINAL_OUTPUT, "not-a-uuid", b"")
+
+
+class FakeBinaryReceiver:
+    """模拟 aiohttp 连接，依次收到给定的二进制消息后关闭"""
+
+    def __init__(self, frames: list[bytes]):
+        self.closed = False
+        self.frames = list(frames)
+
+    async def receive(self):
+        frame = self.frames.pop(0)
+        self.closed = not self.frames
+        return SimpleNamespace(type=web.WSMsgType.BINARY, data=frame)
+
+
+def test_terminal_input_frame_is_dispatched():
+    session_id = str(uuid.uuid1())
+    commands = []
+    frames = [
+        b"",
+        bytes((0x7F,)) + b"unknown",
+        bytes((binaryProtocol.FRAME_TERMINAL_INPUT,)) + b"short",
+        binaryProtocol.pack_session_frame(binaryProtocol.FRAME_TERMINAL_INPUT, session_id, b"\x03"),
+    ]
+
+    async def run():
+        ws = websocket.WebSocket(None)
+        ws._WebSocket__tty_service = SimpleNamespace(send_command=lambda *args: commands.append(args))
+        ws._WebSocket__ws = FakeBinaryReceiver(frames)
+        # 无效帧只记录错误，不影响后续帧的处理
+        await ws.message_handler()
+
+    asyncio.run(run())
+    assert commands == [(session_id, b"\x03")]
@@ -0,0 +1,144 @@
+import pytest
+
+import utils.cgroup as cgroup
+from utils.cgroup import create_cgroup_samplers
+
+CONTAINER_ID = "0123456789abcdef" * 4
+
+
+class FakeCgroupfs:
+    """tmp_path 下的 cgroupfs、挂载表与 /proc/self/cgroup"""
+
+    def __init__(self, tmp_path, monkeypatch):
+        self.root = tmp_path
+        self.mountinfo = []
+        self.memberships = []
+        (tmp_path / "proc" / "pressure").mkdir(parents=True)
+        monkeypatch.setattr(cgroup, "MOUNTINFO_PATH", str(tmp_path / "proc" / "mountinfo"))
+        monkeypatch.setattr(cgroup, "CGROUP_MEMBERSHIP_PATH", str(tmp_path / "proc" / "cgroup"))
+        monkeypatch.setattr(cgroup, "PRESSURE_PATH", str(tmp_path / "proc" / "pressure"))
+
+    def mount(self, name: str, fs_type: str, options: str = "rw", root: str = "/") -> str:
+        mount_point = self.root / "sys" / "fs" / "cgroup" / name
+        mount_point.mkdir(parents=True, exist_ok=True)
+        self.mountinfo.append(
+            f"{30 + len(self.mountinfo)} 23 0:{26 + len(self.mountinfo)} {root} {mount_point} rw,nosuid "
+            f"shared:9 - {fs_type} cgroup {options}"
+        )
+        return str(mount_point)
+
+    def member(self, hierarchy_id: int, controllers: str, path: str):
+        self.memberships.append(f"{hierarchy_id}:{controllers}:{path}")
+
+    def write(self, directory: str, **files: str):
+        for name, content in files.items():
+            path = self.root / directory / name.replace("__", ".")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content + "\n")
+
+    def save(self):
+        (self.root / "proc" / "mountinfo").write_text("\n".join(self.mountinfo) + "\n")
+        (self.root / "proc" / "cgroup").write_text("\n".join(self.memberships) + "\n")
+
+
+@pytest.fixture
+def cgroupfs(tmp_path, monkeypatch):
+    return FakeCgroupfs(tmp_path, monkeypatch)
+
+
+PRESSURE = "some avg10=1.50 avg60=0.75 avg300=0.10 total=123\nfull avg10=0.50 avg60=0.25 avg300=0.00 total=45"
+
+
+def test_v2_limits_and_usage(cgroupfs):
+    cgroupfs.mount("unified", "cgroup2", "rw,nsdelegate")
+    cgroupfs.member(0, "", "/system.slice/node.service")
+    app = "sys/fs/cgroup/unified/system.slice/node.service"
+    cgroupfs.write(
+        app, cgroup__controllers="cpu io memory pids", cpu__max="150000 100000", memory__max="1073741824",
+        memory__current="600000000", memory__stat="anon 400000000\ninactive_file 100000000",
+        cpu__stat="usage_usec 5000000\nuser_usec 4000000", cpu__pressure=PRESSURE
+    )
+    cgroupfs.write("proc/pressure", memory="some avg10=9.00 avg60=9.00 avg300=9.00 total=1")
+    cgroupfs.save()
+    sampler, containers = create_cgroup_samplers()
+    assert containers is None
+    assert sampler.version == 2
+    assert sampler.limits() == {"version": 2, "cpu_quota": 1.5, "memory_limit": 1073741824}
+    sample = sampler.sample()
+    assert sample["memory_usage"] == 500000000
+    assert sample["cpu_usage"] is None
+    # cgroup 级别的 PSI 优先，缺少时使用全局 PSI
+    assert sample["pressure"]["cpu"]["some"] == {"avg10": 1.5, "avg60": 0.75, "avg300": 0.1}
+    assert sample["pressure"]["memory"]["some"]["avg10"] == 9.0
+    assert "io" not in sample["pressure"]
+
+    cgroupfs.write(app, cpu__max="max 100000", memory__max="max")
+    assert (sampler.cpu_quota(), sampler.memory_limit()) == (None, None)
+    # 只读取到 quota 时同样视为未限制
+    cgroupfs.write(app, cpu__max="max")
+    assert sampler.cpu_quota() is None
+
+
+def test_v1_limits_and_usage(cgroupfs):
+    cgroupfs.mount("cpu,cpuacct", "cgroup", "rw,cpu,cpuacct")
+    cgroupfs.mount("memory", "cgroup", "rw,memory")
+    cgroupfs.member(4, "cpu,cpuacct", f"/docker/{CONTAINER_ID}")
+    cgroupfs.member(5, "memory", f"/docker/{CONTAINER_ID}")
+    cgroupfs.member(1, "name=systemd", f"/docker/{CONTAINER_ID}")
+    cgroupfs.write(
+        f"sys/fs/cgroup/cpu,cpuacct/docker/{CONTAINER_ID}",
+        cpu__cfs_quota_us="50000", cpu__cfs_period_us="100000", cpuacct__usage="1000000000"
+    )
+    cgroupfs.write(
+        f"sys/fs/cgroup/memory/docker/{CONTAINER_ID}",
+        memory__limit_in_bytes="9223372036854771712", memory__usage_in_bytes="300",
+        memory__stat="cache 200\ntotal_inactive_file 100"
+    )
+    cgroupfs.save()
+    sampler, containers = create_cgroup_samplers(container_stats=True)
+    assert sampler.version == 1
+    # 未设置限制时 v1 为接近 2^63 的值
+    assert sampler.limits() == {"version": 1, "cpu_quota": 0.5, "memory_limit": None}
+    assert sampler.memory_usage() == 200
+    cgroupfs.write(f"sys/fs/cgroup/cpu,cpuacct/docker/{CONTAINER_ID}", cpu__cfs_quota_us="-1")
+    assert sampler.cpu_quota() is None
+
+    # 从层级根目录扫描到容器
+    assert [item["id"] for item in containers.sample()] == [CONTAINER_ID[:12]]
+
+
+def test_hybrid_uses_v1_controllers_and_v2_pressure(cgroupfs):
+    cgroupfs.mount("memory", "cgroup", "rw,memory")
+    cgroupfs.mount("unified", "cgroup2", "rw,nsdelegate")
+    cgroupfs.member(5, "memory", "/user.slice")
+    cgroupfs.member(0, "", "/user.slice")
+    cgroupfs.write("sys/fs/cgroup/memory/user.slice", memory__limit_in_bytes="2147483648")
+    # 混合模式下 v2 层级未启用控制器
+    cgroupfs.write("sys/fs/cgroup/unified/user.slice", cgroup__controllers="", io__pressure=PRESSURE)
+    cgroupfs.save()
+    sampler, _ = create_cgroup_samplers()
+    assert sampler.version == 1
+    assert sampler.memory_limit() == 2147483648
+    assert sampler.cpu_quota() is None
+    assert sampler.pressure()["io"]["full"]["avg10"] == 0.5
+
+
+def test_container_namespace_mounts_own_cgroup(cgroupfs):
+    # 容器内只挂载了自身 cgroup，挂载根路径与成员路径相同
+    cgroupfs.mount("", "cgroup2", "rw", root=f"/docker/{CONTAINER_ID}")
+    cgroupfs.member(0, "", f"/docker/{CONTAINER_ID}")
+    cgroupfs.write("sys/fs/cgroup", cgroup__controllers="cpu memory", cpu__max="200000 100000")
+    cgroupfs.save()
+    sampler, _ = create_cgroup_samplers()
+    assert (sampler.version, sampler.cpu_quota()) == (2, 2.0)
+
+
+def test_no_cgroup_detected(cgroupfs):
+    cgroupfs.save()
+    assert create_cgroup_samplers() == (None, None)
+    # 只有 v2 层级且未启用任何控制器
+    cgroupfs.mount("unified", "cgroup2")
+    cgroupfs.member(0, "", "/")
+    cgroupfs.write("sys/fs/cgroup/unified", cgroup__controllers="")
+    cgroupfs.save()
+    assert create_cgroup_samplers() == (None, None)
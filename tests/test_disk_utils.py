@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import utils.diskUtils as diskUtils
+from utils.diskUtils import DiskPartitionCache
+
+
+def partition(device: str, mountpoint: str, fstype: str = "ext4") -> SimpleNamespace:
+    return SimpleNamespace(device=device, mountpoint=mountpoint, fstype=fstype)
+
+
+@pytest.fixture
+def fake_disks(monkeypatch):
+    """替换分区列表与 statvfs 调用，usage 中的值为可调用对象时由其返回用量"""
+    disks = SimpleNamespace(partitions=[], usage={}, calls=[])
+
+    def get_usage(mountpoint: str):
+        disks.calls.append(mountpoint)
+        value = disks.usage[mountpoint]
+        return value() if callable(value) else value
+
+    monkeypatch.setattr(diskUtils.psutil, "disk_partitions", lambda: list(disks.partitions))
+    monkeypatch.setattr(DiskPartitionCache, "_DiskPartitionCache__get_usage", staticmethod(get_usage))
+    return disks
+
+
+def usage_of(disk_list: list[dict]) -> dict:
+    return {item["mount_point"]: (item["total"], item["used"]) for item in disk_list}
+
+
+def test_ignore_filters_and_dedupe(fake_disks):
+    fake_disks.partitions = [
+        partition("/dev/sda1", "/"),
+        partition("tmpfs", "/dev/shm", "tmpfs"),
+        partition("overlay", "/var/lib/docker/overlay2/abc/merged", "xfs"),
+        partition("/dev/sdb1", "/run/media/usb"),
+        partition("/dev/sda1", "/home"),
+        partition("/dev/sdc1", "/data"),
+    ]
+    cache = DiskPartitionCache()
+    assert [item.mountpoint for item in cache.partitions()] == ["/", "/data"]
+
+    cache = DiskPartitionCache({"ignore_fs_types": [], "ignore_mount_prefixes": ["/data/"], "dedupe_device": False})
+    # 挂载点补全末尾的 / 后匹配，/data/ 忽略 /data 而不会忽略 /database
+    fake_disks.partitions.append(partition("/dev/sdd1", "/database"))
+    assert [item.mountpoint for item in cache.partitions()] == [
+        "/", "/dev/shm", "/var/lib/docker/overlay2/abc/merged", "/run/media/usb", "/home", "/database"
+    ]
+
+
+def test_hung_mount_keeps_last_value_and_is_not_resubmitted(fake_disks):
+    release = threading.Event()
+    fake_disks.partitions = [partition("/dev/sda1", "/"), partition("nfs:/share", "/mnt/nfs", "nfs")]
+    fake_disks.usage = {"/": (100, 40), "/mnt/nfs": (200, 50)}
+    cache = DiskPartitionCache({"usage_timeout": 0.2})
+
+    async def run():
+        assert usage_of(await cache.get_disk_list()) == {"/": (100, 40), "/mnt/nfs": (200, 50)}
+        fake_disks.usage["/mnt/nfs"] = lambda: release.wait(5) and (200, 60)
+        # 超时后沿用上一次的用量，调用返回前不再提交
+        assert usage_of(await cache.get_disk_list())["/mnt/nfs"] == (200, 50)
+        assert usage_of(await cache.get_disk_list())["/mnt/nfs"] == (200, 50)
+        assert fake_disks.calls.count("/mnt/nfs") == 2
+        release.set()
+        await asyncio.sleep(0.1)
+        await cache.get_disk_list()
+        fake_disks.usage["/mnt/nfs"] = (200, 70)
+        assert usage_of(await cache.get_disk_list())["/mnt/nfs"] == (200, 70)
+
+    asyncio.run(run())
+
+
+def test_first_call_timeout_is_unknown(fake_disks):
+    release = threading.Event()
+    fake_disks.partitions = [partition("nfs:/share", "/mnt/nfs", "nfs")]
+    fake_disks.usage = {"/mnt/nfs": lambda: release.wait(5) and (200, 50)}
+    cache = DiskPartitionCache({"usage_timeout": 0.1})
+
+    async def run():
+        # 从未获取到用量时上报未知，而不是 0
+        assert usage_of(await cache.get_disk_list()) == {"/mnt/nfs": (None, None)}
+        release.set()
+
+    asyncio.run(run())
+
+
+def test_failed_call_keeps_last_value(fake_disks):
+    def fail():
+        raise OSError("stale file handle")
+
+    fake_disks.partitions = [partition("/dev/sda1", "/"), partition("nfs:/share", "/mnt/nfs", "nfs")]
+    fake_disks.usage = {"/": (100, 40), "/mnt/nfs": fail}
+    cache = DiskPartitionCache()
+
+    async def run():
+        assert usage_of(await cache.get_disk_list()) == {"/": (100, 40), "/mnt/nfs": (None, None)}
+        fake_disks.usage = {"/": fail, "/mnt/nfs": fail}
+        assert usage_of(await cache.get_disk_list()) == {"/": (100, 40), "/mnt/nfs": (None, None)}
+
+    asyncio.run(run())
+
+
+def test_hung_mounts_do_not_starve_others(fake_disks):
+    release = threading.Event()
+    fake_disks.partitions = [partition(f"nfs:/share{index}", f"/mnt/nfs{index}", "nfs") for index in range(6)]
+    fake_disks.partitions.append(partition("/dev/sda1", "/"))
+    fake_disks.usage = {item.mountpoint: lambda: release.wait(5) and (1, 1) for item in fake_disks.partitions}
+    fake_disks.usage["/"] = (100, 40)
+    cache = DiskPartitionCache({"usage_timeout": 0.3})
+
+    async def run():
+        # 线程池大小与分区数一致，卡住的挂载点不会让其余挂载点排队超时
+        assert usage_of(await cache.get_disk_list())["/"] == (100, 40)
+        # 分区增加后扩大线程池，新分区不会等待旧线程池中卡住的调用
+        fake_disks.partitions.append(partition("/dev/sdb1", "/data"))
+        fake_disks.usage["/data"] = (300, 10)
+        cache._DiskPartitionCache__refresh_time = 0
+        assert usage_of(await cache.get_disk_list())["/data"] == (300, 10)
+        release.set()
+
+    asyncio.run(run())
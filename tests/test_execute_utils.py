@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+
+# 与 main.py 一致先导入 websocket，避免循环导入
+import utils.websocket  # noqa: F401
+from utils.executeUtils import executeUtils
+
+
+class FakeWebSocket:
+    def __init__(self, path):
+        self.path = path
+        self.messages = []
+
+    def get_base_data_save_path(self):
+        return self.path
+
+    def send_json_nowait(self, data: dict):
+        self.messages.append(data)
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def actions(ws: FakeWebSocket) -> list[str]:
+    return [message['action'] for message in ws.messages]
+
+
+def test_close_releases_reader_after_running_commands(tmp_path):
+    ws = FakeWebSocket(str(tmp_path))
+    threads = threading.active_count()
+    fds = len(os.listdir('/proc/self/fd'))
+    for index in range(5):
+        service = executeUtils(ws)
+        service.executeShellCommand(f"run-{index}", str(tmp_path), "sleep 0.2; echo done")
+        # 断开连接时命令仍在运行，结束后才释放
+        service.close()
+        assert wait_for(lambda: actions(ws).count('execute:stop') == index + 1)
+    assert wait_for(lambda: threading.active_count() <= threads)
+    assert len(os.listdir('/proc/self/fd')) == fds
+    assert actions(ws).count('execute:output') == 5
+
+
+def test_close_without_commands(tmp_path):
+    threads = threading.active_count()
+    executeUtils(FakeWebSocket(str(tmp_path))).close()
+    assert threading.active_count() == threads
+
+
+def test_finished_commands_release_records(tmp_path):
+    ws = FakeWebSocket(str(tmp_path))
+    service = executeUtils(ws)
+    for index in range(3):
+        service.executeShellCommand(f"run-{index}", str(tmp_path), "echo done")
+    assert wait_for(lambda: actions(ws).count('execute:stop') == 3)
+    assert service._executeUtils__record_fd == {}
+    service.close()
+
+
+def test_refuse_commands_after_close(tmp_path):
+    ws = FakeWebSocket(str(tmp_path))
+    threads = threading.active_count()
+    service = executeUtils(ws)
+    service.close()
+    # 关闭后的命令不会创建没有输出读取器的进程
+    service.executeShellCommand("late", str(tmp_path), "echo done")
+    assert service._executeUtils__process_list == {}
+    assert 'execute:stop' not in actions(ws)
+    assert threading.active_count() == threads
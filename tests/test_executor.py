@@ -0,0 +1,137 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+import utils.node as node
+import utils.websocket as websocket
+from utils.executor import BlockingExecutor, ExecutorBusyError, LoopLagMonitor
+
+
+def test_blocking_executor_rejects_when_full():
+    executor = BlockingExecutor(max_workers=1, max_queue=1, name="TestBlocking")
+    release = threading.Event()
+    running = executor.submit(release.wait, 5)
+    queued = executor.submit(lambda: "queued")
+    # 执行中与排队的任务总数已达上限
+    with pytest.raises(ExecutorBusyError):
+        executor.submit(lambda: "rejected")
+    release.set()
+    assert running.result(5) is True
+    assert queued.result(5) == "queued"
+    # 释放槽位后可以再次提交
+    assert executor.submit(lambda: 1).result(5) == 1
+    executor.close()
+    metrics = executor.metrics()
+    assert (metrics["completed"], metrics["rejected"], metrics["failed"]) == (3, 1, 0)
+    assert (metrics["active"], metrics["queued"]) == (0, 0)
+
+
+def test_blocking_executor_metrics():
+    executor = BlockingExecutor(max_workers=2, max_queue=4, name="TestBlocking")
+
+    def fail():
+        raise ValueError("failed")
+
+    async def run():
+        assert await executor.run(time.sleep, 0.05) is None
+        with pytest.raises(ValueError):
+            await executor.run(fail)
+
+    asyncio.run(run())
+    metrics = executor.metrics()
+    assert (metrics["workers"], metrics["max_queue"]) == (2, 4)
+    assert (metrics["completed"], metrics["failed"]) == (2, 1)
+    assert metrics["max_run_time"] >= 50
+    assert metrics["avg_run_time"] >= 25
+    # 最大执行/等待时间在读取后重置
+    assert executor.metrics()["max_run_time"] == 0
+    executor.close()
+
+
+def test_loop_lag_monitor_detects_blocking():
+    async def run():
+        monitor = LoopLagMonitor(threshold=0.05)
+        monitor.start()
+        await asyncio.sleep(0.15)
+        # 阻塞事件循环
+        time.sleep(0.2)
+        await asyncio.sleep(0.15)
+        monitor.stop()
+        return monitor.metrics(), monitor.metrics()
+
+    metrics, after = asyncio.run(run())
+    assert metrics["blocked_count"] == 1
+    assert metrics["max"] >= 100
+    assert after["max"] == 0
+    assert after["blocked_count"] == 1
+
+
+def test_busy_usage_sample_is_skipped(monkeypatch):
+    async def busy(fn, *args, **kwargs):
+        raise ExecutorBusyError("busy")
+
+    monkeypatch.setattr(node, "run_blocking", busy)
+    assert asyncio.run(node.collect_node_usage()) is None
+
+
+def test_busy_optional_sections_are_omitted(monkeypatch):
+    class Sampler:
+        def sample(self):
+            return {"disk": {}}
+
+    class Busy:
+        def sample(self):
+            raise AssertionError("不应执行")
+
+    async def run_blocking(fn, *args, **kwargs):
+        if getattr(fn, '__self__', None).__class__ is Busy:
+            raise ExecutorBusyError("busy")
+        return fn(*args, **kwargs)
+
+    async def disk_list():
+        return []
+
+    monkeypatch.setattr(node, "run_blocking", run_blocking)
+    monkeypatch.setattr(node, "get_disk_list", disk_list)
+    monkeypatch.setattr(node, "usage_sampler", Sampler())
+    monkeypatch.setattr(node, "cgroup_sampler", Busy())
+    node_usage = asyncio.run(node.collect_node_usage())
+    assert node_usage["disk"]["partition_list"] == []
+    assert "cgroup" not in node_usage
+    assert "agent" in node_usage
+
+
+class FakeReceiver:
+    """模拟 aiohttp 连接，收到一条消息后关闭"""
+
+    def __init__(self, message: dict):
+        self.closed = False
+        self.message = message
+
+    async def receive(self):
+        self.closed = True
+        return SimpleNamespace(type=web.WSMsgType.TEXT, data=json.dumps(self.message))
+
+
+def test_busy_action_replies_to_panel(monkeypatch):
+    async def busy(fn, *args, **kwargs):
+        raise ExecutorBusyError("busy")
+
+    monkeypatch.setattr(websocket, "run_blocking", busy)
+
+    async def run():
+        ws = websocket.WebSocket(None)
+        ws._WebSocket__loop = asyncio.get_running_loop()
+        ws._WebSocket__send_queue = asyncio.Queue()
+        ws._WebSocket__config = lambda: {"safe": {"execute_command": True}}
+        ws._WebSocket__shell_task_service = SimpleNamespace(add_task=lambda data: None)
+        ws._WebSocket__ws = FakeReceiver({'action': "task:add", 'data': {"uuid": "task", "shell": "ls"}})
+        await ws.message_handler()
+        return ws._WebSocket__send_queue.get_nowait()[0]
+
+    assert asyncio.run(run()) == {'action': 'node:busy', 'data': {'request': "task:add", 'uuid': "task"}}
@@ -0,0 +1,44 @@
+import threading
+import time
+
+from utils.outputBatcher import OutputBatcher
+
+
+def test_batches_of_one_key_keep_order():
+    sent = []
+    active = set()
+    overlapped = []
+    lock = threading.Lock()
+
+    def send(meta, entries):
+        with lock:
+            if meta['key'] in active:
+                overlapped.append(meta['key'])
+            active.add(meta['key'])
+        # 模拟发送较慢，使定时发送与批次满发送重叠
+        time.sleep(0.002)
+        with lock:
+            active.discard(meta['key'])
+            sent.append((meta['key'], [int(line) for _, line in entries]))
+
+    batcher = OutputBatcher(send, window=0.001, max_latency=0.002, max_bytes=8)
+    for key in ("a", "b"):
+        for index in range(300):
+            batcher.add(key, {'key': key}, [str(index)])
+            if index % 7 == 0:
+                time.sleep(0.001)
+        batcher.flush(key)
+    batcher.close()
+    assert not overlapped
+    for key in ("a", "b"):
+        lines = [line for item_key, entries in sent if item_key == key for line in entries]
+        assert lines == list(range(300))
+
+
+def test_flush_sends_pending_lines():
+    sent = []
+    batcher = OutputBatcher(lambda meta, entries: sent.append(entries), window=10, max_latency=10)
+    batcher.add("a", {}, ["x", "y"], timestamp=1.0)
+    batcher.flush("a")
+    assert sent == [[(1.0, "x"), (1.0, "y")]]
+    batcher.close()
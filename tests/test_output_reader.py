@@ -0,0 +1,80 @@
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+
+from utils.outputReader import OutputReader
+
+
+def open_fds() -> int:
+    return len(os.listdir('/proc/self/fd'))
+
+
+def wait_threads(count: int, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while threading.active_count() > count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return threading.active_count()
+
+
+def test_read_lines_and_exit():
+    lines = []
+    exited = threading.Event()
+    reader = OutputReader(lambda key, stream, items: lines.extend((stream, item) for item in items),
+                          lambda key, process: exited.set())
+    process = subprocess.Popen(['sh', '-c', 'echo a; echo b; echo c >&2; printf d'],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    reader.add('key', process)
+    assert exited.wait(5)
+    reader.close()
+    assert [item for item in lines if item[0] == 'stdout'] == [('stdout', b'a'), ('stdout', b'b'), ('stdout', b'd')]
+    assert ('stderr', b'c') in lines
+    assert process.returncode == 0
+
+
+def test_close_releases_fds_and_thread():
+    fds = open_fds()
+    threads = threading.active_count()
+    for _ in range(10):
+        exited = threading.Event()
+        reader = OutputReader(lambda *args: None, lambda *args: exited.set())
+        reader.add('done', subprocess.Popen(['true'], stdout=subprocess.PIPE, stderr=subprocess.PIPE))
+        assert exited.wait(5)
+        # 仍在运行的进程的输出流也需关闭
+        process = subprocess.Popen(['sleep', '10'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        reader.add('running', process)
+        reader.close()
+        process.kill()
+        process.wait()
+        # 未启动读取线程的读取器
+        OutputReader(lambda *args: None, lambda *args: None).close()
+    assert wait_threads(threads) == threads
+    assert open_fds() == fds
+
+
+def test_close_from_exit_callback():
+    fds = open_fds()
+    threads = threading.active_count()
+    exited = threading.Event()
+    reader = None
+
+    def on_exit(key, process):
+        reader.close()
+        exited.set()
+
+    reader = OutputReader(lambda *args: None, on_exit)
+    reader.add('key', subprocess.Popen(['true'], stdout=subprocess.PIPE, stderr=subprocess.PIPE))
+    assert exited.wait(5)
+    assert wait_threads(threads) == threads
+    assert open_fds() == fds
+
+
+def test_add_after_close():
+    reader = OutputReader(lambda *args: None, lambda *args: None)
+    reader.close()
+    process = subprocess.Popen(['true'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with pytest.raises(RuntimeError):
+        reader.add('key', process)
+    process.communicate()
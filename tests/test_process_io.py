@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+from psutil import AccessDenied, NoSuchProcess
+
+import utils.processIO as processIO
+from utils.processIO import ProcessIOTop
+
+
+@pytest.fixture
+def fake_procs(monkeypatch):
+    """
+    替换进程表，procs 为 {pid: (进程名, 读取字节数, 写入字节数)}，
+    值为异常类时读取计数器抛出该异常；created 记录创建 psutil.Process 的次数
+    """
+    state = SimpleNamespace(procs={}, created=[], now=100.0)
+
+    class FakeProcess:
+        def __init__(self, pid: int):
+            if pid not in state.procs:
+                raise NoSuchProcess(pid)
+            self.pid = pid
+            state.created.append(pid)
+
+        def name(self) -> str:
+            return state.procs[self.pid][0]
+
+        def io_counters(self):
+            value = state.procs.get(self.pid)
+            if value is None:
+                raise NoSuchProcess(self.pid)
+            if isinstance(value, type):
+                raise value(self.pid)
+            return SimpleNamespace(read_bytes=value[1], write_bytes=value[2])
+
+    monkeypatch.setattr(processIO.psutil, "pids", lambda: list(state.procs))
+    monkeypatch.setattr(processIO.psutil, "Process", FakeProcess)
+    monkeypatch.setattr(processIO, "time", SimpleNamespace(monotonic=lambda: state.now))
+    return state
+
+
+def test_first_sample_is_baseline_and_top_k(fake_procs):
+    fake_procs.procs = {1: ("a", 0, 0), 2: ("b", 0, 0), 3: ("c", 0, 0)}
+    top = ProcessIOTop(2)
+    assert top.sample() == []
+    fake_procs.now += 2
+    fake_procs.procs = {1: ("a", 200, 0), 2: ("b", 1000, 1000), 3: ("c", 0, 0), 4: ("d", 9999, 9999)}
+    # 新出现的进程只记录基线，没有 I/O 的进程不上报
+    assert top.sample() == [
+        {"pid": 2, "name": "b", "read_bytes": 500, "write_bytes": 500},
+        {"pid": 1, "name": "a", "read_bytes": 100, "write_bytes": 0},
+    ]
+    fake_procs.now += 1
+    fake_procs.procs[4] = ("d", 10999, 9999)
+    top.set_top(1)
+    assert top.sample() == [{"pid": 4, "name": "d", "read_bytes": 1000, "write_bytes": 0}]
+    # 进程对象在两次采样之间复用
+    assert sorted(fake_procs.created) == [1, 2, 3, 4]
+
+
+def test_reused_pid_gets_new_baseline(fake_procs):
+    fake_procs.procs = {10: ("old", 5000, 5000)}
+    top = ProcessIOTop()
+    top.sample()
+    fake_procs.now += 1
+    # pid 被新进程复用，计数器变小
+    fake_procs.procs = {10: ("new", 100, 0)}
+    assert top.sample() == []
+    fake_procs.now += 1
+    fake_procs.procs = {10: ("new", 300, 0)}
+    assert top.sample() == [{"pid": 10, "name": "new", "read_bytes": 200, "write_bytes": 0}]
+
+
+def test_exited_and_denied_processes(fake_procs):
+    fake_procs.procs = {1: ("a", 0, 0), 2: ("b", 0, 0), 3: ("denied", 0, 0)}
+    top = ProcessIOTop()
+    top.sample()
+    # 无权限读取计数器的进程跳过
+    fake_procs.procs[3] = AccessDenied
+    fake_procs.now += 1
+    del fake_procs.procs[2]
+    fake_procs.procs[1] = ("a", 10, 0)
+    assert top.sample() == [{"pid": 1, "name": "a", "read_bytes": 10, "write_bytes": 0}]
+    # 已结束的进程在下一次出现时重新创建并建立基线，无权限的进程保留句柄
+    fake_procs.now += 1
+    fake_procs.procs[2] = ("b2", 50, 0)
+    fake_procs.procs[3] = ("denied", 10, 0)
+    assert top.sample() == [{"pid": 3, "name": "denied", "read_bytes": 10, "write_bytes": 0}]
+    assert sorted(fake_procs.created) == [1, 2, 2, 3]
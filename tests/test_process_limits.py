@@ -0,0 +1,90 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from utils.processLimits import ProcessLimits, ProcessMonitor, reap_process, LIMIT_WALL_TIME, LIMIT_OUTPUT_SIZE, \
+    LIMIT_CPU_TIME
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="资源限制仅在非 Windows 下可用")
+
+
+def start(script: str, limits: ProcessLimits) -> subprocess.Popen:
+    return subprocess.Popen(script, shell=True, executable='/bin/bash', stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, **limits.popen_kwargs())
+
+
+def wait(process: subprocess.Popen, timeout: float = 10):
+    """与输出读取线程一致使用 wait4 回收，保留资源使用情况"""
+    deadline = time.monotonic() + timeout
+    while not reap_process(process):
+        assert time.monotonic() < deadline, "进程未在限定时间内退出"
+        time.sleep(0.01)
+
+
+def test_no_limits_keep_process_group():
+    assert ProcessLimits().popen_kwargs() == {}
+    assert ProcessLimits.from_config({'wall_time': 0}, {'cpu_time': 0}).popen_kwargs() == {}
+    kwargs = ProcessLimits(wall_time=1).popen_kwargs()
+    assert kwargs == {'start_new_session': True}
+
+
+def test_rlimits_are_inherited_by_children():
+    limits = ProcessLimits.from_config({'cpu_time': 7, 'memory': 512})
+    # bash 再创建的子进程同样带有限制
+    process = start("bash -c 'ulimit -t; ulimit -v'", limits)
+    stdout, _ = process.communicate(timeout=10)
+    assert stdout.split() == [b"7", str(512 * 1024).encode()]
+
+
+def test_cpu_time_limit():
+    limits = ProcessLimits(cpu_time=1)
+    process = start("while :; do :; done", limits)
+    monitor = ProcessMonitor(process, limits)
+    wait(process)
+    monitor.stop()
+    usage = monitor.usage()
+    assert process.returncode < 0
+    assert usage['limit_exceeded'] == LIMIT_CPU_TIME
+    assert usage['cpu_user'] + usage['cpu_system'] >= 1 - ProcessMonitor.CPU_TIME_TOLERANCE
+
+
+def test_wall_time_kills_process_group():
+    limits = ProcessLimits(wall_time=0.3)
+    process = start("sleep 30 & sleep 30; wait", limits)
+    monitor = ProcessMonitor(process, limits)
+    wait(process)
+    monitor.stop()
+    assert process.returncode == -9
+    assert monitor.usage()['limit_exceeded'] == LIMIT_WALL_TIME
+    # 整个进程组都已结束，管道写端全部关闭
+    assert process.stdout.read() == b""
+
+
+def test_output_size_kills_process():
+    limits = ProcessLimits(output_size=100)
+    process = start("sleep 30", limits)
+    monitor = ProcessMonitor(process, limits)
+    monitor.add_output(60)
+    assert process.poll() is None
+    monitor.add_output(60)
+    wait(process)
+    monitor.stop()
+    usage = monitor.usage()
+    assert usage['limit_exceeded'] == LIMIT_OUTPUT_SIZE
+    assert usage['output_bytes'] == 120
+
+
+def test_usage_accounting():
+    limits = ProcessLimits()
+    process = start("head -c 4000000 /dev/zero > /dev/null; exit 3", limits)
+    monitor = ProcessMonitor(process, limits)
+    wait(process)
+    monitor.stop()
+    usage = monitor.usage()
+    assert process.returncode == 3
+    assert usage['limit_exceeded'] is None
+    assert usage['duration'] >= 0
+    assert usage['max_rss'] > 0
+    assert {'cpu_user', 'cpu_system', 'read_bytes', 'write_bytes'} <= usage.keys()
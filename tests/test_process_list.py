@@ -0,0 +1,118 @@
+import threading
+import time
+import zlib
+
+from utils.processList import ProcessListDelta, ProcessListQuery, ProcessListStream
+
+
+def row(pid: int, name: str = "proc", cpu: float = 0.0, memory: float = 0.0, username: str = "root",
+        status: str = "sleeping", swap: int = 0) -> dict:
+    return {"pid": pid, "name": name, "username": username, "status": status, "cpu_percent": cpu,
+            "memory_usage": memory, "swap_usage": swap}
+
+
+def test_delta_added_removed_changed():
+    delta = ProcessListDelta(cpu_threshold=1.0, memory_threshold=0.5)
+    delta.snapshot([row(1), row(2, cpu=5.0), row(3)])
+    result = delta.diff([row(1, cpu=0.5), row(2, cpu=7.0), row(4)])
+    assert [item["pid"] for item in result["added"]] == [4]
+    assert result["removed"] == [3]
+    assert [item["pid"] for item in result["changed"]] == [2]
+
+
+def test_delta_accumulates_small_changes():
+    delta = ProcessListDelta(cpu_threshold=1.0)
+    delta.snapshot([row(1, cpu=0.0)])
+    # 低于阈值的变化不更新已发送的值，累计超过阈值后发送
+    assert delta.diff([row(1, cpu=0.6)])["changed"] == []
+    assert [item["cpu_percent"] for item in delta.diff([row(1, cpu=1.2)])["changed"]] == [1.2]
+
+
+def test_delta_key_field_change():
+    delta = ProcessListDelta()
+    delta.snapshot([row(1)])
+    assert delta.diff([row(1, status="zombie")])["changed"][0]["status"] == "zombie"
+
+
+def test_delta_checksum_matches_sent_rows():
+    delta = ProcessListDelta()
+    delta.snapshot([row(2, name="b", cpu=12.35), row(1, name="a"), {**row(3), "name": None, "username": None}])
+    # 规范形式：整数字段按固定顺序，不依赖浮点数的 JSON 表示
+    expected = zlib.crc32(
+        b"1\ta\troot\tsleeping\t0\t0\t0\n"
+        b"2\tb\troot\tsleeping\t124\t0\t0\n"
+        b"3\t\t\tsleeping\t0\t0\t0\n"
+    )
+    assert delta.checksum() == expected
+    delta.diff([row(1, name="a")])
+    assert delta.checksum() != expected
+
+
+def test_query_filter_sort_limit():
+    rows = [row(1, "nginx", cpu=3.0), row(2, "python", cpu=9.0, username="app"), row(3, "Python3", cpu=1.0),
+            row(4, "bash", cpu=5.0, status="zombie")]
+    result, total = ProcessListQuery({"sort": "cpu", "limit": 2}).apply(rows)
+    assert [item["pid"] for item in result] == [2, 4] and total == 4
+    result, total = ProcessListQuery({"name": "python", "sort": "pid", "order": "desc"}).apply(rows)
+    assert [item["pid"] for item in result] == [3, 2] and total == 2
+    result, _ = ProcessListQuery({"user": ["root"], "status": "sleeping", "sort": "name"}).apply(rows)
+    assert [item["name"] for item in result] == ["Python3", "nginx"]
+    result, _ = ProcessListQuery({"name_regex": r"^py"}).apply(rows)
+    assert [item["pid"] for item in result] == [2]
+
+
+def test_query_invalid_options_are_ignored():
+    rows = [row(2), row(1)]
+    result, total = ProcessListQuery({"sort": "unknown", "name_regex": "("}).apply(rows)
+    assert result == rows and total == 2
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    def send_json_nowait(self, data: dict):
+        self.messages.append(data)
+
+
+def stream_threads() -> int:
+    return len([thread for thread in threading.enumerate() if thread.name == "ProcessListStream"])
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_stream_stop_then_start_runs_one_thread():
+    ws = FakeWebSocket()
+    stream = ProcessListStream(ws)
+    stream.start({"interval": 1})
+    for _ in range(3):
+        stream.stop()
+        assert not stream.is_running()
+        stream.start({"interval": 1})
+        assert stream.is_running()
+    # 已停止的线程被唤醒后退出，只保留最后一次启动的线程
+    assert wait_for(lambda: stream_threads() == 1)
+    time.sleep(ProcessListStream.PRIME_INTERVAL + 0.2)
+    assert stream_threads() == 1
+    assert len([message for message in ws.messages if message['action'] == 'process_list:show']) == 1
+    stream.stop()
+    assert wait_for(lambda: stream_threads() == 0)
+
+
+def test_stream_sends_after_stop_is_suppressed():
+    ws = FakeWebSocket()
+    stream = ProcessListStream(ws)
+    stream.start({"interval": 1, "delta": True})
+    assert wait_for(lambda: ws.messages)
+    stream.stop()
+    assert wait_for(lambda: stream_threads() == 0)
+    count = len(ws.messages)
+    time.sleep(1.2)
+    assert len(ws.messages) == count
@@ -0,0 +1,124 @@
+import asyncio
+
+from utils.websocket import WebSocket
+
+
+class FakeWebSocketResponse:
+    """模拟 aiohttp 连接，block 为 True 时发送一直阻塞"""
+
+    def __init__(self, block: bool = False):
+        self.closed = False
+        self.block = block
+        self.sent = []
+        self.sending = asyncio.Event()
+
+    async def __send(self, data):
+        self.sending.set()
+        if self.block:
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+    async def send_str(self, data: str):
+        await self.__send(data)
+
+    async def send_bytes(self, data: bytes):
+        await self.__send(data)
+
+
+def create_websocket(queue_size: int = 16) -> WebSocket:
+    ws = WebSocket(None)
+    # 与 websocket_connect 一致在事件循环中创建发送队列
+    ws._WebSocket__loop = asyncio.get_running_loop()
+    ws._WebSocket__send_queue = asyncio.Queue(queue_size)
+    return ws
+
+
+def action(name: str) -> dict:
+    return {'action': name, 'data': {}}
+
+
+def test_disconnect_discards_stale_messages():
+    async def run():
+        ws = create_websocket()
+        ws.send_json_nowait(action('process_list:delta'))
+        ws.send_json_nowait(action('task:process_stop'))
+        ws.send_bytes_nowait(b"terminal frame")
+        ws.send_json_nowait(action('node:upload_running_data'))
+        ws.send_json_nowait(action('execute:output'))
+        ws._WebSocket__discard_stale()
+        response = FakeWebSocketResponse()
+        sender = asyncio.create_task(ws._WebSocket__send_handler(response))
+        await asyncio.sleep(0.01)
+        sender.cancel()
+        return response.sent
+
+    sent = asyncio.run(run())
+    assert sent == ['{"action": "task:process_stop", "data": {}}', '{"action": "execute:output", "data": {}}']
+
+
+def test_in_flight_message_is_sent_on_next_connection():
+    async def run():
+        ws = create_websocket()
+        blocked = FakeWebSocketResponse(block=True)
+        sender = asyncio.create_task(ws._WebSocket__send_handler(blocked))
+        ws.send_json_nowait(action('task:process_start'))
+        ws.send_json_nowait(action('task:process_stop'))
+        await blocked.sending.wait()
+        # 连接断开，取消正在发送的协程
+        sender.cancel()
+        await asyncio.sleep(0)
+        ws._WebSocket__discard_stale()
+        response = FakeWebSocketResponse()
+        sender = asyncio.create_task(ws._WebSocket__send_handler(response))
+        await asyncio.sleep(0.01)
+        sender.cancel()
+        return response.sent
+
+    sent = asyncio.run(run())
+    assert [message.split('"')[3] for message in sent] == ['task:process_start', 'task:process_stop']
+
+
+def test_in_flight_stale_message_is_dropped():
+    async def run():
+        ws = create_websocket()
+        blocked = FakeWebSocketResponse(block=True)
+        sender = asyncio.create_task(ws._WebSocket__send_handler(blocked))
+        ws.send_bytes_nowait(b"terminal frame")
+        await blocked.sending.wait()
+        sender.cancel()
+        await asyncio.sleep(0)
+        ws._WebSocket__discard_stale()
+        response = FakeWebSocketResponse()
+        sender = asyncio.create_task(ws._WebSocket__send_handler(response))
+        ws.send_json_nowait(action('process_list:show'))
+        await asyncio.sleep(0.01)
+        sender.cancel()
+        return response.sent
+
+    assert asyncio.run(run()) == ['{"action": "process_list:show", "data": {}}']
+
+
+def test_full_queue_drops_new_messages():
+    async def run():
+        ws = create_websocket(queue_size=2)
+        for index in range(5):
+            ws.send_json_nowait({'action': 'task:process_output', 'data': {'index': index}})
+        response = FakeWebSocketResponse()
+        sender = asyncio.create_task(ws._WebSocket__send_handler(response))
+        await asyncio.sleep(0.01)
+        sender.cancel()
+        return response.sent, ws._WebSocket__send_dropped
+
+    sent, dropped = asyncio.run(run())
+    assert [message[-3] for message in sent] == ["0", "1"]
+    assert dropped == 3
+
+
+def test_send_from_other_thread():
+    async def run():
+        ws = create_websocket()
+        await asyncio.to_thread(ws.send_json_nowait, action('task:process_start'))
+        await asyncio.sleep(0)
+        return ws._WebSocket__send_queue.qsize()
+
+    assert asyncio.run(run()) == 1
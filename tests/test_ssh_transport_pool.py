@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+import utils.terminal as terminal
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class FakeChannel:
+    def close(self):
+        pass
+
+
+class FakeClient:
+    clients = []
+    connect_delay = 0.0
+    fail_connect = False
+
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.closed = False
+        FakeClient.clients.append(self)
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, hostname, port, username, password):
+        time.sleep(FakeClient.connect_delay)
+        if FakeClient.fail_connect:
+            raise OSError("connect failed")
+
+    def get_transport(self):
+        return self.transport
+
+    def invoke_shell(self):
+        return FakeChannel()
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(terminal.paramiko, "SSHClient", FakeClient)
+    FakeClient.clients = []
+    FakeClient.connect_delay = 0.0
+    FakeClient.fail_connect = False
+    pool = terminal.SSHTransportPool()
+    yield pool
+    pool.close()
+
+
+def test_concurrent_connects_respect_transport_limit(pool, monkeypatch):
+    # 每个连接只允许一个通道，使每次获取都需要新建连接
+    monkeypatch.setattr(pool, "MAX_CHANNELS_PER_TRANSPORT", 1)
+    FakeClient.connect_delay = 0.05
+    results = []
+    barrier = threading.Barrier(10)
+
+    def acquire():
+        barrier.wait()
+        try:
+            results.append(pool.acquire("host", 22, "user", "password"))
+        except RuntimeError:
+            results.append(None)
+
+    threads = [threading.Thread(target=acquire) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(FakeClient.clients) == pool.MAX_TRANSPORTS_PER_TARGET
+    assert len([item for item in results if item is not None]) == pool.MAX_TRANSPORTS_PER_TARGET
+
+
+def test_failed_connect_releases_slot(pool, monkeypatch):
+    monkeypatch.setattr(pool, "MAX_TRANSPORTS_PER_TARGET", 1)
+    FakeClient.fail_connect = True
+    with pytest.raises(OSError):
+        pool.acquire("host", 22, "user", "password")
+    assert FakeClient.clients[0].closed
+    FakeClient.fail_connect = False
+    assert pool.acquire("host", 22, "user", "password") is not None
+
+
+def test_reuse_and_close_inactive_transport(pool):
+    first = pool.acquire("host", 22, "user", "password")
+    pool.acquire("host", 22, "user", "password")
+    assert len(FakeClient.clients) == 1
+    # 密码不同时不复用
+    pool.acquire("host", 22, "user", "other")
+    assert len(FakeClient.clients) == 2
+    pool.release(first)
+    # 连接已断开，获取时移出连接池并关闭
+    FakeClient.clients[0].transport.active = False
+    pool.acquire("host", 22, "user", "password")
+    assert FakeClient.clients[0].closed
+    assert len(FakeClient.clients) == 3
@@ -0,0 +1,69 @@
+import gzip
+import json
+import os
+import threading
+
+from utils.taskLog import TaskLogStore
+
+
+def read_index(root, task_uuid):
+    with open(os.path.join(root, task_uuid, "index.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_finish_run_compresses_in_background(tmp_path, monkeypatch):
+    store = TaskLogStore(str(tmp_path), {'buffer_size': 4})
+    run_log = store.open_run("task", "mark1")
+    run_log.write("hello\n")
+    # 压缩阻塞时结束运行不应等待压缩完成
+    release = threading.Event()
+    timeouts = []
+    gzip_open = gzip.open
+
+    def slow_gzip_open(*args, **kwargs):
+        if not release.wait(2):
+            timeouts.append(args[0])
+        return gzip_open(*args, **kwargs)
+
+    monkeypatch.setattr("utils.taskLog.gzip.open", slow_gzip_open)
+    assert run_log.close(0) == "mark1.log.gz"
+    # 压缩完成前仍可读取未压缩的日志
+    assert store.tail("task", "mark1", 100) == "hello\n"
+    release.set()
+    store.close()
+    assert not timeouts
+    assert not os.path.exists(os.path.join(tmp_path, "task", "mark1.log"))
+    with gzip.open(os.path.join(tmp_path, "task", "mark1.log.gz"), "rb") as f:
+        assert f.read() == b"hello\n"
+    index = read_index(tmp_path, "task")
+    assert index[0]["file"] == "mark1.log.gz"
+    assert index[0]["code"] == 0
+    assert index[0]["output_bytes"] == 6
+
+
+def test_retention_removes_oldest_runs(tmp_path):
+    store = TaskLogStore(str(tmp_path), {'max_runs': 2, 'compress': False})
+    for index in range(4):
+        run_log = store.open_run("task", f"mark{index}")
+        run_log.write(f"{index}\n")
+        assert run_log.close(index) == f"mark{index}.log"
+    store.close()
+    index = read_index(tmp_path, "task")
+    assert [run["mark"] for run in index] == ["mark2", "mark3"]
+    assert sorted(os.listdir(os.path.join(tmp_path, "task"))) == ["index.json", "mark2.log", "mark3.log"]
+
+
+def test_index_is_loaded_from_disk(tmp_path):
+    store = TaskLogStore(str(tmp_path))
+    run_log = store.open_run("task", "mark1")
+    run_log.write("first\n")
+    run_log.close(0)
+    store.close()
+    store = TaskLogStore(str(tmp_path))
+    run_log = store.open_run("task", "mark2")
+    assert store.tail("task", "mark1", 100) == "first\n"
+    # 关闭时结束运行中的日志，返回值记为 None
+    store.close()
+    index = read_index(tmp_path, "task")
+    assert [(run["mark"], run["code"]) for run in index] == [("mark1", 0), ("mark2", None)]
+    assert store.tail("task", "missing", 100) is None
@@ -0,0 +1,40 @@
+import json
+
+from utils.taskManifest import TaskManifest, task_hash
+
+
+def test_task_hash_ignores_key_order():
+    assert task_hash({'uuid': "a", 'shell': "ls"}) == task_hash({'shell': "ls", 'uuid': "a"})
+    assert task_hash({'uuid': "a", 'shell': "ls"}) != task_hash({'uuid': "a", 'shell': "pwd"})
+
+
+def test_diff_only_reports_changes(tmp_path):
+    manifest = TaskManifest(str(tmp_path))
+    unchanged = {'uuid': "unchanged", 'shell': "ls"}
+    changed = {'uuid': "changed", 'shell': "ls"}
+    for task in (unchanged, changed, {'uuid': "removed", 'shell': "ls"}):
+        manifest.set(task)
+    incoming = [unchanged, {**changed, 'shell': "pwd"}, {'uuid': "added", 'shell': "ls"}, {'shell': "no uuid"}]
+    added, removed, changed_tasks, unchanged_count = manifest.diff(incoming)
+    assert [task['uuid'] for task in added] == ["added"]
+    assert removed == ["removed"]
+    assert [task['uuid'] for task in changed_tasks] == ["changed"]
+    assert unchanged_count == 1
+
+
+def test_save_increments_version(tmp_path):
+    manifest = TaskManifest(str(tmp_path))
+    manifest.set({'uuid': "a", 'shell': "ls"})
+    digest = manifest.digest()
+    manifest.save()
+    manifest.save()
+    assert manifest.version == 2
+    manifest.remove("a")
+    assert not manifest.contains("a")
+    assert manifest.digest() != digest
+    # 重新创建时沿用版本号，任务哈希不持久化(调度器重启后需要重新注册全部任务)
+    reloaded = TaskManifest(str(tmp_path))
+    assert reloaded.version == 2
+    assert not reloaded.contains("a")
+    with open(tmp_path / "manifest.json", "r", encoding="utf-8") as f:
+        assert json.load(f) == {"version": 2}
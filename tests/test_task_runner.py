@@ -0,0 +1,116 @@
+import itertools
+
+from utils.taskRunner import TaskRunner, OVERLAP_KILL, OVERLAP_QUEUE
+
+
+class FakeProcess:
+    def __init__(self, pid):
+        self.pid = pid
+
+
+class FakeLauncher:
+    """记录启动顺序，finish_early 中的任务在 launch 返回前即结束"""
+
+    def __init__(self):
+        self.runner = None
+        self.launched = []
+        self.finish_early = set()
+        self.__counter = itertools.count()
+
+    def __call__(self, task_uuid):
+        mark = f"{task_uuid}-{next(self.__counter)}"
+        self.launched.append(mark)
+        if task_uuid in self.finish_early:
+            # 模拟进程交给输出读取线程后立即结束
+            self.runner.finish(mark)
+        return mark, FakeProcess(len(self.launched))
+
+
+def create_runner(max_concurrent=1, max_queue=10):
+    launcher = FakeLauncher()
+    launcher.runner = TaskRunner(launcher, max_concurrent, max_queue)
+    return launcher.runner, launcher
+
+
+def test_finish_before_register_releases_slot():
+    runner, launcher = create_runner()
+    launcher.finish_early.add("fast")
+    assert runner.submit("fast")
+    # 运行槽位已释放，不会残留运行中的标记
+    assert runner.running() == []
+    assert runner.metrics()["started"] == 1
+    assert runner.submit("next")
+    assert launcher.launched == ["fast-0", "next-1"]
+    assert runner.running() == ["next-1"]
+
+
+def test_finish_before_register_dispatches_queue():
+    runner, launcher = create_runner()
+    assert runner.submit("slow")
+    launcher.finish_early.add("fast")
+    assert runner.submit("fast")
+    assert runner.submit("last")
+    assert launcher.launched == ["slow-0"]
+    runner.finish("slow-0")
+    # fast 启动时即结束，应继续启动排队中的 last
+    assert launcher.launched == ["slow-0", "fast-1", "last-2"]
+    assert runner.running() == ["last-2"]
+
+
+def test_queue_by_priority():
+    runner, launcher = create_runner()
+    assert runner.submit("a")
+    assert runner.submit("low", priority=0)
+    assert runner.submit("high", priority=5)
+    runner.finish("a-0")
+    assert launcher.launched == ["a-0", "high-1"]
+    runner.finish("high-1")
+    assert launcher.launched == ["a-0", "high-1", "low-2"]
+
+
+def test_overlap_policies(monkeypatch):
+    killed = []
+    monkeypatch.setattr("utils.taskRunner.kill_process", lambda process: killed.append(process.pid))
+    runner, launcher = create_runner(max_concurrent=2)
+    assert runner.submit("task")
+    # 默认跳过，排队策略每个任务最多排队一次
+    assert not runner.submit("task")
+    assert runner.submit("task", overlap=OVERLAP_QUEUE)
+    assert not runner.submit("task", overlap=OVERLAP_QUEUE)
+    runner.finish("task-0")
+    assert runner.running("task") == ["task-1"]
+    assert runner.submit("task", overlap=OVERLAP_KILL)
+    assert killed == [2]
+    runner.finish("task-1")
+    assert runner.running("task") == ["task-2"]
+    metrics = runner.metrics()
+    assert (metrics["skipped"], metrics["killed"], metrics["started"]) == (2, 1, 3)
+
+
+def test_reject_when_queue_full():
+    runner, launcher = create_runner(max_queue=1)
+    assert runner.submit("a")
+    assert runner.submit("b")
+    assert not runner.submit("c")
+    assert runner.metrics()["rejected"] == 1
+    runner.close()
+    assert not runner.submit("d")
+    runner.finish("a-0")
+    assert launcher.launched == ["a-0"]
+
+
+def test_unknown_finish_during_start_is_not_kept():
+    marks = iter(["foreign", "reused"])
+
+    def launch(task_uuid):
+        mark = next(marks)
+        if mark == "foreign":
+            # 启动期间结束的其他运行(如命令执行)不属于本执行引擎
+            runner.finish("reused")
+        return mark, None
+
+    runner = TaskRunner(launch, 2, 10)
+    assert runner.submit("a")
+    assert runner.submit("b")
+    # 之后以同一标记启动的运行仍登记为运行中
+    assert sorted(runner.running()) == ["foreign", "reused"]
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from utils.model import database, Task, TaskRun
+from utils.taskState import TaskStateCache, RUN_INTERRUPTED, RUN_RUNNING
+
+
+@pytest.fixture
+def cache():
+    # 与 main.py 一致创建数据表，每个测试使用空表
+    database.create_tables([Task, TaskRun])
+    Task.delete().execute()
+    TaskRun.delete().execute()
+    # 写入线程不会自动写入，由测试调用 flush/close
+    state_cache = TaskStateCache(flush_interval=3600)
+    state_cache.load()
+    yield state_cache
+    state_cache.close()
+
+
+def test_counts_are_written_in_batches(cache):
+    state = cache.ensure("task", "name", max_count=2)
+    assert cache.increment("task") == 1
+    assert cache.increment("task") == 2
+    assert state.reached_limit()
+    # 计数只在内存中累加
+    assert Task.select().count() == 0
+    cache.flush()
+    row = Task.get(Task.uuid == "task")
+    assert (row.name, row.count, row.max_count) == ("name", 2, 2)
+    cache.update("task", "renamed", 0)
+    cache.increment("task")
+    cache.flush()
+    row = Task.get(Task.uuid == "task")
+    assert (row.name, row.count, row.max_count) == ("renamed", 3, 0)
+
+
+def test_load_keeps_counts_and_interrupts_running_runs(cache):
+    cache.ensure("task", "name")
+    cache.increment("task")
+    cache.start_run("task", "mark", time.time(), "mark.log", 10)
+    cache.start_run("task", "expired", time.time() - 91 * 86400, "expired.log", 10)
+    cache.close()
+    reloaded = TaskStateCache(flush_interval=3600)
+    reloaded.load()
+    assert reloaded.get("task").count == 1
+    assert reloaded.ensure("task", "other").name == "name"
+    runs = reloaded.query_runs("task")
+    # 超过 history_days 的运行记录已清理
+    assert [(run['mark'], run['status']) for run in runs] == [("mark", RUN_INTERRUPTED)]
+    reloaded.close()
+
+
+def test_run_stats(cache):
+    cache.ensure("task", "name")
+    codes = [0, 0, 0, 1, -9]
+    for index, code in enumerate(codes):
+        mark = f"mark{index}"
+        cache.start_run("task", mark, 1000 + index, mark + ".log", 0)
+        cache.finish_run(mark, code, {'duration': index + 1, 'output_bytes': 100 * (index + 1),
+                                      'cpu_user': 0.5, 'cpu_system': 0.25})
+    cache.start_run("task", "running", 2000, "running.log", 0)
+    stats = cache.run_stats("task")
+    assert (stats['total'], stats['success'], stats['failed'], stats['killed']) == (5, 3, 1, 1)
+    assert stats['failure_rate'] == 0.4
+    assert stats['avg_duration'] == 3
+    assert stats['p95_duration'] == 5
+    assert stats['max_duration'] == 5
+    assert stats['avg_output_bytes'] == 300
+    assert stats['last_run'] == 1004
+    assert cache.run_stats("task", start=1003)['total'] == 2
+    runs = cache.query_runs("task", limit=2)
+    assert [run['mark'] for run in runs] == ["running", "mark4"]
+    assert runs[0]['status'] == RUN_RUNNING
+    assert runs[1]['cpu_time'] == 0.75
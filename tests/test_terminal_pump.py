@@ -0,0 +1,161 @@
+import os
+import socket
+import threading
+import time
+
+import utils.tty as tty
+from utils.terminalPump import TerminalPump
+
+
+class FakeChannel:
+    """以 socketpair 模拟 paramiko 通道"""
+
+    def __init__(self):
+        self.local, self.remote = socket.socketpair()
+        self.local.setblocking(False)
+        self.closed = False
+        self.eof_received = False
+        self.buffer = b""
+
+    def fileno(self):
+        return self.local.fileno()
+
+    def recv_ready(self):
+        if self.buffer or self.eof_received:
+            return bool(self.buffer)
+        try:
+            data = self.local.recv(65536)
+        except BlockingIOError:
+            return False
+        if not data:
+            self.eof_received = True
+            return False
+        self.buffer += data
+        return True
+
+    def recv(self, size):
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def send(self, data):
+        self.local.send(data)
+
+    def close(self):
+        self.closed = True
+        self.local.close()
+        self.remote.close()
+
+
+class FakeTerminal:
+    released = []
+
+    def __init__(self):
+        self.channel = None
+
+    def start(self, host, port, username, password):
+        self.channel = FakeChannel()
+        return self.channel
+
+    def terminal_close(self):
+        FakeTerminal.released.append(self.channel)
+        self.channel.close()
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    def send_bytes_nowait(self, data):
+        self.frames.append(data)
+
+    def send_json_nowait(self, data):
+        self.frames.append(data)
+
+
+def open_fds() -> int:
+    return len(os.listdir('/proc/self/fd'))
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_pump_output_and_close_releases_fds():
+    fds = open_fds()
+    threads = threading.active_count()
+    for _ in range(5):
+        output = []
+        closed = threading.Event()
+        pump = TerminalPump()
+        channel = FakeChannel()
+        pump.register("session", channel, output.append, closed.set)
+        channel.remote.send(b"hello")
+        assert wait_for(lambda: b"".join(output) == b"hello")
+        pump.close()
+        assert closed.is_set()
+        channel.close()
+        # 未启动线程的输出泵
+        TerminalPump().close()
+    assert wait_for(lambda: threading.active_count() <= threads)
+    assert open_fds() == fds
+
+
+def test_remote_close_releases_session(monkeypatch):
+    monkeypatch.setattr(tty, "Terminal", FakeTerminal)
+    FakeTerminal.released.clear()
+    service = tty.tty_service()
+    session_id, status = service.create_session("host", 22, "user", "password")
+    assert status
+    channel = service.get_session(session_id)
+    service.terminal_output(session_id, FakeWebSocket(), binary=True)
+    # 远端退出 shell
+    channel.remote.close()
+    assert wait_for(lambda: FakeTerminal.released == [channel])
+    assert session_id not in service.get_session_list()
+    service.close()
+
+
+def test_close_session_closes_once(monkeypatch):
+    monkeypatch.setattr(tty, "Terminal", FakeTerminal)
+    FakeTerminal.released.clear()
+    service = tty.tty_service()
+    session_id, _ = service.create_session("host", 22, "user", "password")
+    channel = service.get_session(session_id)
+    service.terminal_output(session_id, FakeWebSocket(), binary=True)
+    service.close_session(session_id)
+    assert FakeTerminal.released == [channel]
+    assert session_id not in service.get_session_list()
+    # 新的服务实例不共享会话
+    assert not list(tty.tty_service().get_session_list())
+    service.close()
+
+
+def test_unregister_hands_final_flush_to_pump_thread():
+    events = []
+    closed = threading.Event()
+    pump = TerminalPump()
+    channel = FakeChannel()
+
+    def on_output(data):
+        events.append(("output", threading.current_thread().name, len(data)))
+
+    def on_close():
+        events.append(("close", threading.current_thread().name, 0))
+        closed.set()
+
+    pump.register("session", channel, on_output, on_close)
+    for _ in range(200):
+        channel.remote.send(b"x" * 1000)
+    pump.unregister("session")
+    assert closed.wait(5)
+    # 剩余输出与 on_close 都在输出泵线程中依次调用，关闭后不再输出
+    assert {name for _, name, _ in events} == {"TerminalPump"}
+    assert events[-1][0] == "close"
+    assert [kind for kind, _, _ in events].count("close") == 1
+    pump.close()
+    channel.close()
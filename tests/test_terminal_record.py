@@ -0,0 +1,88 @@
+import os
+import time
+
+import pytest
+
+import utils.terminalRecord as terminalRecord
+from utils.terminalRecord import TerminalRecordWriter, TerminalRecordReader, INDEX_SUFFIX
+
+
+class FakeTime:
+    """可控的时钟，录像中的时间偏移由测试指定"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return 10000 + self.now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(terminalRecord, "time", fake)
+    return fake
+
+
+def write_record(path, clock, compression):
+    writer = TerminalRecordWriter(path, compression)
+    # 每块约两段输出
+    writer.BLOCK_SIZE = 32
+    for index in range(10):
+        clock.now = index * 0.5
+        writer.write(f"output {index}\n".encode())
+    writer.close()
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_round_trip(tmp_path, clock, compression):
+    path = str(tmp_path / "session")
+    write_record(path, clock, compression)
+    reader = TerminalRecordReader(path)
+    assert reader.start_time == 10000
+    assert reader.duration == 4.5
+    chunks = list(reader.chunks())
+    assert chunks == [(index * 0.5, f"output {index}\n".encode()) for index in range(10)]
+    # 从中间时刻开始回放
+    assert [offset for offset, _ in reader.chunks(3.2)] == [3.5, 4.0, 4.5]
+    reader.close()
+
+
+def test_rebuilds_missing_index(tmp_path, clock):
+    path = str(tmp_path / "session")
+    write_record(path, clock, "gzip")
+    os.remove(path + INDEX_SUFFIX)
+    reader = TerminalRecordReader(path)
+    assert reader.duration == 4.5
+    assert [data for _, data in reader.chunks(4.0)] == [b"output 8\n", b"output 9\n"]
+    reader.close()
+
+
+def test_rejects_invalid_file(tmp_path):
+    path = str(tmp_path / "invalid")
+    with open(path + terminalRecord.RECORD_SUFFIX, "wb") as f:
+        f.write(b"\0" * 64)
+    with pytest.raises(ValueError):
+        TerminalRecordReader(path)
+
+
+def test_idle_session_is_flushed_by_deadline(tmp_path, clock):
+    path = str(tmp_path / "session")
+    writer = TerminalRecordWriter(path, "gzip")
+    writer.FLUSH_INTERVAL = 0.05
+    writer.write(b"prompt$ ")
+    # 之后没有新的输出，定时器写入当前块
+    deadline = time.monotonic() + 5
+    while os.path.getsize(path + INDEX_SUFFIX) == 0:
+        assert time.monotonic() < deadline, "空闲会话的输出未在 FLUSH_INTERVAL 后写入"
+        time.sleep(0.01)
+    reader = TerminalRecordReader(path)
+    assert [data for _, data in reader.chunks()] == [b"prompt$ "]
+    reader.close()
+    writer.close()
+    # 关闭后不再写入
+    writer.write(b"late")
+    writer.flush()
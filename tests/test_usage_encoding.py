@@ -0,0 +1,65 @@
+import struct
+
+from utils.usageEncoding import UsageEncoder, USAGE_HEADER, UNKNOWN_SIZE
+
+
+def node_usage(nics=("eth0",), partitions=({"device": "/dev/sda1", "mount_point": "/", "fs_type": "ext4"},)):
+    io = {"bytes_sent": 1, "bytes_recv": 2}
+    return {
+        "cpu": {"usage": 1.0, "core_usage": [1.0, 2.0]},
+        "loadavg": (0.1, 0.2, 0.3),
+        "memory": {"total": 100, "used": 50},
+        "swap": {"total": 0, "used": 0},
+        "disk": {
+            "io": {"read_bytes": 3, "write_bytes": 4},
+            "partition_list": [{**item, "total": 10, "used": 5} for item in partitions],
+        },
+        "network": {"io": {"_all": io, **{nic: io for nic in nics}}},
+    }
+
+
+def version(frame: bytes) -> int:
+    return USAGE_HEADER.unpack_from(frame)[2]
+
+
+def test_dictionary_sent_only_on_change():
+    encoder = UsageEncoder()
+    dictionary, frame = encoder.encode(1.0, node_usage())
+    assert dictionary["version"] == 1 and dictionary["nics"] == ["eth0"] and version(frame) == 1
+    assert encoder.encode(2.0, node_usage())[0] is None
+    dictionary, frame = encoder.encode(3.0, node_usage(nics=("eth0", "eth1")))
+    assert dictionary["version"] == 2 and version(frame) == 2
+
+
+def test_reset_resends_dictionary_with_new_version():
+    encoder = UsageEncoder()
+    # 没有网卡与分区时字典为空，重置后也需要重新发送
+    usage = node_usage(nics=(), partitions=())
+    assert encoder.encode(1.0, usage)[0]["version"] == 1
+    assert encoder.encode(2.0, usage)[0] is None
+    encoder.reset()
+    dictionary, frame = encoder.encode(3.0, usage)
+    assert dictionary == {'schema': 1, 'version': 2, 'nics': [], 'partitions': []}
+    assert version(frame) == 2
+
+
+def test_unknown_partition_usage():
+    usage = node_usage()
+    usage["disk"]["partition_list"][0].update(total=None, used=None)
+    _, frame = UsageEncoder().encode(1.0, usage)
+    assert struct.unpack_from("<QQ", frame, len(frame) - 16) == (UNKNOWN_SIZE, UNKNOWN_SIZE)
+
+
+def test_extra_sections_outside_schema():
+    usage = node_usage()
+    assert UsageEncoder.extra(1.0, usage) is None
+    usage["cgroup"] = {"version": 2, "cpu_quota": 1.5}
+    usage["containers"] = []
+    usage["disk"]["devices"] = {"sda": {"read_iops": 1}}
+    usage["disk"]["top_processes"] = [{"pid": 1, "read_bytes": 10}]
+    assert UsageEncoder.extra(2.0, usage) == {
+        "timestamp": 2.0,
+        "cgroup": {"version": 2, "cpu_quota": 1.5},
+        "containers": [],
+        "disk": {"devices": {"sda": {"read_iops": 1}}, "top_processes": [{"pid": 1, "read_bytes": 10}]},
+    }
@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+
+from utils.metricsBuffer import MetricsRingBuffer, RECORD, FIELDS, unpack_records
+from utils.usageCollector import UsageCollector
+from utils.usageRollup import UsageRollup, ROLLUP_FIELDS, percentile
+
+
+def record(timestamp: float, cpu: float = 0.0) -> bytes:
+    return RECORD.pack(timestamp, cpu, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+
+
+def test_ring_buffer_wraps_and_reads_across_boundary(tmp_path):
+    buffer = MetricsRingBuffer(str(tmp_path / "metrics"), 4)
+    for index in range(6):
+        assert buffer.append(record(index)) == index
+    assert (buffer.oldest_seq, buffer.write_seq) == (2, 6)
+    start, data = buffer.read(0, 10)
+    assert start == 2
+    assert [item[0] for item in unpack_records(data)] == [2, 3, 4, 5]
+    start, data = buffer.read(3, 2)
+    assert start == 3 and [item[0] for item in unpack_records(data)] == [3, 4]
+    buffer.close()
+
+
+def test_ring_buffer_persists_sequences(tmp_path):
+    path = str(tmp_path / "metrics")
+    buffer = MetricsRingBuffer(path, 8)
+    for index in range(5):
+        buffer.append(record(index))
+    buffer.mark_forwarded(3)
+    buffer.close()
+    buffer = MetricsRingBuffer(path, 8)
+    assert (buffer.write_seq, buffer.forwarded_seq) == (5, 3)
+    buffer.close()
+    # 容量变化时重新创建
+    buffer = MetricsRingBuffer(path, 16)
+    assert (buffer.write_seq, buffer.forwarded_seq) == (0, 0)
+    buffer.close()
+
+
+class SpyBuffer(MetricsRingBuffer):
+    reads = []
+
+    def read(self, start_seq: int, limit: int):
+        SpyBuffer.reads.append((start_seq, limit))
+        return super().read(start_seq, limit)
+
+
+def test_collector_loads_buffer_into_rollup(tmp_path):
+    buffer = SpyBuffer(str(tmp_path / "metrics"), 4)
+    for index in range(10):
+        buffer.append(record(1000 + index, cpu=index))
+    SpyBuffer.reads.clear()
+    rollup = UsageRollup()
+    UsageCollector(None, None, buffer, rollup, 1)
+    # 第二个参数为记录数而不是序号
+    assert SpyBuffer.reads == [(6, 4)]
+    points = rollup.query(1000, 1010, resolution="1s")["points"]
+    assert [point[0] for point in points] == [1006, 1007, 1008, 1009]
+    buffer.close()
+
+
+def test_percentile_nearest_rank():
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile([7], 95) == 7
+
+
+def test_rollup_buckets_and_stats():
+    rollup = UsageRollup()
+    cpu = FIELDS.index("cpu_usage")
+    for second in range(120):
+        values = [0.0] * len(FIELDS)
+        values[0] = 60.0 + second
+        values[cpu] = float(second % 60)
+        rollup.add_record(tuple(values))
+    result = rollup.query(60, 180, resolution="1m")
+    assert result["step"] == 60
+    (start, count, stats), (next_start, next_count, _) = result["points"]
+    assert (start, count, next_start, next_count) == (60, 60, 120, 60)
+    cpu_stats = stats[ROLLUP_FIELDS.index("cpu_usage")]
+    assert cpu_stats == [0.0, 59.0, 29.5, 56.0]
+
+
+def test_rollup_selects_tier_and_merges():
+    rollup = UsageRollup()
+    for second in range(600):
+        rollup.add_record(tuple([float(second)] + [1.0] * (len(FIELDS) - 1)))
+    # 1s 粒度覆盖范围且点数不超过上限
+    assert rollup.query(0, 300)["resolution"] == "1s"
+    result = rollup.query(0, 600, resolution="1s", max_points=100)
+    assert len(result["points"]) <= 100 and result["step"] == 6
+    assert sum(point[1] for point in result["points"]) == 600
+    with pytest.raises(ValueError):
+        rollup.query(0, 10, resolution="5s")
+
+
+def node_usage(cpu: float) -> dict:
+    return {
+        "cpu": {"usage": cpu},
+        "memory": {"total": 100, "used": 50},
+        "swap": {"total": 0, "used": 0},
+        "disk": {"io": {"read_bytes": 0, "write_bytes": 0}},
+        "network": {"io": {"_all": {"bytes_sent": 0, "bytes_recv": 0}}},
+    }
+
+
+class FakeSender:
+    """模拟发送队列：消息在 deliver 时才写入，drop 的消息不会回调 on_sent"""
+
+    def __init__(self):
+        self.queue = []
+        self.sent = []
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def send_json_nowait(self, data, on_sent=None):
+        self.queue.append((data, on_sent))
+
+    def send_bytes_nowait(self, data, on_sent=None):
+        self.queue.append((data, on_sent))
+
+    def deliver(self, drop: set = frozenset()):
+        queue, self.queue = self.queue, []
+        for index, (data, on_sent) in enumerate(queue):
+            if index in drop:
+                continue
+            self.sent.append(data)
+            if on_sent is not None:
+                on_sent()
+
+
+def test_forwarded_seq_advances_only_after_send(tmp_path):
+    async def run():
+        buffer = MetricsRingBuffer(str(tmp_path / "metrics"), 64)
+        sender = FakeSender()
+        cpu = iter(range(100))
+
+        async def collect():
+            return node_usage(next(cpu))
+
+        collector = UsageCollector(collect, sender, buffer, UsageRollup(), 1, backfill_rate=0)
+        for _ in range(3):
+            await collector._UsageCollector__collect_once()
+        # 已放入发送队列但尚未发送
+        assert buffer.forwarded_seq == 0
+        sender.deliver()
+        assert buffer.forwarded_seq == 3
+        for _ in range(3):
+            await collector._UsageCollector__collect_once()
+        # 第 4 条记录被丢弃，之后的记录已发送也不能越过
+        sender.deliver(drop={0})
+        assert buffer.forwarded_seq == 3
+        # 出现缺口后开始补发
+        await asyncio.sleep(0)
+        sender.deliver()
+        assert buffer.forwarded_seq == 6
+        history = [data for data in sender.sent if isinstance(data, dict)
+                   and data['action'] == 'node:upload_history_data']
+        assert [(item['data']['seq'], item['data']['count']) for item in history] == [(3, 3)]
+        collector.stop()
+
+    asyncio.run(run())
+
+
+def test_binary_upload_sends_extra_sections(tmp_path):
+    async def run():
+        buffer = MetricsRingBuffer(str(tmp_path / "metrics"), 64)
+        sender = FakeSender()
+        usage = {**node_usage(1.0), "loadavg": (0, 0, 0), "cgroup": {"version": 2}}
+        usage["cpu"]["core_usage"] = [1.0]
+        usage["disk"]["top_processes"] = [{"pid": 1}]
+
+        async def collect():
+            return usage
+
+        collector = UsageCollector(collect, sender, buffer, UsageRollup(), 1, backfill_rate=0)
+        collector.set_encoding("binary")
+        await collector._UsageCollector__collect_once()
+        sender.deliver()
+        collector.stop()
+        return sender.sent
+
+    dictionary, frame, extra = asyncio.run(run())
+    assert dictionary['action'] == 'node:usage_dictionary'
+    assert isinstance(frame, bytes)
+    # 二进制帧不包含的可选项以 JSON 随后发送
+    assert extra['action'] == 'node:usage_extra'
+    assert extra['data']['cgroup'] == {"version": 2}
+    assert extra['data']['disk'] == {"top_processes": [{"pid": 1}]}
@@ -0,0 +1,171 @@
+import os
+import shutil
+from types import SimpleNamespace
+
+import psutil
+import pytest
+
+import utils.usageSampler as usageSampler
+from utils.procfs import UsageSnapshot, DiskCounters, ProcfsUsageSource, PsutilUsageSource
+
+
+class FakeSource:
+    """按顺序返回给定的计数器快照"""
+
+    def __init__(self, snapshots: list[UsageSnapshot]):
+        self.snapshots = list(snapshots)
+
+    def read(self) -> UsageSnapshot:
+        return self.snapshots.pop(0)
+
+    def close(self):
+        pass
+
+
+def snapshot(cpu=((100, 50),), disk=(0, 0), network=None, devices=None) -> UsageSnapshot:
+    return UsageSnapshot(list(cpu), (1000, 500), (0, 0), disk, network or {}, devices)
+
+
+@pytest.fixture
+def sampler_with(monkeypatch):
+    """创建使用假计数器的采样器，clock.now 为单调时钟的当前值"""
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(usageSampler, "time", SimpleNamespace(monotonic=lambda: clock.now))
+
+    def create(*snapshots: UsageSnapshot, per_device: bool = False):
+        monkeypatch.setattr(usageSampler, "create_usage_source", lambda *args: FakeSource(snapshots))
+        return usageSampler.UsageSampler(per_device=per_device), clock
+
+    return create
+
+
+def test_rates_use_real_elapsed_time(sampler_with):
+    sampler, clock = sampler_with(
+        snapshot(cpu=((100, 50), (100, 10)), disk=(1000, 2000), network={"eth0": (0, 0)}),
+        snapshot(cpu=((300, 150), (300, 10)), disk=(5000, 2000), network={"eth0": (8000, 4000)}),
+    )
+    clock.now += 4
+    usage = sampler.sample()
+    assert usage["cpu"] == {"usage": 25.0, "core_usage": [50.0, 0.0]}
+    assert usage["disk"]["io"] == {"read_bytes": 1000, "write_bytes": 0}
+    assert usage["network"]["io"] == {
+        "_all": {"bytes_sent": 2000, "bytes_recv": 1000},
+        "eth0": {"bytes_sent": 2000, "bytes_recv": 1000},
+    }
+
+
+def test_wrapped_or_reset_counter_reports_zero_once(sampler_with):
+    wrap = 2 ** 32
+    sampler, clock = sampler_with(
+        snapshot(disk=(10_000, 10_000), network={"eth0": (wrap - 1000, 500)}),
+        # 32 位网卡计数器回绕，磁盘计数器因设备移除而变小
+        snapshot(disk=(2_000, 12_000), network={"eth0": (1000, 1500)}),
+        snapshot(disk=(4_000, 14_000), network={"eth0": (3000, 2500)}),
+    )
+    clock.now += 2
+    usage = sampler.sample()
+    # 计数器变小时不产生负数或异常大的速率
+    assert usage["disk"]["io"] == {"read_bytes": 0, "write_bytes": 1000}
+    assert usage["network"]["io"]["eth0"] == {"bytes_sent": 0, "bytes_recv": 500}
+    # 以回绕/重置后的值为新基线，下一次采样恢复正常
+    clock.now += 2
+    usage = sampler.sample()
+    assert usage["disk"]["io"] == {"read_bytes": 1000, "write_bytes": 1000}
+    assert usage["network"]["io"]["eth0"] == {"bytes_sent": 1000, "bytes_recv": 500}
+
+
+def test_new_nic_and_missing_disk(sampler_with):
+    sampler, clock = sampler_with(
+        snapshot(disk=None, network={"eth0": (0, 0)}),
+        snapshot(disk=(100, 100), network={"eth0": (10, 10), "eth1": (999, 999)}),
+    )
+    clock.now += 1
+    usage = sampler.sample()
+    # 新出现的网卡没有基线，下一次采样开始统计
+    assert set(usage["network"]["io"]) == {"_all", "eth0"}
+    assert usage["disk"]["io"] == {"read_bytes": 0, "write_bytes": 0}
+
+
+def test_zero_elapsed_time(sampler_with):
+    sampler, _ = sampler_with(
+        snapshot(cpu=((100, 50),), disk=(0, 0)),
+        snapshot(cpu=((100, 50),), disk=(100, 100)),
+    )
+    usage = sampler.sample()
+    assert usage["cpu"]["usage"] == 0.0
+    assert usage["disk"]["io"] == {"read_bytes": 0, "write_bytes": 0}
+
+
+
+def test_device_rates(sampler_with):
+    sampler, clock = sampler_with(
+        snapshot(devices={"sda": DiskCounters(10, 20, 4096, 8192, 1000, 0, 2000),
+                          "sdb": DiskCounters(0, 0, 0, 0, 0, 0, 0)}),
+        snapshot(devices={"sda": DiskCounters(30, 20, 12288, 8192, 1500, 2, 3000),
+                          "sdb": DiskCounters(0, 0, 0, 0, 0, 0, 0),
+                          "sdc": DiskCounters(1, 1, 1, 1, 1, 0, 1)}),
+        per_device=True
+    )
+    clock.now += 2
+    devices = sampler.sample()["disk"]["devices"]
+    # 从未使用过的设备与新出现的设备不上报
+    assert devices == {"sda": {
+        "read_iops": 10, "write_iops": 0, "read_bytes": 4096, "write_bytes": 0,
+        "busy": 25.0, "queue_depth": 0.5, "in_flight": 2,
+    }}
+
+
+@pytest.fixture
+def frozen_procfs(tmp_path, monkeypatch):
+    """复制 /proc 中的计数器文件，psutil 与 /proc 快速路径读取同一份数据"""
+    if not psutil.LINUX:
+        pytest.skip("/proc 快速路径仅用于 Linux")
+    (tmp_path / "net").mkdir()
+    for name in ("stat", "meminfo", "diskstats", "vmstat", "net/dev"):
+        shutil.copyfile(os.path.join("/proc", name), tmp_path / name)
+    monkeypatch.setattr(psutil, "PROCFS_PATH", str(tmp_path))
+    return tmp_path
+
+
+def cpu_seconds(cpu: list[tuple]) -> list[float]:
+    # /proc/stat 中的 CPU 时间单位为时钟滴答，psutil 换算为秒
+    ticks = os.sysconf("SC_CLK_TCK")
+    return [value / ticks for times in cpu for value in times]
+
+
+def assert_snapshots_equal(procfs: UsageSnapshot, expected: UsageSnapshot):
+    assert cpu_seconds(procfs.cpu) == pytest.approx([value for times in expected.cpu for value in times])
+    assert procfs._replace(cpu=None) == expected._replace(cpu=None)
+
+
+@pytest.mark.parametrize("per_device", [False, True])
+def test_procfs_matches_psutil(frozen_procfs, per_device):
+    procfs = ProcfsUsageSource(str(frozen_procfs), per_device)
+    snapshot = procfs.read()
+    expected = PsutilUsageSource(per_device).read()
+    if per_device:
+        # psutil 不提供队列深度相关的计数器
+        snapshot = snapshot._replace(devices={
+            name: counters._replace(in_flight=0, weighted_time=0) for name, counters in snapshot.devices.items()
+        })
+    assert_snapshots_equal(snapshot, expected)
+    # 复用打开的文件再次读取
+    assert_snapshots_equal(procfs.read()._replace(devices=snapshot.devices), expected)
+    procfs.close()
+
+
+def test_procfs_cpu_guest_time_matches_psutil(frozen_procfs):
+    # user nice system idle iowait irq softirq steal guest guest_nice
+    (frozen_procfs / "stat").write_text(
+        "cpu  700 60 300 5000 80 10 20 5 100 40\n"
+        "cpu0 400 50 200 2000 50 10 10 5 100 40\n"
+        "cpu1 300 10 100 3000 30 0 10 0 0 0\n"
+        "intr 0\nctxt 0\nbtime 0\n"
+    )
+    procfs = ProcfsUsageSource(str(frozen_procfs))
+    # guest 时间已包含在 user/nice 中，不重复计算
+    assert cpu_seconds(procfs.read().cpu) == pytest.approx(cpu_seconds([(2725, 675), (3450, 420)]))
+    assert cpu_seconds(procfs.read().cpu) == pytest.approx(
+        [value for times in PsutilUsageSource().read().cpu for value in times]
+    )
+    procfs.close()
@@ -0,0 +1,41 @@
+"""
+WebSocket 二进制帧协议
+
+所有二进制帧的第一个字节为帧类型，其后为对应类型的帧体。
+
+终端帧(terminal:output / terminal:input):
+| 1 byte 帧类型 | 16 bytes 会话uuid | 原始字节数据 |
+
+节点占用帧(node:upload_running_data 的二进制编码，格式见 utils.usageEncoding):
+| 1 byte 帧类型 | 1 byte schema id | 2 bytes 字典版本 | 定长数据 |
+"""
+import uuid
+
+# 终端输出(节点 -> 服务端)
+FRAME_TERMINAL_OUTPUT = 0x01
+# 终端输入(服务端 -> 节点)
+FRAME_TERMINAL_INPUT = 0x02
+# 节点占用数据(节点 -> 服务端)
+FRAME_USAGE = 0x03
+
+SESSION_ID_SIZE = 16
+
+
+def pack_session_frame(frame_type: int, session_id: str, payload: bytes) -> bytes:
+    """打包终端帧"""
+    return bytes((frame_type,)) + uuid.UUID(session_id).bytes + payload
+
+
+def unpack_session_frame(data: bytes) -> tuple[str, bytes]:
+    """解包终端帧，返回 (会话uuid, 原始字节数据)"""
+    if len(data) < 1 + SESSION_ID_SIZE:
+        raise ValueError("终端帧长度不正确")
+    session_id = str(uuid.UUID(bytes=bytes(data[1:1 + SESSION_ID_SIZE])))
+    return session_id, bytes(data[1 + SESSION_ID_SIZE:])
+
+
+def get_frame_type(data: bytes) -> int:
+    """获取帧类型"""
+    if not data:
+        raise ValueError("空的二进制帧")
+    return data[0]
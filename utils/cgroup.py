@@ -0,0 +1,343 @@
+import os
+import re
+import time
+
+import psutil
+
+# 当前进程的挂载表、所在 cgroup 与全局 PSI 目录
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+CGROUP_MEMBERSHIP_PATH = "/proc/self/cgroup"
+PRESSURE_PATH = "/proc/pressure"
+# 超过该值的内存限制视为无限制(v1 中未设置限制时为接近 2^63 的值)
+UNLIMITED = 1 << 62
+# 容器 cgroup 目录名中的容器id(docker / containerd / cri-o)
+CONTAINER_ID_PATTERN = re.compile(r"([0-9a-f]{64})")
+
+
+def read_text(path: str) -> str | None:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except (OSError, ValueError):
+        return None
+
+
+def read_int(path: str) -> int | None:
+    value = read_text(path)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_keyed(path: str) -> dict[str: int]:
+    """读取 "key value" 格式的文件(memory.stat / cpu.stat)"""
+    values = {}
+    text = read_text(path)
+    if not text:
+        return values
+    for line in text.splitlines():
+        key, _, value = line.partition(" ")
+        try:
+            values[key] = int(value)
+        except ValueError:
+            continue
+    return values
+
+
+def read_pressure(path: str) -> dict | None:
+    """读取 PSI 文件，返回 {'some': {'avg10', 'avg60', 'avg300'}, 'full': {...}}"""
+    text = read_text(path)
+    if not text:
+        return None
+    pressure = {}
+    for line in text.splitlines():
+        kind, *fields = line.split()
+        values = dict(field.split("=", 1) for field in fields)
+        pressure[kind] = {key: float(values[key]) for key in ("avg10", "avg60", "avg300") if key in values}
+    return pressure
+
+
+def cgroup_mounts() -> list[tuple[str, str, str, set[str]]]:
+    """cgroup 挂载点列表 [(挂载根路径, 挂载点, 文件系统类型, 挂载选项)]"""
+    mounts = []
+    for line in (read_text(MOUNTINFO_PATH) or "").splitlines():
+        fields = line.split()
+        separator = fields.index("-")
+        fs_type = fields[separator + 1]
+        if fs_type in ("cgroup", "cgroup2"):
+            mounts.append((fields[3], fields[4], fs_type, set(fields[separator + 3].split(","))))
+    return mounts
+
+
+def resolve_cgroup_path(mount_root: str, mount_point: str, path: str) -> str:
+    """将 /proc/self/cgroup 中的路径转换为 cgroupfs 目录"""
+    resolved = os.path.normpath(os.path.join(mount_point, os.path.relpath(path, mount_root)))
+    if not resolved.startswith(mount_point) or not os.path.isdir(resolved):
+        # 容器内仅挂载了自身的 cgroup 时，挂载点即为所在 cgroup
+        return mount_point
+    return resolved
+
+
+def find_cgroup_paths(mounts: list) -> tuple[str | None, dict[str: str]]:
+    """定位当前进程所在的 cgroup 目录，返回 (v2 目录, {v1 控制器: 目录})"""
+    memberships = {}
+    for line in (read_text(CGROUP_MEMBERSHIP_PATH) or "").splitlines():
+        hierarchy_id, controllers, path = line.split(":", 2)
+        memberships[controllers] = path
+    v2_path = None
+    v1_paths = {}
+    for root, mount_point, fs_type, options in mounts:
+        if fs_type == "cgroup2" and "" in memberships:
+            v2_path = resolve_cgroup_path(root, mount_point, memberships[""])
+        elif fs_type == "cgroup":
+            for controllers, path in memberships.items():
+                if controllers and options.issuperset(controllers.split(",")):
+                    for controller in controllers.split(","):
+                        v1_paths[controller] = resolve_cgroup_path(root, mount_point, path)
+    return v2_path, v1_paths
+
+
+class CgroupSampler:
+    """
+    cgroup 资源统计
+
+    自动识别 cgroup v2 统一层级或 v1 各控制器的挂载位置，读取当前进程所在 cgroup 的
+    CPU 配额、内存限制与用量以及 PSI 压力指标；所有数据直接读取 cgroupfs 文件。
+    内存用量与 docker stats 一致，不计入可回收的 inactive_file 页缓存。
+    """
+    version: int
+    __cpu_path: str
+    __cpuacct_path: str
+    __memory_path: str
+    __pressure_path: str
+    __last_time: float | None = None
+    __last_cpu_usage: int | None = None
+
+    def __init__(self, version: int, v2_path: str | None, v1_paths: dict[str: str]):
+        self.version = version
+        if version == 2:
+            self.__cpu_path = self.__cpuacct_path = self.__memory_path = self.__pressure_path = v2_path
+        else:
+            self.__cpu_path = v1_paths.get("cpu")
+            self.__cpuacct_path = v1_paths.get("cpuacct")
+            self.__memory_path = v1_paths.get("memory")
+            # 混合模式下 v2 层级未启用控制器，但仍可读取 PSI
+            self.__pressure_path = v2_path
+
+    def cpu_quota(self) -> float | None:
+        """CPU 配额(核心数)，未限制时返回 None"""
+        if self.version == 2:
+            quota, _, period = (read_text(os.path.join(self.__cpu_path, "cpu.max")) or "max").partition(" ")
+            if quota == "max" or not period:
+                return None
+            return int(quota) / int(period)
+        if not self.__cpu_path:
+            return None
+        quota = read_int(os.path.join(self.__cpu_path, "cpu.cfs_quota_us"))
+        period = read_int(os.path.join(self.__cpu_path, "cpu.cfs_period_us"))
+        if quota is None or quota < 0 or not period:
+            return None
+        return quota / period
+
+    def memory_limit(self) -> int | None:
+        """内存限制(字节)，未限制时返回 None"""
+        if not self.__memory_path:
+            return None
+        name = "memory.max" if self.version == 2 else "memory.limit_in_bytes"
+        limit = read_int(os.path.join(self.__memory_path, name))
+        if limit is None or limit >= UNLIMITED:
+            return None
+        return limit
+
+    def memory_usage(self) -> int | None:
+        if not self.__memory_path:
+            return None
+        if self.version == 2:
+            usage = read_int(os.path.join(self.__memory_path, "memory.current"))
+            inactive_file = read_keyed(os.path.join(self.__memory_path, "memory.stat")).get("inactive_file", 0)
+        else:
+            usage = read_int(os.path.join(self.__memory_path, "memory.usage_in_bytes"))
+            inactive_file = read_keyed(os.path.join(self.__memory_path, "memory.stat")).get("total_inactive_file", 0)
+        if usage is None:
+            return None
+        return max(0, usage - inactive_file)
+
+    def __cpu_usage_ns(self) -> int | None:
+        """cgroup 累计 CPU 时间(纳秒)"""
+        if self.version == 2:
+            usage = read_keyed(os.path.join(self.__cpu_path, "cpu.stat")).get("usage_usec")
+            return usage * 1000 if usage is not None else None
+        if not self.__cpuacct_path:
+            return None
+        return read_int(os.path.join(self.__cpuacct_path, "cpuacct.usage"))
+
+    def pressure(self) -> dict:
+        pressure = {}
+        for resource in ("cpu", "memory", "io"):
+            value = None
+            if self.__pressure_path:
+                value = read_pressure(os.path.join(self.__pressure_path, f"{resource}.pressure"))
+            if value is None:
+                # 无 cgroup 级别的 PSI 时使用全局 PSI
+                value = read_pressure(os.path.join(PRESSURE_PATH, resource))
+            if value is not None:
+                pressure[resource] = value
+        return pressure
+
+    def limits(self) -> dict:
+        """cgroup 限制(节点信息)"""
+        return {
+            "version": self.version,
+            "cpu_quota": self.cpu_quota(),
+            "memory_limit": self.memory_limit(),
+        }
+
+    def sample(self) -> dict:
+        """采样 cgroup 占用，CPU 占用率相对于配额(无配额时相对于全部核心)"""
+        now = time.monotonic()
+        cpu_usage_ns = self.__cpu_usage_ns()
+        cpu_quota = self.cpu_quota()
+        cpu_usage = None
+        if cpu_usage_ns is not None and self.__last_cpu_usage is not None and now > self.__last_time:
+            cores = (cpu_usage_ns - self.__last_cpu_usage) / 1e9 / (now - self.__last_time)
+            cpu_usage = round(min(100.0, max(0.0, cores / (cpu_quota or psutil.cpu_count() or 1) * 100)), 1)
+        self.__last_time = now
+        self.__last_cpu_usage = cpu_usage_ns
+        return {
+            "version": self.version,
+            "cpu_quota": cpu_quota,
+            "cpu_usage": cpu_usage,
+            "memory_limit": self.memory_limit(),
+            "memory_usage": self.memory_usage(),
+            "pressure": self.pressure(),
+        }
+
+
+class ContainerSampler:
+    """
+    容器资源统计
+
+    在 cgroup 层级中查找目录名包含容器id的 cgroup(每隔 REFRESH_INTERVAL 秒重新扫描)，
+    读取各容器的 CPU 与内存占用。
+    """
+    REFRESH_INTERVAL = 30
+    MAX_DEPTH = 4
+
+    __version: int
+    __cpu_root: str | None
+    __memory_root: str | None
+    __containers: dict[str: tuple[str | None, str | None]]
+    __refresh_time: float = 0
+    __last_time: float | None = None
+    __last_cpu_usage: dict[str: int]
+
+    def __init__(self, version: int, v2_root: str | None, v1_roots: dict[str: str]):
+        self.__version = version
+        if version == 2:
+            self.__cpu_root = self.__memory_root = v2_root
+        else:
+            self.__cpu_root = v1_roots.get("cpuacct")
+            self.__memory_root = v1_roots.get("memory")
+        self.__containers = {}
+        self.__last_cpu_usage = {}
+
+    def __scan(self, root: str | None) -> dict[str: str]:
+        found = {}
+        if not root:
+            return found
+        base_depth = root.rstrip("/").count("/")
+        for path, dirs, _ in os.walk(root):
+            match = CONTAINER_ID_PATTERN.search(os.path.basename(path))
+            if match:
+                found[match.group(1)] = path
+                # 容器内部的子 cgroup 不再扫描
+                dirs.clear()
+            elif path.count("/") - base_depth >= self.MAX_DEPTH:
+                dirs.clear()
+        return found
+
+    def __refresh(self):
+        cpu_paths = self.__scan(self.__cpu_root)
+        memory_paths = cpu_paths if self.__memory_root == self.__cpu_root else self.__scan(self.__memory_root)
+        self.__containers = {
+            container_id: (cpu_paths.get(container_id), memory_paths.get(container_id))
+            for container_id in set(cpu_paths) | set(memory_paths)
+        }
+        for container_id in [item for item in self.__last_cpu_usage if item not in self.__containers]:
+            del self.__last_cpu_usage[container_id]
+        self.__refresh_time = time.monotonic()
+
+    def __cpu_usage_ns(self, path: str | None) -> int | None:
+        if not path:
+            return None
+        if self.__version == 2:
+            usage = read_keyed(os.path.join(path, "cpu.stat")).get("usage_usec")
+            return usage * 1000 if usage is not None else None
+        return read_int(os.path.join(path, "cpuacct.usage"))
+
+    def __memory_usage(self, path: str | None) -> int | None:
+        if not path:
+            return None
+        if self.__version == 2:
+            return read_int(os.path.join(path, "memory.current"))
+        return read_int(os.path.join(path, "memory.usage_in_bytes"))
+
+    def sample(self) -> list[dict]:
+        """采样所有容器，cpu_usage 为占用的核心数百分比(100 表示一个核心)"""
+        now = time.monotonic()
+        if now - self.__refresh_time >= self.REFRESH_INTERVAL:
+            self.__refresh()
+        elapsed = now - self.__last_time if self.__last_time is not None else 0
+        self.__last_time = now
+        containers = []
+        for container_id, (cpu_path, memory_path) in self.__containers.items():
+            cpu_usage_ns = self.__cpu_usage_ns(cpu_path)
+            if cpu_usage_ns is None and not (memory_path and os.path.exists(memory_path)):
+                # 容器已退出
+                continue
+            last = self.__last_cpu_usage.get(container_id)
+            cpu_usage = None
+            if cpu_usage_ns is not None and last is not None and elapsed > 0:
+                cpu_usage = round(max(0, cpu_usage_ns - last) / 1e9 / elapsed * 100, 1)
+            if cpu_usage_ns is not None:
+                self.__last_cpu_usage[container_id] = cpu_usage_ns
+            containers.append({
+                "id": container_id[:12],
+                "cpu_usage": cpu_usage,
+                "memory_usage": self.__memory_usage(memory_path),
+            })
+        return containers
+
+
+def create_cgroup_samplers(container_stats: bool = False) -> tuple[CgroupSampler | None, ContainerSampler | None]:
+    """识别 cgroup 层级并创建统计器，非 Linux 或无法识别时返回 None"""
+    if not psutil.LINUX:
+        return None, None
+    try:
+        mounts = cgroup_mounts()
+        v2_path, v1_paths = find_cgroup_paths(mounts)
+    except (ValueError, IndexError):
+        return None, None
+    if v2_path and not v1_paths.get("memory") and read_text(os.path.join(v2_path, "cgroup.controllers")):
+        version = 2
+    elif v1_paths:
+        # 包括 v1 与 v2 混合模式(v2 层级未启用控制器)
+        version = 1
+    else:
+        return None, None
+    cgroup_sampler = CgroupSampler(version, v2_path, v1_paths)
+    container_sampler = None
+    if container_stats:
+        # 从层级根目录扫描容器
+        v2_root = None
+        v1_roots = {}
+        for root, mount_point, fs_type, options in mounts:
+            if fs_type == "cgroup2":
+                v2_root = mount_point
+            else:
+                for controller in ("cpuacct", "memory"):
+                    if controller in options:
+                        v1_roots[controller] = mount_point
+        container_sampler = ContainerSampler(version, v2_root, v1_roots)
+    return cgroup_sampler, container_sampler
@@ -52,7 +52,91 @@ execute_command = true
 # 允许服务器连接终端
 connect_terminal = true
 # 允许下载服务器上的文件
-download_file = true"""
+download_file = true
+
+[output]
+# 合并任务/命令输出后再发送(需服务端支持 lines 字段)
+batch_output = false
+# 合并窗口(毫秒)，超过该时间无新输出则立即发送
+batch_window = 50
+# 最大延迟(毫秒)，持续输出时最多等待该时间即发送
+batch_max_latency = 200
+# 单条消息最大合并字节数
+batch_max_bytes = 65536
+
+[terminal]
+# 终端录像压缩方式: none / gzip / zstd(需安装 zstandard)
+record_compression = "gzip"
+
+[disk]
+# 不上报的文件系统类型
+ignore_fs_types = ["tmpfs", "devtmpfs", "overlay", "squashfs", "nsfs", "autofs", "ramfs"]
+# 不上报的挂载点前缀
+ignore_mount_prefixes = ["/var/lib/docker/", "/var/lib/kubelet/", "/run/", "/snap/"]
+# 同一设备多次挂载时只上报第一个挂载点
+dedupe_device = true
+# 单个挂载点获取用量的超时时间(秒)，超时的挂载点沿用上一次的用量
+usage_timeout = 1
+
+[executor]
+# 执行阻塞调用(psutil/文件系统/数据库)的线程数
+max_workers = 4
+# 最大排队任务数，超出时拒绝新的调用
+max_queue = 64
+# 事件循环被阻塞超过该时间(毫秒)时输出警告
+loop_lag_threshold = 100
+
+[metrics]
+# 采样间隔(秒)，连接后使用服务端下发的上报间隔
+sample_interval = 2
+# 本地环形缓冲区保存的采样条数，断开连接期间的采样在重连后补发
+buffer_size = 43200
+# 每批补发的记录数
+backfill_batch_size = 500
+# 每秒最多补发的批数
+backfill_rate = 2
+# Linux 下直接解析 /proc 采集占用(关闭后使用 psutil)
+procfs_fast_path = true
+# 上报每个磁盘的 IOPS、吞吐、忙碌百分比与队列深度
+per_disk_io = false
+# 上报 cgroup 层级中各容器的 CPU 与内存占用
+container_stats = false
+
+[task_runner]
+# 同时运行的任务进程数上限
+max_concurrent = 4
+# 等待执行的任务触发数上限，超出时拒绝
+max_queue = 100
+
+[process_limits]
+# 任务与命令执行的默认资源限制，可被任务下发的 limits 覆盖，0 表示不限制
+# CPU 时间(秒)
+cpu_time = 0
+# 虚拟内存(MB)
+memory = 0
+# 运行时长(秒)
+wall_time = 0
+# 输出大小(MB)
+output_size = 0
+
+[task_state]
+# 任务执行次数批量写入数据库的间隔(秒)
+flush_interval = 5
+# 运行记录保留天数
+history_days = 90
+
+[task_log]
+# 任务运行结束后使用 gzip 压缩日志
+compress = true
+# 每个任务最多保留的运行记录数
+max_runs = 100
+# 运行记录最长保留天数
+max_age_days = 30
+# 每个任务日志的总大小上限(MB)
+max_total_size = 100
+# 输出写入缓冲区大小(字节)
+buffer_size = 262144
+"""
         with open("config.toml", "w",encoding='utf-8') as f:
             f.write(file_data)
         logger.info("配置文件已初始化，请填写完成后重启本程序")
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import select
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import psutil
+
+from utils.executor import run_blocking
+from utils.logger import logger
+
+
+class DiskPartitionCache:
+    """
+    磁盘分区缓存
+
+    Linux 下通过 poll /proc/self/mountinfo 感知挂载表变化，仅在变化时重新读取分区列表；
+    其他平台每隔 REFRESH_INTERVAL 秒重新读取。
+    每个挂载点的用量只调用一次 statvfs，并在独立的线程池中执行(卡住的调用不会占用公共执行器)，
+    超时的挂载点(如失去响应的 NFS)会被跳过并沿用上一次的用量，直到该次调用返回前不会再次提交。
+    线程池大小随分区数增长，每个挂载点最多占用一个线程，卡住的挂载点不会让其他挂载点无线程可用。
+    从未成功获取过用量的挂载点上报 total/used 为 None(未知)，而不是 0。
+    """
+    MOUNTINFO_PATH = "/proc/self/mountinfo"
+    # 无法感知挂载表变化时的刷新间隔(秒)
+    REFRESH_INTERVAL = 60
+    DEFAULT_IGNORE_FS_TYPES = ["tmpfs", "devtmpfs", "overlay", "squashfs", "nsfs", "autofs", "ramfs"]
+    DEFAULT_IGNORE_MOUNT_PREFIXES = ["/var/lib/docker/", "/var/lib/kubelet/", "/run/", "/snap/"]
+
+    __partitions: list
+    __refresh_time: float = 0
+    __mountinfo_fd: int | None = None
+    __poller: any = None
+    __executor: ThreadPoolExecutor | None = None
+    __max_workers: int = 0
+    __pending: dict[str: Future]
+    __usage: dict[str: tuple[int, int] | None]
+
+    def __init__(self, disk_config: dict = None):
+        disk_config = disk_config or {}
+        self.__ignore_fs_types = set(disk_config.get('ignore_fs_types', self.DEFAULT_IGNORE_FS_TYPES))
+        self.__ignore_mount_prefixes = tuple(
+            disk_config.get('ignore_mount_prefixes', self.DEFAULT_IGNORE_MOUNT_PREFIXES)
+        )
+        self.__dedupe_device = disk_config.get('dedupe_device', True)
+        self.__usage_timeout = disk_config.get('usage_timeout', 1)
+        self.__partitions = []
+        self.__pending = {}
+        self.__usage = {}
+        if sys.platform.startswith('linux') and os.path.exists(self.MOUNTINFO_PATH):
+            try:
+                self.__mountinfo_fd = os.open(self.MOUNTINFO_PATH, os.O_RDONLY)
+                self.__poller = select.poll()
+                self.__poller.register(self.__mountinfo_fd, select.POLLPRI | select.POLLERR)
+            except OSError as err:
+                logger.warning(f"无法监听挂载表变化: {err}")
+                self.__mountinfo_fd = None
+
+    def __mount_table_changed(self) -> bool:
+        if not self.__refresh_time:
+            return True
+        if self.__mountinfo_fd is None:
+            return time.monotonic() - self.__refresh_time >= self.REFRESH_INTERVAL
+        return bool(self.__poller.poll(0))
+
+    def __consume_mountinfo(self):
+        """读取 mountinfo，清除 poll 的变化事件"""
+        if self.__mountinfo_fd is None:
+            return
+        os.lseek(self.__mountinfo_fd, 0, os.SEEK_SET)
+        while os.read(self.__mountinfo_fd, 65536):
+            pass
+
+    def __is_ignored(self, partition) -> bool:
+        if partition.fstype in self.__ignore_fs_types:
+            return True
+        mountpoint = partition.mountpoint.rstrip("/") + "/"
+        return mountpoint.startswith(self.__ignore_mount_prefixes)
+
+    def partitions(self) -> list:
+        """获取分区列表，挂载表未变化时直接返回缓存"""
+        if not self.__mount_table_changed():
+            return self.__partitions
+        self.__consume_mountinfo()
+        partitions = []
+        devices = set()
+        for partition in psutil.disk_partitions():
+            if self.__is_ignored(partition):
+                continue
+            if self.__dedupe_device and partition.device in devices:
+                continue
+            devices.add(partition.device)
+            partitions.append(partition)
+        self.__partitions = partitions
+        self.__refresh_time = time.monotonic()
+        mountpoints = {partition.mountpoint for partition in partitions}
+        for mountpoint in [item for item in self.__usage if item not in mountpoints]:
+            del self.__usage[mountpoint]
+        logger.debug(f"磁盘分区列表已刷新，共 {len(partitions)} 个分区")
+        return partitions
+
+    def __ensure_workers(self, count: int):
+        """
+        按分区数扩大线程池
+
+        ThreadPoolExecutor 无法调整大小，扩大时新建线程池，旧线程池中卡住的调用在返回后随旧线程池退出；
+        仍未返回的挂载点不会再次提交，因此新线程池的线程足够其余挂载点使用。
+        """
+        if count <= self.__max_workers:
+            return
+        previous = self.__executor
+        self.__executor = ThreadPoolExecutor(max_workers=count, thread_name_prefix="DiskUsage")
+        self.__max_workers = count
+        if previous is not None:
+            previous.shutdown(wait=False)
+
+    @staticmethod
+    def __get_usage(mountpoint: str) -> tuple[int, int]:
+        """获取挂载点用量 (total, used)"""
+        if sys.platform == 'win32':
+            usage = psutil.disk_usage(mountpoint)
+            return usage.total, usage.used
+        stat = os.statvfs(mountpoint)
+        return stat.f_blocks * stat.f_frsize, (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+
+    async def get_disk_list(self) -> list[dict]:
+        """获取分区列表及用量"""
+        partitions = await run_blocking(self.partitions)
+        self.__ensure_workers(len(partitions))
+        waiting = {}
+        for partition in partitions:
+            mountpoint = partition.mountpoint
+            pending = self.__pending.get(mountpoint)
+            if pending is not None and not pending.done():
+                # 上一次调用仍未返回，不再重复提交
+                continue
+            future = self.__executor.submit(self.__get_usage, mountpoint)
+            self.__pending[mountpoint] = future
+            waiting[asyncio.wrap_future(future)] = mountpoint
+        if waiting:
+            done, not_done = await asyncio.wait(waiting.keys(), timeout=self.__usage_timeout)
+            for future in done:
+                mountpoint = waiting[future]
+                self.__pending.pop(mountpoint, None)
+                try:
+                    self.__usage[mountpoint] = future.result()
+                except Exception as err:
+                    logger.warning(f"获取挂载点 {mountpoint} 用量失败: {err}")
+                    self.__usage.setdefault(mountpoint, None)
+            for future in not_done:
+                logger.warning(f"获取挂载点 {waiting[future]} 用量超时")
+        disk_list = []
+        for partition in partitions:
+            # 未知用量上报 None，沿用上一次用量时保持不变
+            total, used = self.__usage.get(partition.mountpoint) or (None, None)
+            disk_list.append({
+                "device": partition.device,
+                "mount_point": partition.mountpoint,
+                "fs_type": partition.fstype,
+                "total": total,
+                "used": used
+            })
+        return disk_list
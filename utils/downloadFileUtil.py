@@ -9,6 +9,7 @@ import re
 from urllib.parse import unquote, urlparse
 
 from aiohttp import ClientSession
+from utils.executor import run_blocking
 from utils.logger import logger
 
 import utils.websocket as websocket
@@ -34,12 +35,10 @@ class DownloadTaskConfig:
 
 class DownloadFileUtil:
     __websocket: websocket
-    __websocket_message_queue: Queue
     __session: ClientSession
     __download_queue: Queue
     __max_download_thread: int = 0
     __download_threads: int = 0
-    __handle_websocket_thread: Thread | None = None
     __handle_download_start_thread: Thread | None = None
     __url: str
     __loop: asyncio.AbstractEventLoop
@@ -53,17 +52,14 @@ class DownloadFileUtil:
         self.__websocket = ws
         self.__session = client_session
         self.__url = url
-        self.__websocket_message_queue = Queue()
         self.__download_queue = Queue()
         self.__max_download_thread = max_download_threads
         self.__loop = asyncio.get_event_loop()  # 获取当前事件循环
 
     def __del__(self):
         self.__download_queue.queue.clear()
-        self.__websocket_message_queue.queue.clear()
         try:
             del self.__handle_download_start_thread
-            del self.__handle_websocket_thread
         except AttributeError:
             pass
 
@@ -102,8 +98,7 @@ class DownloadFileUtil:
         :param download_task: 下载任务实例
         :return:
         """
-        if not os.path.exists(download_task.save_path):
-            os.makedirs(download_task.save_path)
+        await run_blocking(os.makedirs, download_task.save_path, exist_ok=True)
         try:
             async with self.__session.get(self.__url, params={
                 'task': download_task.task_id,
@@ -169,32 +164,7 @@ class DownloadFileUtil:
         """发送websocket action消息"""
         if payload is None:
             payload = {}
-
-        self.__websocket_message_queue.put({'action': action, 'data': payload})
-        if self.__handle_websocket_thread is None:
-            self.__handle_websocket_thread = Thread(
-                target=self.__handle_websocket_queue,
-                args=()
-            )
-            self.__handle_websocket_thread.start()
-
-    def __handle_websocket_queue(self):
-        """
-        处理消息发送队列
-        :return:
-        """
-        while True:
-            task = self.__websocket_message_queue.get()
-            if not task:
-                break
-            try:
-                asyncio.run_coroutine_threadsafe(
-                    self.__websocket.websocket_send_json(task),
-                    self.__loop
-                )
-            except Exception as err:
-                logger.error(f"Send WebSocket Message Error: {err}")
-        self.__handle_websocket_thread = None
+        self.__websocket.send_json_nowait({'action': action, 'data': payload})
 
     def __handle_download_queue(self):
         """
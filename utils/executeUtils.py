@@ -1,45 +1,67 @@
-import asyncio
 import locale
 import os
 import subprocess
 import sys
 import tempfile
 import time
-from threading import Thread
-from queue import Queue
+from threading import Lock
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from utils.logger import logger
+from utils.config import config
+from utils.outputBatcher import OutputBatcher
+from utils.outputReader import OutputReader
+from utils.processLimits import ProcessLimits, ProcessMonitor
 import utils.websocket as websocket
 
 
 class executeUtils:
+    # 进程结束时上报的错误输出最大长度
+    MAX_ERROR_SIZE = 65536
+
     __websocket: websocket
-    __websocket_message_queue: Queue
-    __handle_websocket_thread: Thread | None = None
     __scheduler: BackgroundScheduler
-    __process_list: dict[str: subprocess.Popen] = {}
-    __get_process_thread: Thread | None = None
+    __process_list: dict[str: subprocess.Popen]
+    __process_error: dict[str:str]
+    __process_monitor: dict[str: ProcessMonitor]
+    __output_reader: OutputReader
+    __output_batcher: OutputBatcher | None
     __data_path: str
     __record_path: str
-    __record_fd: dict[str:any] = {}
-    __temp_filename: dict[str:str] = {}
+    __record_fd: dict[str:any]
+    __temp_filename: dict[str:str]
+    __lock: Lock
+    __closing: bool = False
+    __closed: bool = False
 
     def __init__(self, ws):
         self.__websocket = ws
+        # 每次连接创建新的实例，进程状态不能放在类属性中共享
+        self.__process_list = {}
+        self.__process_error = {}
+        self.__process_monitor = {}
+        self.__record_fd = {}
+        self.__temp_filename = {}
+        self.__lock = Lock()
         self.__scheduler = BackgroundScheduler()
-        self.__websocket_message_queue = Queue()
+        self.__output_reader = OutputReader(self.__on_process_output, self.__on_process_exit, "ExecuteOutputReader")
+        self.__output_batcher = OutputBatcher.from_config(
+            lambda meta, entries: self.__send_websocket_action('execute:output', {**meta, 'lines': entries}),
+            config().get_config().get('output'),
+            "ExecuteOutputBatcher"
+        )
         # 初始化执行数据保存路径
         self.__record_path = os.path.join(self.__websocket.get_base_data_save_path(), "shell_execute")
         if not os.path.exists(self.__record_path):
             os.mkdir(self.__record_path)
 
-    def executeShellCommand(self, execute_uuid, execute_path, shell_command):
+    def executeShellCommand(self, execute_uuid, execute_path, shell_command, limits: dict = None):
         """
         执行Shell命令
         :param execute_uuid: 执行器uuid
         :param execute_path: 执行路径
         :param shell_command: 命令
+        :param limits: 资源限制(格式同任务的 limits)
         :return:
         """
 
@@ -48,10 +70,11 @@ class executeUtils:
         else:
             run = self.__run_bat
 
-        run(shell_command, execute_uuid, execute_path)
+        run(shell_command, execute_uuid, execute_path,
+            ProcessLimits.from_config(limits, config().get_config().get('process_limits')))
 
     @logger.catch
-    def __run_shell(self, script, uuid, cwd: str = None):
+    def __run_shell(self, script, uuid, cwd: str = None, limits: ProcessLimits = None):
         """
         运行Shell脚本
         """
@@ -71,15 +94,22 @@ class executeUtils:
             'timestamp': time.time()
         })
 
-        # 执行多行 shell 脚本，设置 shell=True 并使用 bash 解释器执行
-        self.__process_list[uuid] = subprocess.Popen(
-            script,
-            shell=True,
-            cwd=cwd,
-            executable='/bin/bash',
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
+        with self.__lock:
+            # 关闭后输出读取器不再接收新的进程
+            if self.__closing:
+                logger.warning(f"执行器已关闭，拒绝执行命令: {uuid}")
+                return
+            # 执行多行 shell 脚本，设置 shell=True 并使用 bash 解释器执行
+            self.__process_list[uuid] = subprocess.Popen(
+                script,
+                shell=True,
+                cwd=cwd,
+                executable='/bin/bash',
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **(limits or ProcessLimits()).popen_kwargs()
+            )
+        self.__process_monitor[uuid] = ProcessMonitor(self.__process_list[uuid], limits or ProcessLimits())
 
         self.__record_fd[uuid] = open(os.path.join(save_path, uuid), "w+", encoding='utf-8')
         record_info = (
@@ -93,16 +123,11 @@ class executeUtils:
             f"[OUTPUT]\n"
         )
         self.__record_fd[uuid].write(record_info)
-        # 如果线程不存在则初始化线程
-        if self.__get_process_thread is None:
-            self.__get_process_thread = Thread(
-                target=self.__get_process_output,
-                args=()
-            )
-            self.__get_process_thread.start()
+        self.__process_error[uuid] = ""
+        self.__output_reader.add(uuid, self.__process_list[uuid])
 
     @logger.catch
-    def __run_bat(self, script, uuid, cwd: str = None):
+    def __run_bat(self, script, uuid, cwd: str = None, limits: ProcessLimits = None):
         """运行批处理"""
         if not cwd:
             cwd = os.path.join(os.getcwd(), "bat_run")
@@ -125,13 +150,21 @@ class executeUtils:
             temp_file.write(script.encode(locale.getpreferredencoding()))
             temp_filename = temp_file.name
 
-        # 执行批处理文件并捕获标准输出和标准错误输出
-        self.__process_list[uuid] = subprocess.Popen(
-            temp_filename,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
+        with self.__lock:
+            # 关闭后输出读取器不再接收新的进程
+            if self.__closing:
+                logger.warning(f"执行器已关闭，拒绝执行命令: {uuid}")
+                os.remove(temp_filename)
+                return
+            # 执行批处理文件并捕获标准输出和标准错误输出
+            self.__process_list[uuid] = subprocess.Popen(
+                temp_filename,
+                shell=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **(limits or ProcessLimits()).popen_kwargs()
+            )
+        self.__process_monitor[uuid] = ProcessMonitor(self.__process_list[uuid], limits or ProcessLimits())
         self.__temp_filename[uuid] = temp_filename
         self.__record_fd[uuid] = open(os.path.join(save_path, uuid), "w+", encoding='utf-8')
         record_info = (
@@ -145,87 +178,111 @@ class executeUtils:
             f"[OUTPUT]\n"
         )
         self.__record_fd[uuid].write(record_info)
-        # 如果线程不存在则初始化线程
-        if self.__get_process_thread is None:
-            self.__get_process_thread = Thread(
-                target=self.__get_process_output,
-                args=()
-            )
-            self.__get_process_thread.start()
+        self.__process_error[uuid] = ""
+        self.__output_reader.add(uuid, self.__process_list[uuid])
 
-    @logger.catch
-    def __get_process_output(self):
-        """获取所有进程输出"""
-        logger.debug("获取进程输出开始")
-        while len(self.__process_list) > 0:
-            close_list = []
-            for i in self.__process_list:
-                process = self.__process_list[i]
-                line = process.stdout.readline()
-                line = line.strip().decode(locale.getpreferredencoding(), errors="ignore")
-                if line:
-                    logger.debug(f'[uuid: {i}]Subprogram output: {line}')
-                    self.__record_fd[i].write(f"{line}\n")
-                    self.__send_websocket_action("execute:output", {
-                        'uuid': i,
-                        'line': line,
-                        'timestamp': time.time()
-                    })
-                if process.poll() is not None and not line:
-                    stdout, stderr = process.communicate()
-                    if stderr:
-                        logger.error(f"执行错误:{stderr.decode()}")
-                    logger.debug(f"[uuid: {i}]进程结束(code:{process.poll()})")
-                    self.__send_websocket_action("execute:stop", {
-                        'uuid': i,
-                        'code': process.returncode,
-                        'error': stderr.decode(),
-                        'timestamp': time.time()
-                    })
-                    end_info = (
-                        f"[OUTPUT]\n\n"
-                        f"[END]\n"
-                        f"end time: {time.time()}\n"
-                        f"return: {process.returncode}\n"
-                    )
-                    end_info += f"error: {stderr.decode()}\n" if stderr else ""
-                    end_info += f"[END]"
-
-                    if sys.platform == 'win32':
-                        temp_filename = self.__temp_filename[i]
-                        # 删除临时批处理文件
-                        if os.path.exists(temp_filename):
-                            os.remove(temp_filename)
-
-                    self.__record_fd[i].write(end_info)
-                    close_list.append(i)
-            for i in close_list:
-                logger.debug(f"delete process: {i}")
-                del self.__process_list[i]
-                self.__record_fd[i].close()
-        logger.debug("获取进程输出结束")
-        self.__get_process_thread = None
+    def __on_process_output(self, uuid, stream, lines: list[bytes]):
+        """处理进程输出(由输出读取线程回调)"""
+        encoding = locale.getpreferredencoding()
+        self.__process_monitor[uuid].add_output(sum(len(line) + 1 for line in lines))
+        if stream == "stderr":
+            error = "\n".join(line.decode(encoding, errors="ignore") for line in lines)
+            logger.debug(f'[uuid: {uuid}]Subprogram error: {error}')
+            # 仅保留最后一部分错误输出，避免错误输出过多时占满内存
+            self.__process_error[uuid] = (self.__process_error.get(uuid, "") + error + "\n")[-self.MAX_ERROR_SIZE:]
+            return
+        timestamp = time.time()
+        output = []
+        for line in lines:
+            line = line.strip().decode(encoding, errors="ignore")
+            if not line:
+                continue
+            logger.debug(f'[uuid: {uuid}]Subprogram output: {line}')
+            output.append(line)
+        if not output:
+            return
+        self.__record_fd[uuid].write("\n".join(output) + "\n")
+        if self.__output_batcher is not None:
+            self.__output_batcher.add(uuid, {'uuid': uuid}, output, timestamp)
+            return
+        for line in output:
+            self.__send_websocket_action("execute:output", {
+                'uuid': uuid,
+                'line': line,
+                'timestamp': timestamp
+            })
+
+    def __on_process_exit(self, uuid, process: subprocess.Popen):
+        """处理进程结束(由输出读取线程回调)"""
+        if self.__output_batcher is not None:
+            # 先发送积压的输出，保证输出消息在结束消息之前
+            self.__output_batcher.flush(uuid)
+        stderr = self.__process_error.pop(uuid, "").strip()
+        if stderr:
+            logger.error(f"执行错误:{stderr}")
+        monitor = self.__process_monitor.pop(uuid)
+        monitor.stop()
+        usage = monitor.usage()
+        logger.debug(f"[uuid: {uuid}]进程结束(code:{process.returncode}) {usage}")
+        self.__send_websocket_action("execute:stop", {
+            'uuid': uuid,
+            'code': process.returncode,
+            'error': stderr,
+            'usage': usage,
+            'timestamp': time.time()
+        })
+        end_info = (
+            f"[OUTPUT]\n\n"
+            f"[END]\n"
+            f"end time: {time.time()}\n"
+            f"return: {process.returncode}\n"
+            f"usage: {usage}\n"
+        )
+        end_info += f"error: {stderr}\n" if stderr else ""
+        end_info += f"[END]"
+
+        if sys.platform == 'win32':
+            temp_filename = self.__temp_filename.pop(uuid)
+            # 删除临时批处理文件
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+
+        record_fd = self.__record_fd.pop(uuid)
+        record_fd.write(end_info)
+        logger.debug(f"delete process: {uuid}")
+        with self.__lock:
+            if self.__process_list.get(uuid) is process:
+                del self.__process_list[uuid]
+            release = self.__closing and not self.__process_list
+        record_fd.close()
+        if release:
+            self.__release()
+
+    def close(self):
+        """
+        连接断开时关闭执行器
+
+        运行中的命令继续执行，最后一个命令结束后再关闭输出读取器与合并器，
+        没有运行中的命令时立即关闭。
+        """
+        with self.__lock:
+            self.__closing = True
+            release = not self.__process_list
+        if release:
+            self.__release()
+
+    def __release(self):
+        """关闭输出读取器与合并器(仅执行一次)"""
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+        self.__output_reader.close()
+        if self.__output_batcher is not None:
+            self.__output_batcher.close()
 
     @logger.catch
     def __send_websocket_action(self, action, payload: dict = None):
         if payload is None:
             payload = {}
-
-        self.__websocket_message_queue.put({'action': action, 'data': payload})
-        if self.__handle_websocket_thread is None:
-            self.__handle_websocket_thread = Thread(
-                target=self.__handle_websocket_queue,
-                args=()
-            )
-            self.__handle_websocket_thread.start()
-
-    def __handle_websocket_queue(self):
-        while True:
-            task = self.__websocket_message_queue.get()
-            if not task:
-                break
-            try:
-                asyncio.run(self.__websocket.websocket_send_json(task))
-            except Exception as err:
-                logger.error(f"Send WebSocket Message Error: {err}")
-        self.__handle_websocket_thread = None
+        self.__websocket.send_json_nowait({'action': action, 'data': payload})
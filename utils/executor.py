@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from utils.config import config
+from utils.logger import logger
+
+
+class ExecutorBusyError(RuntimeError):
+    """执行器排队任务已满"""
+
+
+class BlockingExecutor:
+    """
+    阻塞调用执行器
+
+    psutil、文件系统、数据库等阻塞调用统一交由此线程池执行，避免阻塞事件循环。
+    排队与执行中的任务总数有上限，超过上限时直接拒绝，防止卡住的调用无限堆积。
+    """
+    __executor: ThreadPoolExecutor
+    __slots: threading.BoundedSemaphore
+    __lock: threading.Lock
+    __max_workers: int
+    __max_queue: int
+    __active: int = 0
+    __queued: int = 0
+    __completed: int = 0
+    __failed: int = 0
+    __rejected: int = 0
+    __max_wait_time: float = 0
+    __max_run_time: float = 0
+    __total_run_time: float = 0
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 64, name: str = "Blocking"):
+        self.__max_workers = max_workers
+        self.__max_queue = max_queue
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.__slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self.__lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """提交阻塞调用(线程安全)，排队已满时抛出 ExecutorBusyError"""
+        if not self.__slots.acquire(blocking=False):
+            with self.__lock:
+                self.__rejected += 1
+            raise ExecutorBusyError(f"执行器排队任务已满: {getattr(fn, '__qualname__', fn)}")
+        with self.__lock:
+            self.__queued += 1
+        try:
+            return self.__executor.submit(self.__run, time.monotonic(), fn, args, kwargs)
+        except Exception:
+            with self.__lock:
+                self.__queued -= 1
+            self.__slots.release()
+            raise
+
+    async def run(self, fn, *args, **kwargs):
+        """在线程池中执行阻塞调用并等待结果(在事件循环内调用)"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def __run(self, submit_time: float, fn, args, kwargs):
+        start = time.monotonic()
+        with self.__lock:
+            self.__queued -= 1
+            self.__active += 1
+            self.__max_wait_time = max(self.__max_wait_time, start - submit_time)
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            run_time = time.monotonic() - start
+            with self.__lock:
+                self.__active -= 1
+                self.__completed += 1
+                self.__failed += failed
+                self.__total_run_time += run_time
+                self.__max_run_time = max(self.__max_run_time, run_time)
+            self.__slots.release()
+
+    def metrics(self) -> dict:
+        """获取执行器指标，最大等待/执行时间在读取后重置"""
+        with self.__lock:
+            metrics = {
+                "workers": self.__max_workers,
+                "max_queue": self.__max_queue,
+                "active": self.__active,
+                "queued": self.__queued,
+                "completed": self.__completed,
+                "failed": self.__failed,
+                "rejected": self.__rejected,
+                # 毫秒
+                "avg_run_time": round(self.__total_run_time / self.__completed * 1000, 1) if self.__completed else 0,
+                "max_run_time": round(self.__max_run_time * 1000, 1),
+                "max_wait_time": round(self.__max_wait_time * 1000, 1),
+            }
+            self.__max_wait_time = 0
+            self.__max_run_time = 0
+        return metrics
+
+    def close(self):
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监控
+
+    定时休眠 INTERVAL 秒，实际唤醒时间与预期之差即为事件循环被阻塞的时间，
+    超过阈值时输出警告。
+    """
+    INTERVAL = 0.1
+
+    __task: asyncio.Task = None
+    __threshold: float
+    __lag_count: int = 0
+    __max_lag: float = 0
+    __last_lag: float = 0
+
+    def __init__(self, threshold: float = 0.1):
+        self.__threshold = threshold
+
+    def start(self):
+        """启动监控(在事件循环内调用)"""
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.__monitor())
+
+    def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+
+    async def __monitor(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.INTERVAL)
+            lag = loop.time() - start - self.INTERVAL
+            self.__last_lag = lag
+            self.__max_lag = max(self.__max_lag, lag)
+            if lag >= self.__threshold:
+                self.__lag_count += 1
+                logger.warning(f"事件循环被阻塞 {lag * 1000:.0f}ms")
+
+    def metrics(self) -> dict:
+        """获取延迟指标(毫秒)，最大延迟在读取后重置"""
+        metrics = {
+            "last": round(max(self.__last_lag, 0) * 1000, 1),
+            "max": round(max(self.__max_lag, 0) * 1000, 1),
+            "blocked_count": self.__lag_count,
+        }
+        self.__max_lag = 0
+        return metrics
+
+
+blocking_executor: BlockingExecutor | None = None
+loop_lag_monitor: LoopLagMonitor | None = None
+# 其他模块注册的指标 {名称: 获取指标的函数}
+agent_metrics_providers: dict[str: callable] = {}
+
+
+def get_blocking_executor() -> BlockingExecutor:
+    """获取全局阻塞调用执行器，首次调用时按配置创建"""
+    global blocking_executor
+    if blocking_executor is None:
+        executor_config = config().get_config().get('executor', {})
+        blocking_executor = BlockingExecutor(
+            executor_config.get('max_workers', 4),
+            executor_config.get('max_queue', 64)
+        )
+    return blocking_executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """在全局执行器中执行阻塞调用并等待结果"""
+    return await get_blocking_executor().run(fn, *args, **kwargs)
+
+
+def start_loop_lag_monitor():
+    """启动事件循环延迟监控(在事件循环内调用)"""
+    global loop_lag_monitor
+    if loop_lag_monitor is None:
+        executor_config = config().get_config().get('executor', {})
+        loop_lag_monitor = LoopLagMonitor(executor_config.get('loop_lag_threshold', 100) / 1000)
+    loop_lag_monitor.start()
+
+
+def register_agent_metrics(name: str, provider):
+    """注册随占用数据上报的节点端指标"""
+    agent_metrics_providers[name] = provider
+
+
+def unregister_agent_metrics(name: str):
+    agent_metrics_providers.pop(name, None)
+
+
+def get_agent_metrics() -> dict:
+    """获取节点端自身的运行指标"""
+    metrics = {}
+    if blocking_executor is not None:
+        metrics["executor"] = blocking_executor.metrics()
+    if loop_lag_monitor is not None:
+        metrics["loop_lag"] = loop_lag_monitor.metrics()
+    for name, provider in list(agent_metrics_providers.items()):
+        try:
+            metrics[name] = provider()
+        except Exception as e:
+            logger.error(f"获取指标 {name} 失败: {e}")
+    return metrics
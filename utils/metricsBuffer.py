@@ -0,0 +1,161 @@
+import mmap
+import os
+import struct
+import threading
+
+from utils.logger import logger
+
+# 文件头: 魔数, 版本, 单条记录长度, 容量, 已写入记录序号, 已上报记录序号
+HEADER = struct.Struct("<4sHHIQQ4x")
+MAGIC = b"SMMB"
+VERSION = 1
+
+# 单条记录保存的汇总指标(顺序即打包顺序)
+FIELDS = (
+    "timestamp",
+    "cpu_usage",
+    "load_1",
+    "load_5",
+    "load_15",
+    "memory_total",
+    "memory_used",
+    "swap_total",
+    "swap_used",
+    "disk_read_bytes",
+    "disk_write_bytes",
+    "network_bytes_sent",
+    "network_bytes_recv",
+)
+RECORD = struct.Struct("<dffffQQQQQQQQ")
+
+
+def pack_sample(timestamp: float, node_usage: dict) -> bytes:
+    """将一次节点占用采样打包为定长记录"""
+    loadavg = node_usage.get("loadavg") or (0, 0, 0)
+    disk_io = node_usage["disk"]["io"]
+    network_io = node_usage["network"]["io"]["_all"]
+    return RECORD.pack(
+        timestamp,
+        node_usage["cpu"]["usage"],
+        *loadavg[:3],
+        node_usage["memory"]["total"],
+        node_usage["memory"]["used"],
+        node_usage["swap"]["total"],
+        node_usage["swap"]["used"],
+        disk_io["read_bytes"],
+        disk_io["write_bytes"],
+        network_io["bytes_sent"],
+        network_io["bytes_recv"],
+    )
+
+
+def unpack_records(data: bytes) -> list[tuple]:
+    """解包若干条记录"""
+    return list(RECORD.iter_unpack(data))
+
+
+class MetricsRingBuffer:
+    """
+    本地指标环形缓冲区
+
+    定长记录依次写入 mmap 映射的文件，写满后覆盖最旧的记录。
+    文件头保存已写入与已上报的记录序号(单调递增，记录位置为 序号 % 容量)，
+    节点端重启后仍可继续补发未上报的记录。
+    """
+    __path: str
+    __capacity: int
+    __fd: any = None
+    __mmap: mmap.mmap = None
+    __lock: threading.Lock
+    __write_seq: int = 0
+    __forwarded_seq: int = 0
+
+    def __init__(self, path: str, capacity: int):
+        self.__path = path
+        self.__capacity = max(1, capacity)
+        self.__lock = threading.Lock()
+        size = HEADER.size + self.__capacity * RECORD.size
+        reuse = os.path.exists(path) and os.path.getsize(path) == size
+        self.__fd = open(path, "r+b" if reuse else "w+b")
+        if not reuse:
+            self.__fd.truncate(size)
+        self.__mmap = mmap.mmap(self.__fd.fileno(), size)
+        if reuse:
+            magic, version, record_size, capacity, write_seq, forwarded_seq = HEADER.unpack_from(self.__mmap, 0)
+            if magic == MAGIC and version == VERSION and record_size == RECORD.size and capacity == self.__capacity:
+                self.__write_seq = write_seq
+                self.__forwarded_seq = min(forwarded_seq, write_seq)
+            else:
+                logger.warning(f"指标缓冲区 {path} 格式不匹配，已重新创建")
+        self.__write_header()
+
+    def __write_header(self):
+        HEADER.pack_into(
+            self.__mmap, 0, MAGIC, VERSION, RECORD.size, self.__capacity, self.__write_seq, self.__forwarded_seq
+        )
+
+    def __offset(self, seq: int) -> int:
+        return HEADER.size + (seq % self.__capacity) * RECORD.size
+
+    @property
+    def write_seq(self) -> int:
+        """下一条记录的序号"""
+        return self.__write_seq
+
+    @property
+    def forwarded_seq(self) -> int:
+        """第一条未上报记录的序号"""
+        return self.__forwarded_seq
+
+    @property
+    def oldest_seq(self) -> int:
+        """仍保存在缓冲区中的最旧记录序号"""
+        return max(0, self.__write_seq - self.__capacity)
+
+    def append(self, record: bytes) -> int:
+        """写入一条记录，返回其序号"""
+        with self.__lock:
+            seq = self.__write_seq
+            offset = self.__offset(seq)
+            self.__mmap[offset:offset + RECORD.size] = record
+            self.__write_seq = seq + 1
+            self.__write_header()
+            return seq
+
+    def mark_forwarded(self, seq: int):
+        """标记序号小于 seq 的记录均已上报"""
+        with self.__lock:
+            self.__forwarded_seq = min(max(self.__forwarded_seq, seq), self.__write_seq)
+            self.__write_header()
+
+    def read(self, start_seq: int, limit: int) -> tuple[int, bytes]:
+        """
+        读取从 start_seq 开始的至多 limit 条记录
+        已被覆盖的记录会被跳过，返回 (实际起始序号, 记录数据)
+        """
+        with self.__lock:
+            start_seq = max(start_seq, self.oldest_seq)
+            end_seq = min(self.__write_seq, start_seq + limit)
+            chunks = []
+            seq = start_seq
+            while seq < end_seq:
+                # 按环形缓冲区的物理边界分段读取
+                offset = self.__offset(seq)
+                count = min(end_seq - seq, self.__capacity - seq % self.__capacity)
+                chunks.append(self.__mmap[offset:offset + count * RECORD.size])
+                seq += count
+            return start_seq, b"".join(chunks)
+
+    def flush(self):
+        with self.__lock:
+            self.__mmap.flush()
+
+    def close(self):
+        with self.__lock:
+            if self.__mmap is not None:
+                self.__mmap.flush()
+                self.__mmap.close()
+                self.__mmap = None
+            if self.__fd is not None:
+                self.__fd.close()
+                self.__fd = None
@@ -1,9 +1,15 @@
 import os.path
 
-from peewee import Model, UUIDField, CharField, ForeignKeyField, DateTimeField, IntegerField, SqliteDatabase
+from peewee import Model, UUIDField, CharField, ForeignKeyField, DateTimeField, IntegerField, SqliteDatabase, \
+    FloatField, BigIntegerField
 from uuid import uuid4
 
-database = SqliteDatabase(os.path.join(os.getcwd(), "data", 'database.db'))
+# WAL 模式下读写互不阻塞，synchronous=normal 时提交不再每次 fsync
+database = SqliteDatabase(os.path.join(os.getcwd(), "data", 'database.db'), pragmas={
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+})
 
 class Task(Model):
     name = CharField(null=False)
@@ -14,6 +20,33 @@ class Task(Model):
     class Meta:
         database = database
 
+
+class TaskRun(Model):
+    """任务的一次运行"""
+    mark = CharField(40, primary_key=True)
+    task_uuid = CharField(40, null=False)
+    # running / success / failed / killed / interrupted(节点重启或断开时仍在运行)
+    status = CharField(16, null=False, default="running")
+    start_time = FloatField(null=False)
+    end_time = FloatField(null=True)
+    code = IntegerField(null=True)
+    duration = FloatField(null=True)
+    output_bytes = BigIntegerField(null=False, default=0)
+    cpu_time = FloatField(null=True)
+    max_rss = BigIntegerField(null=True)
+    limit_exceeded = CharField(16, null=True)
+    # 运行日志文件名与输出部分在日志(解压后)中的起始偏移
+    record_file = CharField(null=True)
+    record_offset = IntegerField(null=False, default=0)
+
+    class Meta:
+        database = database
+        indexes = (
+            (('task_uuid', 'start_time'), False),
+            (('status',), False),
+        )
+
+
 if __name__ == '__main__':
     database.create_tables([Task])
 
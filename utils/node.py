@@ -4,47 +4,51 @@ import os
 import platform
 import time
 from datetime import datetime
-from threading import Thread
 
 import aiohttp
 import psutil
-from psutil import AccessDenied
 
+from utils.cgroup import CgroupSampler, ContainerSampler, create_cgroup_samplers
+from utils.config import config
+from utils.diskUtils import DiskPartitionCache
+from utils.executor import run_blocking, get_agent_metrics, ExecutorBusyError
 from utils.logger import logger
+from utils.metricsBuffer import MetricsRingBuffer
 import utils.websocket as WebSocket
+from utils.processIO import ProcessIOTop
+from utils.processList import ProcessListStream
 from utils.processUtils import kill_proc_tree
+from utils.usageCollector import UsageCollector
+from utils.usageRollup import UsageRollup
+from utils.usageSampler import UsageSampler
 
 # import main
 
-get_process_list_flag: bool = False
-get_process_list_thread: Thread
+process_list_stream: ProcessListStream | None = None
+usage_sampler: UsageSampler | None = None
+usage_collector: UsageCollector | None = None
+process_io_top: ProcessIOTop | None = None
+cgroup_sampler: CgroupSampler | None = None
+container_sampler: ContainerSampler | None = None
+disk_partition_cache: DiskPartitionCache | None = None
 
 
-@logger.catch
+def get_disk_partition_cache() -> DiskPartitionCache:
+    """获取磁盘分区缓存，首次调用时按配置创建"""
+    global disk_partition_cache
+    if disk_partition_cache is None:
+        disk_partition_cache = DiskPartitionCache(config().get_config().get('disk', {}))
+    return disk_partition_cache
+
+
+@logger.catch(exclude=ExecutorBusyError)
 async def get_disk_list():
-    disk_list = []
-    for item in psutil.disk_partitions():
-        total = 0
-        used = 0
-        try:
-            total = psutil.disk_usage(item.mountpoint).total
-            used = psutil.disk_usage(item.mountpoint).used
-        except Exception:
-            pass
-        disk_list.append({
-            "device": item.device,
-            "mount_point": item.mountpoint,
-            "fs_type": item.fstype,
-            "total": total,
-            "used": used
-        })
-    return disk_list
+    return await get_disk_partition_cache().get_disk_list()
 
 
-@logger.catch
-async def update_node_info(ws: WebSocket):
-    """更新节点信息"""
-    node_info = {
+def get_node_info() -> dict:
+    """获取节点信息(阻塞调用)"""
+    return {
         "system": platform.system(),
         "system_release": platform.release(),
         "system_build_version": platform.version(),
@@ -54,125 +58,176 @@ async def update_node_info(ws: WebSocket):
             "core": psutil.cpu_count(logical=False)
         },
         "memory_total": psutil.virtual_memory().total,
-        "disks": await get_disk_list(),
         "hostname": platform.node(),
         "boot_time": datetime.fromtimestamp(psutil.boot_time()).strftime("%Y-%m-%d %H:%M:%S")
     }
+
+
+@logger.catch
+async def update_node_info(ws: WebSocket):
+    """更新节点信息(阻塞调用执行器繁忙时跳过)"""
+    try:
+        node_info = await run_blocking(get_node_info)
+        node_info["disks"] = await get_disk_list()
+        if cgroup_sampler is not None:
+            # 运行在容器中时服务端应以 cgroup 限制为准
+            node_info["cgroup"] = await run_blocking(cgroup_sampler.limits)
+    except ExecutorBusyError:
+        logger.warning("阻塞调用执行器繁忙，跳过节点信息更新")
+        return
     try:
         await ws.websocket_send_json({'action': 'node:refresh_info', 'data': node_info})
     except Exception as e:
         logger.error(f"节点信息更新上传失败！{e}")
 
 
-@logger.catch
-async def get_disk_io_counters(time: int = 1):
-    """获取磁盘io计数器/秒"""
-    # 获取初始时刻的IO计数器值
-    io_counters_start = psutil.disk_io_counters()
-    # 等待一段时间
+async def __run_optional(fn):
+    """执行可选的采集项，执行器繁忙时返回 None(本次上报不包含该项)"""
     try:
-        await asyncio.sleep(time)
-    except asyncio.exceptions.CancelledError:
-        pass
-    # 获取结束时刻的IO计数器值
-    io_counters_end = psutil.disk_io_counters()
-    read_bytes = io_counters_end.read_bytes - io_counters_start.read_bytes
-    write_bytes = io_counters_end.write_bytes - io_counters_start.write_bytes
-    return {"read_bytes": read_bytes, "write_bytes": write_bytes}
+        return await run_blocking(fn)
+    except ExecutorBusyError:
+        logger.debug(f"阻塞调用执行器繁忙，本次占用数据不包含 {getattr(fn, '__qualname__', fn)}")
+        return None
 
 
 @logger.catch
-async def get_network_io_counters(time: int = 1):
-    """获取网络io计数器/秒"""
-    # 获取初始时刻的IO计数器值
-    network_counters_start = psutil.net_io_counters(pernic=True)
-    all_network_counters_start = psutil.net_io_counters()
-    # 等待一段时间
+async def collect_node_usage() -> dict | None:
+    """
+    采集节点占用状态
+
+    阻塞调用执行器繁忙时跳过本次采样(返回 None)，下一次采样时重试；
+    cgroup、容器与进程 I/O 排行等可选项繁忙时只省略该项。
+    """
     try:
-        await asyncio.sleep(time)
-    except asyncio.exceptions.CancelledError:
-        pass
-    # 获取结束时刻的IO计数器值
-    network_counters_end = psutil.net_io_counters(pernic=True)
-    all_network_counters_end = psutil.net_io_counters()
-    temp = {
-        "_all": {
-            "bytes_sent": all_network_counters_end.bytes_sent - all_network_counters_start.bytes_sent,
-            "bytes_recv": all_network_counters_end.bytes_recv - all_network_counters_start.bytes_recv,
-        }
-    }
-    for key in network_counters_start:
-        temp[key] = {
-            "bytes_sent": network_counters_end[key].bytes_sent - network_counters_start[key].bytes_sent,
-            "bytes_recv": network_counters_end[key].bytes_recv - network_counters_start[key].bytes_recv,
-        }
-    return temp
+        node_usage = await run_blocking(usage_sampler.sample)
+        node_usage["disk"]["partition_list"] = await get_disk_list()
+    except ExecutorBusyError:
+        logger.warning("阻塞调用执行器繁忙，跳过本次占用采样")
+        return None
+    if cgroup_sampler is not None:
+        cgroup = await __run_optional(cgroup_sampler.sample)
+        if cgroup is not None:
+            node_usage["cgroup"] = cgroup
+    if container_sampler is not None:
+        containers = await __run_optional(container_sampler.sample)
+        if containers is not None:
+            node_usage["containers"] = containers
+    if process_io_top is not None:
+        # 仅在服务端订阅时统计进程 I/O 排行
+        top_processes = await __run_optional(process_io_top.sample)
+        if top_processes is not None:
+            node_usage["disk"]["top_processes"] = top_processes
+    node_usage["agent"] = get_agent_metrics()
+    return node_usage
+
+
+def start_usage_collector(ws: WebSocket):
+    """启动节点占用采集，采集独立于连接持续运行(在事件循环内调用)"""
+    global usage_sampler, usage_collector, cgroup_sampler, container_sampler
+    if usage_collector is not None:
+        return
+    metrics_config = config().get_config().get('metrics', {})
+    cgroup_sampler, container_sampler = create_cgroup_samplers(metrics_config.get('container_stats', False))
+    usage_sampler = UsageSampler(
+        metrics_config.get('procfs_fast_path', True),
+        metrics_config.get('per_disk_io', False)
+    )
+    buffer = MetricsRingBuffer(
+        os.path.join(ws.get_base_data_save_path(), "metrics.buf"),
+        metrics_config.get('buffer_size', 43200)
+    )
+    usage_collector = UsageCollector(
+        collect_node_usage,
+        ws,
+        buffer,
+        UsageRollup(),
+        metrics_config.get('sample_interval', 2),
+        metrics_config.get('backfill_batch_size', 500),
+        metrics_config.get('backfill_rate', 2)
+    )
+    usage_collector.start()
+
+
+def resume_usage_upload(interval: float = None, encoding: str = "json"):
+    """连接就绪后按服务端要求的间隔与编码上报，并补发断开期间的记录"""
+    if usage_collector is None:
+        return
+    usage_collector.set_interval(interval)
+    usage_collector.set_encoding(encoding)
+    usage_collector.start_backfill()
+
+
+@logger.catch(exclude=ExecutorBusyError)
+async def start_process_io_top(options: dict = None):
+    """订阅进程 I/O 排行，结果随占用数据上报(disk.top_processes)"""
+    global process_io_top
+    top = (options or {}).get('top', 10)
+    if process_io_top is None:
+        process_io_top = ProcessIOTop(top)
+        # 建立基线，下一次上报即可计算速率
+        await run_blocking(process_io_top.sample)
+    else:
+        process_io_top.set_top(top)
 
 
 @logger.catch
-async def update_node_usage(ws: WebSocket):
-    """更新节点占用状态"""
-    node_core_usage = psutil.cpu_percent(percpu=True)
-    node_cpu_usage = psutil.cpu_percent()
-    node_memory = psutil.virtual_memory()
-    node_loadavg = psutil.getloadavg()
-    node_swap = psutil.swap_memory()
-    node_disk_io = await get_disk_io_counters()
-    node_network_io = await get_network_io_counters()
-    if not node_disk_io or not node_network_io:
+async def stop_process_io_top():
+    """取消订阅进程 I/O 排行并丢弃基线"""
+    global process_io_top
+    process_io_top = None
+
+
+@logger.catch
+async def query_usage_history(ws: WebSocket, query: dict):
+    """查询节点本地保存的占用汇总数据"""
+    if usage_collector is None:
         return
-    node_usage = {
-        "loadavg": node_loadavg,
-        "cpu": {
-            "usage": node_cpu_usage,
-            "core_usage": node_core_usage,
-        },
-        "memory": {
-            # 总量
-            "total": node_memory.total,
-            # 已用
-            "used": node_memory.used,
-        },
-        "swap": {
-            # 总量
-            "total": node_swap.total,
-            # 使用中
-            "used": node_swap.used,
-        },
-        "disk": {
-            "io": node_disk_io,
-            'partition_list': await get_disk_list(),
-        },
-        "network": {
-            "io": node_network_io
-        }
-    }
-    await ws.websocket_send_json({'action': 'node:upload_running_data', 'data': node_usage})
+    end = query.get('end') or time.time()
+    start = query.get('start') or end - 3600
+    try:
+        history = usage_collector.query_history(start, end, query.get('resolution'), query.get('max_points', 1000))
+    except ValueError as e:
+        logger.error(e)
+        return
+    history['id'] = query.get('id')
+    await ws.websocket_send_json({'action': 'node:query_history', 'data': history})
 
 
 @logger.catch
-async def start_get_process_list(ws: WebSocket):
-    global get_process_list_flag
+async def start_get_process_list(ws: WebSocket, options: dict = None):
     """获取节点进程列表"""
-    if not get_process_list_flag:
-        logger.debug('服务端发起获取进程列表')
-        get_process_list_thread = Thread(target=get_process_list, args=(ws,))
-        get_process_list_thread.start()
+    global process_list_stream
+    logger.debug('服务端发起获取进程列表')
+    if process_list_stream is None:
+        process_list_stream = ProcessListStream(ws)
+    process_list_stream.start(options)
 
 
 @logger.catch
 async def stop_get_process_list():
-    global get_process_list_flag
-    if get_process_list_flag:
-        get_process_list_flag = False
+    if process_list_stream is not None and process_list_stream.is_running():
+        process_list_stream.stop()
         logger.debug("服务端停止获取进程列表")
 
 
 @logger.catch
+async def resync_process_list():
+    """下一次推送完整进程列表"""
+    if process_list_stream is not None and process_list_stream.is_running():
+        process_list_stream.resync()
+
+
+@logger.catch(exclude=ExecutorBusyError)
 async def kill_process(pid, tree_mode):
     logger.warning("kill_process")
     if pid == os.getpid():
         return logger.error("won't kill myself")
+    # 结束进程树时会等待所有子进程退出
+    await run_blocking(kill_process_now, pid, tree_mode)
+
+
+def kill_process_now(pid, tree_mode):
+    """结束进程(阻塞调用)"""
     if psutil.pid_exists(pid) and not tree_mode:
         try:
             psutil.Process(pid).kill()
@@ -185,35 +240,3 @@ async def kill_process(pid, tree_mode):
             logger.error(e)
     else:
         RuntimeError(f"Process {pid} does not exist")
-
-
-@logger.catch
-def get_process_list(ws: WebSocket):
-    global get_process_list_flag
-    get_process_list_flag = True
-    logger.debug("获取进程列表进程已启动.....")
-    while get_process_list_flag:
-        try:
-            temp = []
-            for proc in psutil.process_iter(['pid', 'name', 'username', 'status', 'cpu_percent', 'memory_info']):
-                info = proc.info
-                temp.append({
-                    "pid": info.get("pid"),
-                    "name": info.get("name"),
-                    "username": info.get("username"),
-                    "status": info.get("status"),
-                    "cpu_percent": round(info.get("cpu_percent") / psutil.cpu_count(), 1),
-                    "memory_usage": round((info.get("memory_info").rss / psutil.virtual_memory().total) * 100, 1),
-                    "swap_usage": info.get("memory_info").vms
-                })
-        except AccessDenied:
-            logger.warning("无权限获取进程列表，请检查是否已用root用户运行")
-            get_process_list_flag = False
-        else:
-            asyncio.run(
-                ws.websocket_send_json({'action': 'process_list:show', 'data': {
-                    'process_list': temp,
-                }})
-            )
-        time.sleep(5)
-    logger.debug("获取进程列表进程已停止")
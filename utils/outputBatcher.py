@@ -0,0 +1,157 @@
+import time
+from threading import Thread, Condition
+
+from utils.logger import logger
+
+
+class _Batch:
+    """一个 key 下等待发送的输出"""
+    meta: dict
+    entries: list[tuple[float, str]]
+    size: int
+    first_time: float
+    last_time: float
+
+    def __init__(self, meta: dict, now: float):
+        self.meta = meta
+        self.entries = []
+        self.size = 0
+        self.first_time = now
+        self.last_time = now
+
+
+class OutputBatcher:
+    """
+    输出合并器
+
+    按 key(任务/执行器的进程标识)收集输出行，满足以下任一条件时合并为一条消息发送：
+    - window 秒内没有新的输出
+    - 距离本批第一行已超过 max_latency 秒
+    - 本批累计字节数超过 max_bytes
+    同一 key 的输出任何时刻只由一个线程发送，保证消息顺序。
+
+    send(meta, entries) -> meta 为 add 时传入的附加数据，entries 为 [(timestamp, line), ...]
+    """
+    __send: callable
+    __window: float
+    __max_latency: float
+    __max_bytes: int
+    __batches: dict[str: _Batch]
+    __sending: set[str]
+    __condition: Condition
+    __thread: Thread | None = None
+    __running: bool = False
+
+    def __init__(self, send, window: float = 0.05, max_latency: float = 0.2, max_bytes: int = 65536,
+                 name: str = "OutputBatcher"):
+        self.__send = send
+        self.__window = window
+        self.__max_latency = max_latency
+        self.__max_bytes = max_bytes
+        self.__name = name
+        self.__batches = {}
+        self.__sending = set()
+        self.__condition = Condition()
+
+    @classmethod
+    def from_config(cls, send, output_config: dict, name: str = "OutputBatcher"):
+        """
+        根据配置文件的 [output] 段创建合并器，未启用时返回 None
+        """
+        if not output_config or not output_config.get('batch_output', False):
+            return None
+        return cls(
+            send,
+            window=output_config.get('batch_window', 50) / 1000,
+            max_latency=output_config.get('batch_max_latency', 200) / 1000,
+            max_bytes=output_config.get('batch_max_bytes', 65536),
+            name=name
+        )
+
+    def add(self, key: str, meta: dict, lines: list[str], timestamp: float = None):
+        """添加输出行"""
+        if not lines:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        now = time.monotonic()
+        full = None
+        with self.__condition:
+            batch = self.__batches.get(key)
+            created = batch is None
+            if created:
+                batch = self.__batches[key] = _Batch(meta, now)
+            batch.last_time = now
+            for line in lines:
+                batch.entries.append((timestamp, line))
+                batch.size += len(line)
+            if batch.size >= self.__max_bytes:
+                # 与 flush 相同，等待同一 key 正在发送的输出发送完成，保证消息顺序
+                while key in self.__sending:
+                    self.__condition.wait()
+                # 等待期间可能已被发送线程取走
+                full = self.__batches.pop(key, None)
+                if full is not None:
+                    self.__sending.add(key)
+            elif not self.__running:
+                self.__running = True
+                self.__thread = Thread(target=self.__run, name=self.__name, daemon=True)
+                self.__thread.start()
+            elif created:
+                # 新批次的截止时间可能早于发送线程当前的等待时间
+                self.__condition.notify()
+        if full is not None:
+            self.__emit(key, full)
+
+    def flush(self, key: str):
+        """立即发送某个 key 下积压的输出(如进程结束时)"""
+        with self.__condition:
+            # 等待发送线程中同一 key 的输出发送完成，保证消息顺序
+            while key in self.__sending:
+                self.__condition.wait()
+            batch = self.__batches.pop(key, None)
+            if batch is not None:
+                self.__sending.add(key)
+        if batch is not None:
+            self.__emit(key, batch)
+
+    def __deadline(self, batch: _Batch) -> float:
+        return min(batch.last_time + self.__window, batch.first_time + self.__max_latency)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                if not self.__running:
+                    return
+                now = time.monotonic()
+                # 同一 key 正在由其他线程发送时不取走，发送完成后会被唤醒
+                waiting = {key: batch for key, batch in self.__batches.items() if key not in self.__sending}
+                due = [key for key, batch in waiting.items() if self.__deadline(batch) <= now]
+                ready = [(key, self.__batches.pop(key)) for key in due]
+                self.__sending.update(due)
+                if not ready:
+                    # 没有待发送的输出时无限期等待，不占用CPU
+                    timeout = min((self.__deadline(batch) for batch in waiting.values()), default=None)
+                    self.__condition.wait(None if timeout is None else timeout - now)
+                    continue
+            for key, batch in ready:
+                self.__emit(key, batch)
+
+    def __emit(self, key: str, batch: _Batch):
+        try:
+            self.__send(batch.meta, batch.entries)
+        except Exception as err:
+            logger.error(f"{self.__name}: 发送合并输出失败: {err}")
+        with self.__condition:
+            self.__sending.discard(key)
+            self.__condition.notify_all()
+
+    def close(self):
+        """发送全部积压输出并停止"""
+        with self.__condition:
+            batches = list(self.__batches.items())
+            self.__batches.clear()
+            self.__running = False
+            self.__condition.notify_all()
+        for key, batch in batches:
+            self.__emit(key, batch)
@@ -0,0 +1,285 @@
+import os
+import selectors
+import subprocess
+import sys
+from threading import Thread, Lock, current_thread
+
+from utils.logger import logger
+from utils.processLimits import reap_process
+
+
+class _StreamState:
+    """单个输出流的读取状态"""
+    key: str
+    name: str
+    process: subprocess.Popen
+    stream: any
+    buffer: bytearray
+    closed: bool
+
+    def __init__(self, key: str, name: str, process: subprocess.Popen, stream):
+        self.key = key
+        self.name = name
+        self.process = process
+        self.stream = stream
+        self.buffer = bytearray()
+        self.closed = False
+
+
+class OutputReader:
+    """
+    子进程输出多路读取器
+
+    使用一个线程通过 selectors 同时监听所有子进程的 stdout 与 stderr，
+    有数据即按块读取并切分成行回调，所有进程空闲时阻塞在 select 上不占用CPU。
+
+    on_output(key, stream_name, lines) -> 收到一批完整的行(bytes，不含换行符)
+    on_exit(key, process) -> 进程的全部输出已读完且进程已退出(非 Windows 下 process.rusage 为进程的资源使用情况)
+    关闭后读取线程退出时关闭 selector、唤醒管道与剩余的输出流。
+    """
+    # 单次读取的最大字节数
+    READ_SIZE = 65536
+    # 单行最大长度，超出后强制切分，避免无换行输出占满内存
+    MAX_LINE_SIZE = 65536
+    # 输出流已关闭但进程仍未退出时的轮询间隔(秒)
+    EXIT_POLL_INTERVAL = 0.2
+
+    __on_output: callable
+    __on_exit: callable
+    __lock: Lock
+    __thread: Thread | None = None
+    __selector: selectors.BaseSelector | None = None
+    __streams: dict[str: list[_StreamState]]
+    __waiting: dict[str: subprocess.Popen]
+    __wakeup_r: int = -1
+    __wakeup_w: int = -1
+    __running: bool = False
+    __closed: bool = False
+
+    def __init__(self, on_output, on_exit, name: str = "OutputReader"):
+        self.__on_output = on_output
+        self.__on_exit = on_exit
+        self.__name = name
+        self.__lock = Lock()
+        self.__streams = {}
+        self.__waiting = {}
+        if sys.platform != 'win32':
+            self.__selector = selectors.DefaultSelector()
+            self.__wakeup_r, self.__wakeup_w = os.pipe()
+            os.set_blocking(self.__wakeup_r, False)
+            os.set_blocking(self.__wakeup_w, False)
+            self.__selector.register(self.__wakeup_r, selectors.EVENT_READ, None)
+
+    def add(self, key: str, process: subprocess.Popen):
+        """添加一个需要读取输出的进程(stdout/stderr 需为 PIPE)"""
+        states = [
+            _StreamState(key, name, process, stream)
+            for name, stream in (("stdout", process.stdout), ("stderr", process.stderr))
+            if stream is not None
+        ]
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError(f"{self.__name}: 输出读取器已关闭")
+            self.__streams[key] = states
+            if sys.platform == 'win32':
+                # Windows 下管道不支持 select，退化为每个流一个读取线程
+                for state in states:
+                    Thread(target=self.__read_stream_blocking, args=(state,), daemon=True).start()
+                if not states:
+                    self.__waiting[key] = process
+                    Thread(target=self.__wait_process_blocking, args=(key, process), daemon=True).start()
+                return
+            for state in states:
+                self.__selector.register(state.stream.fileno(), selectors.EVENT_READ, state)
+            if not states:
+                self.__waiting[key] = process
+            if not self.__running:
+                self.__running = True
+                self.__thread = Thread(target=self.__run, name=self.__name, daemon=True)
+                self.__thread.start()
+        self.__wakeup()
+
+    def __wakeup(self):
+        """唤醒阻塞在 select 上的读取线程"""
+        if sys.platform == 'win32':
+            return
+        with self.__lock:
+            # 唤醒管道关闭后文件描述符可能被复用，不能再写入
+            if self.__wakeup_w < 0:
+                return
+            try:
+                os.write(self.__wakeup_w, b"\0")
+            except (BlockingIOError, OSError):
+                pass
+
+    def __run(self):
+        logger.debug(f"{self.__name}: 获取进程输出开始")
+        try:
+            self.__loop()
+        finally:
+            self.__release()
+        logger.debug(f"{self.__name}: 获取进程输出结束")
+
+    def __loop(self):
+        while self.__running:
+            # 只有存在"输出已结束但进程未退出"的进程时才需要超时轮询
+            timeout = self.EXIT_POLL_INTERVAL if self.__waiting else None
+            try:
+                events = self.__selector.select(timeout)
+            except OSError as err:
+                logger.error(f"{self.__name}: select error: {err}")
+                continue
+            for selector_key, _ in events:
+                state: _StreamState = selector_key.data
+                if state is None:
+                    try:
+                        while os.read(self.__wakeup_r, 4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                self.__read_stream(state)
+            self.__check_waiting()
+
+    def __read_stream(self, state: _StreamState):
+        """读取一个可读的输出流"""
+        fd = state.stream.fileno()
+        try:
+            data = os.read(fd, self.READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as err:
+            logger.error(f"[uuid: {state.key}]读取进程输出失败: {err}")
+            data = b""
+        if data:
+            self.__feed(state, data)
+            return
+        # EOF
+        with self.__lock:
+            self.__selector.unregister(fd)
+        self.__close_stream(state)
+
+    def __read_stream_blocking(self, state: _StreamState):
+        """阻塞读取一个输出流(Windows)"""
+        while True:
+            try:
+                data = state.stream.read1(self.READ_SIZE)
+            except (OSError, ValueError):
+                data = b""
+            if not data:
+                break
+            self.__feed(state, data)
+        self.__close_stream(state)
+        with self.__lock:
+            process = self.__waiting.get(state.key)
+        if process is not None:
+            self.__wait_process_blocking(state.key, process)
+
+    def __wait_process_blocking(self, key: str, process: subprocess.Popen):
+        process.wait()
+        with self.__lock:
+            if self.__waiting.pop(key, None) is None:
+                return
+        self.__finish(key, process)
+
+    def __feed(self, state: _StreamState, data: bytes):
+        """将读取到的数据切分成行并回调"""
+        state.buffer += data
+        end = state.buffer.rfind(b"\n")
+        if end == -1:
+            if len(state.buffer) < self.MAX_LINE_SIZE:
+                return
+            lines = [bytes(state.buffer)]
+            state.buffer.clear()
+        else:
+            lines = bytes(state.buffer[:end]).split(b"\n")
+            del state.buffer[:end + 1]
+        self.__emit(state, lines)
+
+    def __emit(self, state: _StreamState, lines: list[bytes]):
+        try:
+            self.__on_output(state.key, state.name, lines)
+        except Exception as err:
+            logger.error(f"[uuid: {state.key}]处理进程输出失败: {err}")
+
+    def __close_stream(self, state: _StreamState):
+        """输出流结束，冲刷剩余数据，全部流结束后等待进程退出"""
+        if state.buffer:
+            self.__emit(state, [bytes(state.buffer)])
+            state.buffer.clear()
+        state.closed = True
+        try:
+            state.stream.close()
+        except OSError:
+            pass
+        with self.__lock:
+            states = self.__streams.get(state.key, [])
+            if not all(item.closed for item in states):
+                return
+            self.__waiting[state.key] = state.process
+
+    def __check_waiting(self):
+        """检查输出已结束的进程是否已退出"""
+        if not self.__waiting:
+            return
+        with self.__lock:
+            finished = [(key, process) for key, process in self.__waiting.items() if reap_process(process)]
+            for key, _ in finished:
+                del self.__waiting[key]
+        for key, process in finished:
+            self.__finish(key, process)
+
+    def __finish(self, key: str, process: subprocess.Popen):
+        with self.__lock:
+            self.__streams.pop(key, None)
+        try:
+            self.__on_exit(key, process)
+        except Exception as err:
+            logger.error(f"[uuid: {key}]处理进程结束失败: {err}")
+
+    def __release(self):
+        """注销并关闭剩余的输出流，关闭 selector 与唤醒管道(读取线程退出后调用)"""
+        with self.__lock:
+            for states in self.__streams.values():
+                for state in states:
+                    if state.closed:
+                        continue
+                    state.closed = True
+                    if self.__selector is not None:
+                        try:
+                            self.__selector.unregister(state.stream.fileno())
+                        except (KeyError, ValueError, OSError):
+                            pass
+                    try:
+                        state.stream.close()
+                    except OSError:
+                        pass
+            self.__streams.clear()
+            self.__waiting.clear()
+            if self.__selector is not None:
+                self.__selector.close()
+                self.__selector = None
+            if self.__wakeup_r >= 0:
+                os.close(self.__wakeup_r)
+                os.close(self.__wakeup_w)
+                self.__wakeup_r = self.__wakeup_w = -1
+
+    def close(self):
+        """
+        停止读取线程并释放文件描述符
+
+        未结束进程的输出不再读取，也不会再回调 on_exit。
+        在回调中调用时不等待读取线程，由读取线程返回后自行释放。
+        """
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__running = False
+            thread = self.__thread
+        if thread is None:
+            self.__release()
+            return
+        self.__wakeup()
+        if thread is not current_thread():
+            thread.join()
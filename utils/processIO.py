@@ -0,0 +1,84 @@
+import heapq
+import time
+
+import psutil
+from psutil import NoSuchProcess, AccessDenied, ZombieProcess
+
+
+class ProcessIOTop:
+    """
+    进程 I/O 排行
+
+    在两次采样之间保留每个进程的 psutil.Process 对象与 I/O 计数器作为基线，
+    按读写速率之和取前 K 个进程。首次出现的进程只记录基线，下一次采样才参与排行。
+    """
+    __top: int
+    __processes: dict[int: psutil.Process]
+    __baselines: dict[int: tuple[int, int]]
+    __names: dict[int: str]
+    __last_time: float | None = None
+
+    def __init__(self, top: int = 10):
+        self.__top = max(1, top)
+        self.__processes = {}
+        self.__baselines = {}
+        self.__names = {}
+
+    def set_top(self, top: int):
+        self.__top = max(1, top)
+
+    def __get_process(self, pid: int) -> psutil.Process:
+        proc = self.__processes.get(pid)
+        if proc is None:
+            proc = self.__processes[pid] = psutil.Process(pid)
+            self.__names[pid] = proc.name()
+        return proc
+
+    def __forget(self, pid: int):
+        self.__processes.pop(pid, None)
+        self.__baselines.pop(pid, None)
+        self.__names.pop(pid, None)
+
+    def sample(self) -> list[dict]:
+        """采样所有进程并返回 I/O 速率最高的前 K 个"""
+        now = time.monotonic()
+        elapsed = now - self.__last_time if self.__last_time is not None else 0
+        self.__last_time = now
+        rows = []
+        alive = set()
+        for pid in psutil.pids():
+            try:
+                proc = self.__get_process(pid)
+                counters = proc.io_counters()
+            except (NoSuchProcess, ZombieProcess):
+                self.__forget(pid)
+                continue
+            except AccessDenied:
+                # 无权限读取的进程保留句柄，避免每次重新创建
+                alive.add(pid)
+                continue
+            alive.add(pid)
+            baseline = self.__baselines.get(pid)
+            if baseline is not None and (counters.read_bytes < baseline[0] or counters.write_bytes < baseline[1]):
+                # 计数器变小说明 pid 已被新进程复用，重新获取进程(名称)并以当前计数器为基线
+                self.__forget(pid)
+                try:
+                    self.__get_process(pid)
+                except (NoSuchProcess, ZombieProcess, AccessDenied):
+                    self.__forget(pid)
+                    continue
+                baseline = None
+            self.__baselines[pid] = (counters.read_bytes, counters.write_bytes)
+            if baseline is None or elapsed <= 0:
+                continue
+            read_rate = (counters.read_bytes - baseline[0]) / elapsed
+            write_rate = (counters.write_bytes - baseline[1]) / elapsed
+            if read_rate or write_rate:
+                rows.append((read_rate + write_rate, pid, int(read_rate), int(write_rate)))
+        # 清理已结束的进程
+        for pid in [pid for pid in self.__processes if pid not in alive]:
+            self.__forget(pid)
+        return [
+            {"pid": pid, "name": self.__names.get(pid), "read_bytes": read_rate, "write_bytes": write_rate}
+            for _, pid, read_rate, write_rate in heapq.nlargest(self.__top, rows)
+        ]
@@ -0,0 +1,210 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from utils.logger import logger
+
+try:
+    import resource
+except ModuleNotFoundError:
+    # Windows 下没有 resource 模块，仅支持运行时长与输出大小限制
+    resource = None
+
+# 超出限制的原因
+LIMIT_CPU_TIME = "cpu_time"
+LIMIT_WALL_TIME = "wall_time"
+LIMIT_OUTPUT_SIZE = "output_size"
+
+
+class ProcessLimits:
+    """
+    单次运行的资源限制，值为 None 表示不限制
+
+    cpu_time: CPU 时间(秒)，通过 RLIMIT_CPU 限制(子进程继承限制但分别计算)，超出后先收到 SIGXCPU，1 秒后 SIGKILL
+    memory: 虚拟内存(字节)，通过 RLIMIT_AS 限制
+    wall_time: 运行时长(秒)，超时后结束整个进程组
+    output_size: 输出大小(字节，stdout + stderr)，超出后结束整个进程组
+    """
+    cpu_time: int | None
+    memory: int | None
+    wall_time: float | None
+    output_size: int | None
+
+    def __init__(self, cpu_time: int = None, memory: int = None, wall_time: float = None, output_size: int = None):
+        self.cpu_time = cpu_time or None
+        self.memory = memory or None
+        self.wall_time = wall_time or None
+        self.output_size = output_size or None
+
+    @classmethod
+    def from_config(cls, limits: dict = None, defaults: dict = None):
+        """
+        按任务下发的限制创建，未指定的项使用配置中的默认值，0 表示不限制
+
+        limits = {
+            "cpu_time": 60,  # CPU 时间(秒)
+            "memory": 512,  # 虚拟内存(MB)
+            "wall_time": 300,  # 运行时长(秒)
+            "output_size": 10  # 输出大小(MB)
+        }
+        """
+        merged = {**(defaults or {}), **{key: value for key, value in (limits or {}).items() if value is not None}}
+        return cls(
+            cpu_time=int(merged.get('cpu_time') or 0),
+            memory=int((merged.get('memory') or 0) * 1024 * 1024),
+            wall_time=float(merged.get('wall_time') or 0),
+            output_size=int((merged.get('output_size') or 0) * 1024 * 1024)
+        )
+
+    def __rlimits(self) -> list[tuple[int, tuple[int, int]]]:
+        if resource is None:
+            return []
+        rlimits = []
+        if self.cpu_time:
+            rlimits.append((resource.RLIMIT_CPU, (self.cpu_time, self.cpu_time + 1)))
+        if self.memory:
+            rlimits.append((resource.RLIMIT_AS, (self.memory, self.memory)))
+        return rlimits
+
+    def is_limited(self) -> bool:
+        """是否设置了任一限制"""
+        return any((self.cpu_time, self.memory, self.wall_time, self.output_size))
+
+    def popen_kwargs(self) -> dict:
+        """
+        创建进程时的参数
+
+        设置了限制时放入新的会话，便于结束整个进程组，并在 fork 后 exec 前设置资源限制，
+        shell 创建的所有子进程都会继承；未设置限制时不改变进程组。
+        """
+        if sys.platform == 'win32' or not self.is_limited():
+            return {}
+        kwargs = {'start_new_session': True}
+        if self.__rlimits():
+            kwargs['preexec_fn'] = self.__apply_rlimits
+        return kwargs
+
+    def __apply_rlimits(self):
+        """在子进程中 exec 前调用"""
+        for limit, value in self.__rlimits():
+            resource.setrlimit(limit, value)
+
+
+def kill_process(process: subprocess.Popen):
+    """结束进程，以新会话创建的进程结束整个进程组"""
+    if process.returncode is not None:
+        return
+    try:
+        if sys.platform != 'win32' and os.getpgid(process.pid) == process.pid:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def reap_process(process: subprocess.Popen) -> bool:
+    """
+    非阻塞回收已退出的进程，返回进程是否已退出
+
+    非 Windows 下使用 wait4 回收，同时将资源使用情况保存到 process.rusage
+    """
+    if process.returncode is not None:
+        return True
+    if not hasattr(os, 'wait4'):
+        return process.poll() is not None
+    try:
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+    except ChildProcessError:
+        # 已被其他地方回收
+        return process.poll() is not None
+    if pid == 0:
+        return False
+    process.rusage = rusage
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return True
+
+
+class ProcessMonitor:
+    """
+    单次运行的限制执行与资源统计
+
+    运行时长通过定时器检查，输出大小由输出回调累加，超出后结束整个进程组并记录原因。
+    """
+    # ru_maxrss 的单位：macOS 为字节，其他系统为 KB
+    MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+    # ru_inblock / ru_oublock 的块大小
+    BLOCK_SIZE = 512
+    # RLIMIT_CPU 按时钟节拍检查，rusage 统计的 CPU 时间可能略低于限制
+    CPU_TIME_TOLERANCE = 0.05
+
+    process: subprocess.Popen
+    limits: ProcessLimits
+    start_time: float
+    output_bytes: int = 0
+    exceeded: str | None = None
+    __timer: threading.Timer | None = None
+    __lock: threading.Lock
+
+    def __init__(self, process: subprocess.Popen, limits: ProcessLimits):
+        self.process = process
+        self.limits = limits
+        self.start_time = time.monotonic()
+        self.__lock = threading.Lock()
+        if limits.wall_time:
+            self.__timer = threading.Timer(limits.wall_time, self.kill, args=(LIMIT_WALL_TIME,))
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    def add_output(self, size: int):
+        """累加输出字节数(由输出回调调用)"""
+        with self.__lock:
+            self.output_bytes += size
+            exceeded = self.limits.output_size and self.output_bytes > self.limits.output_size
+        if exceeded:
+            self.kill(LIMIT_OUTPUT_SIZE)
+
+    def kill(self, reason: str = None):
+        """结束进程，reason 为超出的限制"""
+        with self.__lock:
+            if self.exceeded is not None:
+                return
+            self.exceeded = reason
+        if reason is not None:
+            logger.warning(f"进程 {self.process.pid} 超出限制({reason})，结束进程")
+        kill_process(self.process)
+
+    def stop(self):
+        """进程已退出，停止检查"""
+        if self.__timer is not None:
+            self.__timer.cancel()
+
+    def usage(self) -> dict:
+        """
+        获取运行统计，CPU 时间、峰值内存与 I/O 仅在非 Windows 下可用(包含已回收的子进程)
+
+        进程由节点程序 fork 创建，峰值内存不低于创建进程时节点程序自身的内存占用。
+        内存超限只会使分配失败，无法可靠判断，不记录在 limit_exceeded 中。
+        """
+        usage = {
+            'duration': round(time.monotonic() - self.start_time, 3),
+            'output_bytes': self.output_bytes,
+            'limit_exceeded': self.exceeded,
+        }
+        rusage = getattr(self.process, 'rusage', None)
+        if rusage is not None:
+            if usage['limit_exceeded'] is None and self.limits.cpu_time and (
+                    self.process.returncode == -signal.SIGXCPU
+                    or rusage.ru_utime + rusage.ru_stime >= self.limits.cpu_time - self.CPU_TIME_TOLERANCE):
+                usage['limit_exceeded'] = LIMIT_CPU_TIME
+            usage.update({
+                'cpu_user': round(rusage.ru_utime, 3),
+                'cpu_system': round(rusage.ru_stime, 3),
+                'max_rss': rusage.ru_maxrss * self.MAXRSS_UNIT,
+                'read_bytes': rusage.ru_inblock * self.BLOCK_SIZE,
+                'write_bytes': rusage.ru_oublock * self.BLOCK_SIZE,
+            })
+        return usage
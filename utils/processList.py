@@ -0,0 +1,415 @@
+import heapq
+import math
+import re
+import sys
+import zlib
+from threading import Thread, Event, Lock
+
+import psutil
+from psutil import AccessDenied, NoSuchProcess, ZombieProcess
+
+from utils.logger import logger
+import utils.websocket as WebSocket
+
+
+class ProcessListDelta:
+    """
+    进程列表增量计算
+
+    记录已发送给服务端的进程列表，每次只计算新增、删除以及变化超过阈值的进程。
+    未超过阈值的变化不会更新已发送的值，因此累计的变化最终仍会被发送。
+    """
+    # 进程名、用户、状态发生变化时一定视为变化
+    KEY_FIELDS = ("name", "username", "status")
+
+    __rows: dict[int: dict]
+
+    def __init__(self, cpu_threshold: float = 0.5, memory_threshold: float = 0.1, swap_threshold: int = 1048576):
+        """
+        :param cpu_threshold: CPU占用变化阈值(百分点)
+        :param memory_threshold: 内存占用变化阈值(百分点)
+        :param swap_threshold: 虚拟内存变化阈值(字节)
+        """
+        self.__cpu_threshold = cpu_threshold
+        self.__memory_threshold = memory_threshold
+        self.__swap_threshold = swap_threshold
+        self.__rows = {}
+
+    def snapshot(self, rows: list[dict]) -> list[dict]:
+        """以完整列表重置状态"""
+        self.__rows = {row["pid"]: row for row in rows}
+        return rows
+
+    def diff(self, rows: list[dict]) -> dict:
+        """计算增量"""
+        current = {row["pid"]: row for row in rows}
+        added = [row for pid, row in current.items() if pid not in self.__rows]
+        removed = [pid for pid in self.__rows if pid not in current]
+        changed = [
+            row for pid, row in current.items()
+            if pid in self.__rows and self.__is_changed(self.__rows[pid], row)
+        ]
+        for pid in removed:
+            del self.__rows[pid]
+        for row in added + changed:
+            self.__rows[row["pid"]] = row
+        return {"added": added, "removed": removed, "changed": changed}
+
+    def __is_changed(self, old: dict, new: dict) -> bool:
+        if any(old.get(field) != new.get(field) for field in self.KEY_FIELDS):
+            return True
+        return (
+            abs(new["cpu_percent"] - old["cpu_percent"]) >= self.__cpu_threshold
+            or abs(new["memory_usage"] - old["memory_usage"]) >= self.__memory_threshold
+            or abs(new["swap_usage"] - old["swap_usage"]) >= self.__swap_threshold
+        )
+
+    def checksum(self) -> int:
+        """
+        已发送进程列表的校验值
+
+        不依赖 JSON 编码与浮点数格式，服务端可按以下规范形式逐字节重现:
+        进程按 pid 升序，每个进程一行 "pid\tname\tusername\tstatus\tcpu\tmemory\tswap\n"，
+        cpu 与 memory 为 floor(百分比 * 10 + 0.5) 的十进制整数(0.1 个百分点)，swap 为字节数的十进制整数，
+        name/username 为 null 时为空字符串，整体以 UTF-8 编码后计算 CRC32(IEEE 802.3，无符号)。
+        """
+        lines = []
+        for pid, row in sorted(self.__rows.items()):
+            lines.append("\t".join((
+                str(pid),
+                row["name"] or "",
+                row["username"] or "",
+                row["status"] or "",
+                str(math.floor(row["cpu_percent"] * 10 + 0.5)),
+                str(math.floor(row["memory_usage"] * 10 + 0.5)),
+                str(int(row["swap_usage"])),
+            )) + "\n")
+        return zlib.crc32("".join(lines).encode("utf-8"))
+
+
+class ProcessSampler:
+    """
+    进程采样器
+
+    缓存CPU核心数、内存总量、uid对应的用户名等静态信息，并在两次采样之间保留 psutil.Process 对象，
+    使 cpu_percent 为两次采样之间的真实差值。每个进程的全部属性在一次 oneshot() 中获取。
+    """
+    __cpu_count: int
+    __memory_total: int
+    __processes: dict[int: psutil.Process]
+    __create_times: dict[int: float]
+    __usernames: dict[int: str]
+
+    def __init__(self):
+        self.__cpu_count = psutil.cpu_count() or 1
+        self.__memory_total = psutil.virtual_memory().total
+        self.__processes = {}
+        self.__create_times = {}
+        self.__usernames = {}
+
+    def sample(self) -> list[dict]:
+        """采样所有进程"""
+        rows = []
+        alive = set()
+        for pid in psutil.pids():
+            row = self.__sample_process(pid)
+            if row is not None:
+                rows.append(row)
+                alive.add(pid)
+        # 清理已结束的进程
+        for pid in [pid for pid in self.__processes if pid not in alive]:
+            del self.__processes[pid]
+            del self.__create_times[pid]
+        return rows
+
+    def __get_process(self, pid: int) -> psutil.Process:
+        proc = self.__processes.get(pid)
+        if proc is None:
+            proc = self.__processes[pid] = psutil.Process(pid)
+            self.__create_times[pid] = proc.create_time()
+        return proc
+
+    def __sample_process(self, pid: int) -> dict | None:
+        try:
+            proc = self.__get_process(pid)
+            with proc.oneshot():
+                if proc.create_time() != self.__create_times[pid]:
+                    # pid 已被新进程复用
+                    del self.__processes[pid]
+                    proc = self.__get_process(pid)
+                name = proc.name()
+                status = proc.status()
+                username = self.__get_username(proc)
+                try:
+                    cpu_percent = proc.cpu_percent(None)
+                    memory_info = proc.memory_info()
+                    rss, vms = memory_info.rss, memory_info.vms
+                except AccessDenied:
+                    cpu_percent, rss, vms = 0.0, 0, 0
+        except ZombieProcess:
+            return {
+                "pid": pid,
+                "name": None,
+                "username": None,
+                "status": psutil.STATUS_ZOMBIE,
+                "cpu_percent": 0.0,
+                "memory_usage": 0.0,
+                "swap_usage": 0
+            }
+        except (NoSuchProcess, KeyError):
+            self.__processes.pop(pid, None)
+            self.__create_times.pop(pid, None)
+            return None
+        except AccessDenied:
+            return None
+        return {
+            "pid": pid,
+            "name": name,
+            "username": username,
+            "status": status,
+            "cpu_percent": round(cpu_percent / self.__cpu_count, 1),
+            "memory_usage": round((rss / self.__memory_total) * 100, 1),
+            "swap_usage": vms
+        }
+
+    def __get_username(self, proc: psutil.Process) -> str | None:
+        """获取进程用户名，按 uid 缓存避免重复查询用户数据库"""
+        if sys.platform == 'win32':
+            try:
+                return proc.username()
+            except AccessDenied:
+                return None
+        uid = proc.uids().real
+        username = self.__usernames.get(uid)
+        if username is None:
+            try:
+                username = proc.username()
+            except (AccessDenied, KeyError):
+                username = str(uid)
+            self.__usernames[uid] = username
+        return username
+
+
+class ProcessListQuery:
+    """
+    进程列表过滤、排序与 Top-N
+
+    参数(均可选):
+    sort: str 排序字段 cpu / memory / pid / name
+    order: str 排序方向 asc / desc，cpu 与 memory 默认 desc，其余默认 asc
+    limit: int 只返回排序后的前 N 个进程(使用堆进行部分排序)
+    user: str | list[str] 用户名
+    name: str 进程名包含的字符串(不区分大小写)
+    name_regex: str 进程名正则表达式
+    status: str | list[str] 进程状态
+    """
+    SORT_KEYS = {
+        "cpu": "cpu_percent",
+        "memory": "memory_usage",
+        "pid": "pid",
+        "name": "name",
+    }
+    DESC_BY_DEFAULT = ("cpu", "memory")
+
+    def __init__(self, options: dict):
+        sort = options.get('sort')
+        self.__sort_field = self.SORT_KEYS.get(sort)
+        if sort and self.__sort_field is None:
+            logger.warning(f"未知的进程列表排序字段: {sort}")
+        order = options.get('order')
+        self.__reverse = order == 'desc' if order else sort in self.DESC_BY_DEFAULT
+        limit = options.get('limit')
+        self.limit = int(limit) if limit else None
+        self.__users = self.__to_set(options.get('user'))
+        self.__statuses = self.__to_set(options.get('status'))
+        name = options.get('name')
+        self.__name = name.lower() if name else None
+        self.__name_regex = None
+        if options.get('name_regex'):
+            try:
+                self.__name_regex = re.compile(options.get('name_regex'))
+            except re.error as err:
+                logger.warning(f"进程名正则表达式无效: {err}")
+
+    @staticmethod
+    def __to_set(value) -> set | None:
+        if not value:
+            return None
+        return {value} if isinstance(value, str) else set(value)
+
+    def __match(self, row: dict) -> bool:
+        if self.__users is not None and row["username"] not in self.__users:
+            return False
+        if self.__statuses is not None and row["status"] not in self.__statuses:
+            return False
+        name = row["name"] or ""
+        if self.__name is not None and self.__name not in name.lower():
+            return False
+        if self.__name_regex is not None and not self.__name_regex.search(name):
+            return False
+        return True
+
+    def apply(self, rows: list[dict]) -> tuple[list[dict], int]:
+        """
+        过滤并排序进程列表
+        :return: (结果列表, 过滤后排序截断前的进程数)
+        """
+        matched = [row for row in rows if self.__match(row)]
+        total = len(matched)
+        if self.__sort_field is None:
+            return (matched[:self.limit] if self.limit else matched), total
+        field = self.__sort_field
+        key = (lambda row: row[field] or "") if field == "name" else (lambda row: row[field])
+        if self.limit:
+            select = heapq.nlargest if self.__reverse else heapq.nsmallest
+            return select(self.limit, matched, key=key), total
+        return sorted(matched, key=key, reverse=self.__reverse), total
+
+
+class ProcessListStream:
+    """
+    进程列表推送
+
+    start 参数:
+    interval: int 刷新间隔(秒)，默认 5
+    delta: bool 是否启用增量推送，默认 False(每次发送完整列表)
+    cpu_threshold: float CPU占用变化阈值(百分点)
+    memory_threshold: float 内存占用变化阈值(百分点)
+    resync_interval: int 每隔多少次增量推送附带一次校验值
+    sort / order / limit / user / name / name_regex / status: 过滤与排序参数，见 ProcessListQuery
+    指定 limit 时消息附带 total(过滤后的进程总数)
+
+    增量模式下首先发送一次完整列表(process_list:show，附带 checksum)，之后发送:
+    {
+        'action': 'process_list:delta',
+        'data': {
+            'added': [...],  # 新增的进程
+            'removed': [pid, ...],  # 已结束的进程
+            'changed': [...],  # 变化超过阈值的进程
+            'checksum': 123456  # 仅每 resync_interval 次附带，与服务端不一致时服务端发送 process_list:resync
+        }
+    }
+    """
+    DEFAULT_INTERVAL = 5
+    MIN_INTERVAL = 1
+    DEFAULT_RESYNC_INTERVAL = 12
+    # 首次采样后等待多久再发送，使 cpu_percent 有可用的基准(秒)
+    PRIME_INTERVAL = 0.5
+
+    __websocket: WebSocket
+    __thread: Thread | None = None
+    __stop: Event | None = None
+    __wakeup: Event
+    __lock: Lock
+    __options: dict
+    __delta: ProcessListDelta | None = None
+    __sampler: ProcessSampler | None = None
+    __query: ProcessListQuery
+    __total: int | None = None
+    __resync: bool = True
+    __ticks: int = 0
+
+    def __init__(self, ws: WebSocket):
+        self.__websocket = ws
+        self.__wakeup = Event()
+        self.__lock = Lock()
+        self.__options = {}
+
+    def is_running(self) -> bool:
+        stop = self.__stop
+        return stop is not None and not stop.is_set()
+
+    def start(self, options: dict = None):
+        """开始推送，已在运行时更新参数并重新发送完整列表"""
+        with self.__lock:
+            self.__options = options or {}
+            self.__query = ProcessListQuery(self.__options)
+            self.__delta = ProcessListDelta(
+                cpu_threshold=self.__options.get('cpu_threshold', 0.5),
+                memory_threshold=self.__options.get('memory_threshold', 0.1)
+            )
+            self.__resync = True
+            if self.is_running():
+                self.__wakeup.set()
+                return
+            # 每次运行使用独立的停止/唤醒事件与采样器，已停止但尚未退出的线程不会被重新启用
+            self.__stop = Event()
+            self.__wakeup = Event()
+            self.__sampler = ProcessSampler()
+            self.__thread = Thread(
+                target=self.__run, args=(self.__stop, self.__wakeup, self.__sampler),
+                name="ProcessListStream", daemon=True
+            )
+            self.__thread.start()
+
+    def stop(self):
+        with self.__lock:
+            if self.__stop is not None:
+                self.__stop.set()
+                self.__wakeup.set()
+
+    def resync(self):
+        """下一次推送发送完整列表"""
+        self.__resync = True
+        self.__wakeup.set()
+
+    def __interval(self) -> float:
+        interval = self.__options.get('interval') or self.DEFAULT_INTERVAL
+        return max(self.MIN_INTERVAL, float(interval))
+
+    def __run(self, stop: Event, wakeup: Event, sampler: ProcessSampler):
+        logger.debug("获取进程列表进程已启动.....")
+        try:
+            # 建立 cpu_percent 基准
+            sampler.sample()
+        except AccessDenied:
+            pass
+        wakeup.wait(self.PRIME_INTERVAL)
+        wakeup.clear()
+        while not stop.is_set():
+            try:
+                rows = sampler.sample()
+            except AccessDenied:
+                logger.warning("无权限获取进程列表，请检查是否已用root用户运行")
+                stop.set()
+                break
+            with self.__lock:
+                # 采样期间已停止时不再发送
+                if stop.is_set():
+                    break
+                self.__send(rows)
+            wakeup.wait(self.__interval())
+            wakeup.clear()
+        logger.debug("获取进程列表进程已停止")
+
+    def __send(self, rows: list[dict]):
+        query = self.__query
+        rows, total = query.apply(rows)
+        if not self.__options.get('delta', False):
+            payload = {'process_list': rows}
+            if query.limit:
+                payload['total'] = total
+            self.__websocket.send_json_nowait({'action': 'process_list:show', 'data': payload})
+            return
+        delta = self.__delta
+        if self.__resync:
+            self.__resync = False
+            self.__ticks = 0
+            self.__total = total
+            delta.snapshot(rows)
+            payload = {'process_list': rows, 'checksum': delta.checksum()}
+            if query.limit:
+                payload['total'] = total
+            self.__websocket.send_json_nowait({'action': 'process_list:show', 'data': payload})
+            return
+        payload = delta.diff(rows)
+        self.__ticks += 1
+        if query.limit and total != self.__total:
+            self.__total = total
+            payload['total'] = total
+        resync_interval = self.__options.get('resync_interval', self.DEFAULT_RESYNC_INTERVAL)
+        if resync_interval and self.__ticks % resync_interval == 0:
+            payload['checksum'] = delta.checksum()
+        elif not (payload['added'] or payload['removed'] or payload['changed'] or 'total' in payload):
+            return
+        self.__websocket.send_json_nowait({'action': 'process_list:delta', 'data': payload})
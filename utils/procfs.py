@@ -0,0 +1,211 @@
+import os
+from collections import namedtuple
+
+import psutil
+
+# 一次采样的原始计数器
+# cpu: 每个核心的 (总时间, 忙碌时间)；memory / swap: (总量, 已用)；
+# disk: (读取字节数, 写入字节数)，无磁盘时为 None；network: {网卡: (发送字节数, 接收字节数)}
+# devices: 未开启分设备统计时为 None，否则为 {磁盘名: DiskCounters}
+UsageSnapshot = namedtuple("UsageSnapshot", ["cpu", "memory", "swap", "disk", "network", "devices"])
+# 单个磁盘的计数器，busy_time / weighted_time 单位为毫秒，in_flight 为正在进行的 I/O 数
+DiskCounters = namedtuple("DiskCounters", [
+    "reads", "writes", "read_bytes", "write_bytes", "busy_time", "in_flight", "weighted_time"
+])
+
+
+def busy_time(times) -> tuple[float, float]:
+    """返回 (总时间, 忙碌时间)，与 psutil.cpu_percent 的计算方式一致"""
+    total = sum(times)
+    if psutil.LINUX:
+        # Linux 下 guest 时间已包含在 user/nice 中
+        total -= getattr(times, 'guest', 0) + getattr(times, 'guest_nice', 0)
+    # iowait 视为空闲
+    busy = total - times.idle - getattr(times, 'iowait', 0)
+    return total, busy
+
+
+class PsutilUsageSource:
+    """通过 psutil 读取计数器(全平台)，分设备统计不包含队列深度"""
+    __per_device: bool
+
+    def __init__(self, per_device: bool = False):
+        self.__per_device = per_device
+
+    def read(self) -> UsageSnapshot:
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        disk_io = psutil.disk_io_counters()
+        devices = None
+        if self.__per_device:
+            devices = {
+                name: DiskCounters(
+                    counters.read_count, counters.write_count, counters.read_bytes, counters.write_bytes,
+                    getattr(counters, 'busy_time', 0), 0, 0
+                )
+                for name, counters in (psutil.disk_io_counters(perdisk=True) or {}).items()
+            }
+        return UsageSnapshot(
+            [busy_time(times) for times in psutil.cpu_times(percpu=True)],
+            (memory.total, memory.used),
+            (swap.total, swap.used),
+            (disk_io.read_bytes, disk_io.write_bytes) if disk_io else None,
+            {nic: (counters.bytes_sent, counters.bytes_recv)
+             for nic, counters in psutil.net_io_counters(pernic=True).items()},
+            devices
+        )
+
+    def close(self):
+        pass
+
+
+class ProcFile:
+    """
+    保持打开的 /proc 文件
+
+    每次读取使用 preadv 从头读入复用的缓冲区，不需要重新打开文件；
+    缓冲区被填满时加倍后重新读取。
+    """
+    __fd: int
+    __buffer: bytearray
+
+    def __init__(self, path: str, size: int = 8192):
+        self.__fd = os.open(path, os.O_RDONLY)
+        self.__buffer = bytearray(size)
+
+    def read(self) -> bytes:
+        while True:
+            length = os.preadv(self.__fd, [self.__buffer], 0)
+            if length < len(self.__buffer):
+                return bytes(memoryview(self.__buffer)[:length])
+            self.__buffer = bytearray(len(self.__buffer) * 2)
+
+    def close(self):
+        os.close(self.__fd)
+
+
+class ProcfsUsageSource:
+    """
+    直接解析 /proc 读取计数器(仅 Linux)
+
+    /proc/stat、/proc/meminfo、/proc/diskstats、/proc/net/dev 保持打开，
+    meminfo 中所需字段的行号与 diskstats 中需要统计的磁盘在首次读取时确定，行号不匹配时重新定位。
+    计算方式与 psutil 保持一致。
+    """
+    MEMINFO_KEYS = (b"MemTotal:", b"MemFree:", b"MemAvailable:", b"SwapTotal:", b"SwapFree:")
+    SECTOR_SIZE = 512
+
+    __stat: ProcFile
+    __meminfo: ProcFile
+    __diskstats: ProcFile
+    __net_dev: ProcFile
+    __meminfo_lines: dict[bytes: int]
+    __disk_lines: int = -1
+    __disks: set[bytes]
+    __per_device: bool
+
+    def __init__(self, procfs_path: str = "/proc", per_device: bool = False):
+        self.__per_device = per_device
+        files = []
+        try:
+            for name in ("stat", "meminfo", "diskstats", "net/dev"):
+                files.append(ProcFile(os.path.join(procfs_path, name)))
+        except OSError:
+            for file in files:
+                file.close()
+            raise
+        self.__stat, self.__meminfo, self.__diskstats, self.__net_dev = files
+        self.__meminfo_lines = {}
+        self.__disks = set()
+
+    def __read_cpu(self) -> list[tuple[int, int]]:
+        cpu = []
+        for line in self.__stat.read().split(b"\n")[1:]:
+            if not line.startswith(b"cpu"):
+                break
+            # user nice system idle iowait irq softirq steal guest guest_nice
+            values = [int(value) for value in line.split()[1:]]
+            total = sum(values[:8])
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            cpu.append((total, total - idle))
+        return cpu
+
+    def __read_meminfo(self) -> dict[bytes: int]:
+        lines = self.__meminfo.read().split(b"\n")
+        values = {}
+        for key in self.MEMINFO_KEYS:
+            index = self.__meminfo_lines.get(key)
+            if index is None or index >= len(lines) or not lines[index].startswith(key):
+                index = next((i for i, line in enumerate(lines) if line.startswith(key)), None)
+                if index is None:
+                    continue
+                self.__meminfo_lines[key] = index
+            values[key] = int(lines[index].split()[1]) * 1024
+        return values
+
+    def __read_disk(self) -> tuple[tuple[int, int] | None, dict | None]:
+        lines = self.__diskstats.read().splitlines()
+        if len(lines) != self.__disk_lines:
+            # 设备变化时重新确定需要统计的磁盘(不含分区，与 psutil 一致)
+            self.__disk_lines = len(lines)
+            names = [line.split()[2] for line in lines if len(line.split()) > 2]
+            self.__disks = {name for name in names if os.path.exists(b"/sys/block/" + name)}
+        devices = {} if self.__per_device else None
+        if not self.__disks:
+            return None, devices
+        read_sectors = write_sectors = 0
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 10 or fields[2] not in self.__disks:
+                continue
+            read_sectors += int(fields[5])
+            write_sectors += int(fields[9])
+            if devices is not None and len(fields) >= 14:
+                # 字段: 读次数 读合并 读扇区 读耗时 写次数 写合并 写扇区 写耗时 进行中 忙碌时间 加权耗时
+                devices[fields[2].decode()] = DiskCounters(
+                    int(fields[3]), int(fields[7]),
+                    int(fields[5]) * self.SECTOR_SIZE, int(fields[9]) * self.SECTOR_SIZE,
+                    int(fields[12]), int(fields[11]), int(fields[13])
+                )
+        return (read_sectors * self.SECTOR_SIZE, write_sectors * self.SECTOR_SIZE), devices
+
+    def __read_network(self) -> dict[str: tuple[int, int]]:
+        network = {}
+        for line in self.__net_dev.read().split(b"\n")[2:]:
+            name, _, data = line.partition(b":")
+            if not data:
+                continue
+            fields = data.split()
+            network[name.strip().decode()] = (int(fields[8]), int(fields[0]))
+        return network
+
+    def read(self) -> UsageSnapshot:
+        memory = self.__read_meminfo()
+        total = memory.get(b"MemTotal:", 0)
+        available = memory.get(b"MemAvailable:", memory.get(b"MemFree:", 0))
+        if available > total:
+            available = memory.get(b"MemFree:", 0)
+        swap_total = memory.get(b"SwapTotal:", 0)
+        disk, devices = self.__read_disk()
+        return UsageSnapshot(
+            self.__read_cpu(),
+            (total, total - available),
+            (swap_total, swap_total - memory.get(b"SwapFree:", 0)),
+            disk,
+            self.__read_network(),
+            devices
+        )
+
+    def close(self):
+        for file in (self.__stat, self.__meminfo, self.__diskstats, self.__net_dev):
+            file.close()
+
+
+def create_usage_source(fast_path: bool = True, per_device: bool = False):
+    """创建计数器读取器，Linux 下优先直接解析 /proc，不可用时使用 psutil"""
+    if fast_path and psutil.LINUX:
+        try:
+            return ProcfsUsageSource(per_device=per_device)
+        except (OSError, ValueError):
+            pass
+    return PsutilUsageSource(per_device)
@@ -1,12 +1,10 @@
 import locale
 import os.path
-import asyncio
 import tempfile
-from queue import Queue
 
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_STOPPED
 from tzlocal import get_localzone
-from threading import Thread
 from datetime import datetime
 from uuid import uuid1
 
@@ -15,20 +13,36 @@ import time
 import sys
 import utils.websocket as websocket
 from utils.logger import logger
-from utils.model import Task
+from utils.config import config
+from utils.executor import register_agent_metrics, unregister_agent_metrics
+from utils.outputBatcher import OutputBatcher
+from utils.outputReader import OutputReader
+from utils.processLimits import ProcessLimits, ProcessMonitor, kill_process
+from utils.taskLog import TaskLogStore, TaskRunLog
+from utils.taskManifest import TaskManifest
+from utils.taskRunner import TaskRunner, OVERLAP_SKIP
+from utils.taskState import TaskStateCache
 
 
 class shellTaskUtils:
+    # 进程结束时上报的错误输出最大长度
+    MAX_ERROR_SIZE = 65536
+
     __websocket: websocket
-    __websocket_message_queue: Queue
-    __handle_websocket_thread: Thread | None = None
     __scheduler: BackgroundScheduler
     __process_list: dict[str: subprocess.Popen] = {}
-    __process_mark: dict[str:str] = {}
-    __get_process_thread: Thread = None
+    __process_task: dict[str:str] = {}
+    __process_error: dict[str:str] = {}
+    __process_monitor: dict[str: ProcessMonitor] = {}
+    __output_reader: OutputReader
+    __output_batcher: OutputBatcher | None
+    __task_runner: TaskRunner
+    __task_state: TaskStateCache
     __data_path: str
     __record_path: str
-    __record_fd: dict[str:any] = {}
+    __task_log: TaskLogStore = None
+    __task_manifest: TaskManifest = None
+    __run_log: dict[str: TaskRunLog] = {}
     __temp_filename: dict[str:str] = {}
 
     def __init__(self, ws: websocket):
@@ -37,14 +51,26 @@ class shellTaskUtils:
         """
         self.__websocket = ws
         local_tz = get_localzone()
-        self.__websocket_message_queue = Queue()
         self.__scheduler = BackgroundScheduler(timezone=local_tz)
+        self.__output_reader = OutputReader(self.__on_process_output, self.__on_process_exit, "TaskOutputReader")
+        self.__output_batcher = OutputBatcher.from_config(
+            lambda meta, entries: self.__send_websocket_action('task:process_output', {**meta, 'lines': entries}),
+            config().get_config().get('output'),
+            "TaskOutputBatcher"
+        )
+        self.__task_runner = TaskRunner.from_config(self.__launch_run, config().get_config().get('task_runner'))
+        register_agent_metrics("tasks", self.__task_runner.metrics)
+        self.__task_state = TaskStateCache.from_config(config().get_config().get('task_state'))
         logger.debug(f"调度器运行时区：{self.__scheduler.timezone}")
 
     @logger.catch
     def init_task_list(self, task_list):
         """
-        初始化节点任务列表
+        同步节点任务列表
+
+        每次连接(node:init_config)时调用，首次调用时初始化任务存储并启动调度器。
+        下发的列表与本地任务清单对比，只新增、删除或重新调度有变化的任务，
+        调度器与运行中的任务进程在断线重连期间保持运行。
 
         执行类型:
         指定时间 -> 'date-time'
@@ -61,7 +87,15 @@ class shellTaskUtils:
             "shell": "cd xxxxxx",  # Shell脚本
             "time": 10000,  # 在任务类型为date-time时为目标时间戳，其他情况则为从0点开始的秒数
             'week': [1, 2, 3],  # 仅在任务类型为cycle时生效，代表以周为单位的时间
-            "count": 5  # 执行次数
+            "count": 5,  # 执行次数
+            "priority": 0,  # 优先级，数值越大排队时越优先执行
+            "overlap": "skip",  # 上一次运行未结束时的策略: skip(跳过) / queue(排队) / kill(结束上一次运行)
+            "limits": {  # 资源限制，未指定的项使用配置 process_limits 中的默认值，0 表示不限制
+                "cpu_time": 60,  # CPU 时间(秒)
+                "memory": 512,  # 虚拟内存(MB)
+                "wall_time": 300,  # 运行时长(秒)
+                "output_size": 10  # 输出大小(MB)
+            }
         }
 
         task_start = {  # 任务进程开始时
@@ -82,111 +116,165 @@ class shellTaskUtils:
             }
         }
 
+        task_output_batch = {  # 启用输出合并(output.batch_output)时的任务进程输出
+            'action': 'task:process_output',
+            'data': {
+                'uuid': "xxxxxxxx",  # 任务uuid
+                "mark": "xxxxxxx",  # 另一个UUID，用于标记进程
+                'lines': [[10000, "process_output"]]  # [时间戳, 进程输出] 列表
+            }
+        }
+
         task_stop = {  # 任务进程停止时
             'action': 'task:process_stop',
             'data': {
                 'uuid': "xxxxxxxx",  # 任务uuid
                 "mark": "xxxxxxx",  # 另一个UUID，用于标记进程
                 'code': 0,  # 进程返回值，用于判断进程是否执行成功
+                'usage': {  # 运行统计
+                    'duration': 1.5,  # 运行时长(秒)
+                    'output_bytes': 1024,  # 输出字节数
+                    'limit_exceeded': None,  # 超出的限制: cpu_time / wall_time / output_size
+                    'cpu_user': 0.5,  # 用户态 CPU 时间(秒)，以下各项 Windows 下不提供
+                    'cpu_system': 0.1,  # 内核态 CPU 时间(秒)
+                    'max_rss': 10485760,  # 峰值内存(字节)
+                    'read_bytes': 0,  # 读取字节数
+                    'write_bytes': 4096  # 写入字节数
+                },
                 "timestamp": 10000  # 任务结束时时间搓
             }
         }
         """
 
-        # 初始化任务数据保存路径
-        self.__data_path = os.path.join(self.__websocket.get_base_data_save_path(), "tasks")
-        if not os.path.exists(self.__data_path):
-            os.mkdir(self.__data_path)
-        # 初始化录制保存路径
-        self.__record_path = os.path.join(self.__data_path, "record")
-        if not os.path.exists(self.__record_path):
-            os.mkdir(self.__record_path)
-        # 初始化任务集
-        for task in task_list:
-            """
-            uuid: str 任务唯一标识符
-            exec_type: str 执行类型
-            shell: str 执行的命令
-            cwd: str 执行器目录
-            exec_time: int 运行时间
-            exec_cycle: dict 运行周期
-            exec_count: 运行次数
-            """
-            task_uuid = task.get('uuid')
-            logger.info(f"初始化任务: {task_uuid}")
-            self.__handle_start_task(
-                uuid=task_uuid,
-                exec_type=task.get('type'),
-                shell=task.get('shell'),
-                cwd=task.get("exec_path"),
-                exec_time=task.get('time'),
-                exec_week=task.get('week'),
-                exec_count=task.get('exec_count')
-            )
-            if not self.__task_exists(task_uuid):
-                Task.create(
-                    name=task.get('name'),
-                    uuid=task_uuid,
-                    max_count=task.get('exec_count') if task.get('exec_count') != 0 else 0
-                )
-        self.__scheduler.start()
+        if self.__task_manifest is None:
+            # 首次同步：初始化任务数据保存路径
+            self.__data_path = os.path.join(self.__websocket.get_base_data_save_path(), "tasks")
+            if not os.path.exists(self.__data_path):
+                os.mkdir(self.__data_path)
+            # 初始化录制保存路径
+            self.__record_path = os.path.join(self.__data_path, "record")
+            self.__task_log = TaskLogStore(self.__record_path, config().get_config().get('task_log'))
+            # 一次性载入任务状态
+            self.__task_state.load()
+            self.__task_manifest = TaskManifest(self.__data_path)
+        # 与已注册的任务对比，只处理有变化的任务
+        added, removed, changed, unchanged = self.__task_manifest.diff(task_list or [])
+        for task_uuid in removed:
+            self.__remove_task(task_uuid)
+        for task in changed:
+            self.__reload_task(task)
+        for task in added:
+            self.__add_task(task)
+        if added or removed or changed:
+            self.__task_manifest.save()
+        logger.info(
+            f"任务同步完成(清单版本: {self.__task_manifest.version}): "
+            f"新增 {len(added)} 删除 {len(removed)} 变化 {len(changed)} 未变化 {unchanged}"
+        )
+        if self.__scheduler.state == STATE_STOPPED:
+            self.__scheduler.start()
 
-    @logger.catch
-    def add_task(self, task):
-        """添加任务"""
+    def __start_task(self, task: dict) -> bool:
+        """
+        注册任务到调度器并记录到任务清单
+        uuid: str 任务唯一标识符
+        type: str 执行类型
+        shell: str 执行的命令
+        exec_path: str 执行器目录
+        time: int 运行时间
+        week: list 运行周期
+        exec_count: 运行次数
+        """
         task_uuid = task.get('uuid')
-        logger.info(f"添加任务：{task_uuid}")
-        if self.__scheduler.get_job(task_uuid):
-            logger.warning(f"任务uuid: {task_uuid}已存在")
-            return False
-        self.__handle_start_task(
+        started = self.__handle_start_task(
             uuid=task_uuid,
             exec_type=task.get('type'),
             shell=task.get('shell'),
             cwd=task.get("exec_path"),
             exec_time=task.get('time'),
             exec_week=task.get('week'),
-            exec_count=task.get('exec_count')
+            exec_count=task.get('exec_count'),
+            priority=task.get('priority', 0),
+            overlap=task.get('overlap', OVERLAP_SKIP),
+            limits=task.get('limits')
         )
-        if not self.__task_exists(task_uuid):
-            Task.create(
-                name=task.get('name'),
-                uuid=task_uuid,
-                max_count=task.get('exec_count') if task.get('exec_count') != 0 else 0
-            )
-        return True
+        if started:
+            self.__task_manifest.set(task)
+        return bool(started)
 
-    @logger.catch
-    def remove_task(self, task_uuid):
-        """使用UUID删除任务"""
+    def __add_task(self, task: dict) -> bool:
+        task_uuid = task.get('uuid')
+        logger.info(f"添加任务：{task_uuid}")
+        if self.__scheduler.get_job(task_uuid):
+            logger.warning(f"任务uuid: {task_uuid}已存在")
+            return False
+        self.__task_state.ensure(task_uuid, task.get('name'), task.get('exec_count'))
+        return self.__start_task(task)
+
+    def __remove_task(self, task_uuid: str) -> bool:
         logger.info(f"删除任务：{task_uuid}")
+        self.__task_manifest.remove(task_uuid)
+        return self.__unschedule_task(task_uuid)
+
+    def __unschedule_task(self, task_uuid: str) -> bool:
+        """从调度器中移除任务(如达到最大执行次数)，任务仍保留在清单中，重连后不会被重新添加"""
+        self.__task_runner.remove(task_uuid)
         if not self.__scheduler.get_job(task_uuid):
             logger.warning(f"任务uuid: {task_uuid}不存在")
             return False
         self.__scheduler.remove_job(task_uuid)
+        return True
+
+    def __reload_task(self, task: dict) -> bool:
+        task_uuid = task.get('uuid')
+        logger.info(f"重载任务：{task_uuid}")
+        if self.__scheduler.get_job(task_uuid):
+            self.__scheduler.remove_job(task_uuid)
+        self.__task_state.update(task_uuid, task.get('name'), task.get('exec_count'))
+        return self.__start_task(task)
+
+    @logger.catch
+    def add_task(self, task):
+        """添加任务"""
+        added = self.__add_task(task)
+        if added:
+            self.__task_manifest.save()
+        return added
+
+    @logger.catch
+    def remove_task(self, task_uuid):
+        """使用UUID删除任务"""
+        removed = self.__task_manifest.contains(task_uuid)
+        self.__remove_task(task_uuid)
+        if removed:
+            self.__task_manifest.save()
 
     @logger.catch
     def reload_task(self, task):
         """重新载入一个任务"""
         task_uuid = task.get('uuid')
-        logger.info(f"重载任务：{task_uuid}")
-        if not self.__scheduler.get_job(task_uuid):
+        if not self.__task_manifest.contains(task_uuid):
             logger.warning(f"任务uuid: {task_uuid}不存在")
             return False
-        self.__scheduler.remove_job(task_uuid)
-        self.__handle_start_task(
-            uuid=task_uuid,
-            exec_type=task.get('type'),
-            shell=task.get('shell'),
-            cwd=task.get("exec_path"),
-            exec_time=task.get('time'),
-            exec_week=task.get('week'),
-            exec_count=task.get('exec_count')
-        )
-        return True
+        reloaded = self.__reload_task(task)
+        self.__task_manifest.save()
+        return reloaded
+
+    @logger.catch
+    def __submit_run(self, uuid: str, script: str, cwd: str = None, priority: int = 0, overlap: str = OVERLAP_SKIP,
+                     limits: ProcessLimits = None):
+        """调度器触发任务时提交到执行引擎"""
+        self.__task_runner.submit(uuid, (script, cwd, limits), priority, overlap)
+
+    def __launch_run(self, uuid: str, script: str, cwd: str = None, limits: ProcessLimits = None):
+        """由执行引擎调用，创建任务进程"""
+        if sys.platform != 'win32':
+            return self.__run_shell(script, uuid, cwd, limits)
+        return self.__run_bat(script, uuid, cwd, limits)
 
     @logger.catch
-    def __run_shell(self, script, uuid, cwd: str = None):
+    def __run_shell(self, script, uuid, cwd: str = None,
+                    limits: ProcessLimits = None) -> tuple[str, subprocess.Popen] | None:
         """
         运行Shell脚本
         """
@@ -194,20 +282,19 @@ class shellTaskUtils:
             cwd = os.path.join(os.getcwd(), "shell_run")
         if not os.path.exists(cwd):
             os.mkdir(cwd)
-        # 初始化任务保存路径
-        save_path = os.path.join(self.__record_path, uuid)
-        if not os.path.exists(save_path):
-            os.mkdir(save_path)
-
-        task_model = self.__get_task(uuid)
-        if task_model.max_count and task_model.max_count != 0 and task_model.count >= task_model.max_count:
-            self.remove_task(uuid)
+
+        task_state = self.__get_task(uuid)
+        if task_state is None:
+            return
+        if task_state.reached_limit():
+            self.__unschedule_task(uuid)
             return
 
         logger.debug(f"run shell script: {uuid} cwd: {cwd}")
         # script += "" if sys.platform != 'win32' else "\nexit /b 0"
 
         process_mark_uuid = str(uuid1())
+        limits = limits or ProcessLimits()
 
         self.__send_websocket_action('task:process_start', {
             'uuid': uuid,
@@ -216,16 +303,19 @@ class shellTaskUtils:
         })
 
         # 执行多行 shell 脚本，设置 shell=True 并使用 bash 解释器执行
-        self.__process_list[uuid] = subprocess.Popen(
+        process = subprocess.Popen(
             script,
             shell=True,
             cwd=cwd,
             executable='/bin/bash',
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE,
+            **limits.popen_kwargs()
         )
-        self.__process_mark[uuid] = process_mark_uuid
-        self.__record_fd[uuid] = open(os.path.join(save_path, process_mark_uuid), "w+", encoding='utf-8')
+        self.__process_list[process_mark_uuid] = process
+        self.__process_monitor[process_mark_uuid] = ProcessMonitor(process, limits)
+        self.__process_task[process_mark_uuid] = uuid
+        self.__run_log[process_mark_uuid] = self.__task_log.open_run(uuid, process_mark_uuid)
         record_info = (
             f"[INFO]\n"
             f"task uuid: {uuid}\n"
@@ -237,35 +327,33 @@ class shellTaskUtils:
             f"[SHELL]\n"
             f"[OUTPUT]\n"
         )
-        self.__record_fd[uuid].write(record_info)
-        task_model.count += 1
-        task_model.save()
-        # 如果线程不存在则初始化线程
-        if self.__get_process_thread is None:
-            self.__get_process_thread = Thread(
-                target=self.__get_process_output,
-                args=()
-            )
-            self.__get_process_thread.start()
+        run_log = self.__run_log[process_mark_uuid]
+        run_log.write(record_info)
+        self.__task_state.increment(uuid)
+        self.__task_state.start_run(uuid, process_mark_uuid, run_log.start_time, os.path.basename(run_log.path),
+                                    run_log.size)
+        self.__process_error[process_mark_uuid] = ""
+        self.__output_reader.add(process_mark_uuid, process)
+        return process_mark_uuid, process
 
     @logger.catch
-    def __run_bat(self, script, uuid, cwd: str = None):
+    def __run_bat(self, script, uuid, cwd: str = None,
+                  limits: ProcessLimits = None) -> tuple[str, subprocess.Popen] | None:
         """运行批处理"""
         if not cwd:
             cwd = os.path.join(os.getcwd(), "bat_run")
         if not os.path.exists(cwd):
             os.mkdir(cwd)
-        # 初始化任务保存路径
-        save_path = os.path.join(self.__record_path, uuid)
-        if not os.path.exists(save_path):
-            os.mkdir(save_path)
-
-        task_model = self.__get_task(uuid)
-        if task_model.max_count and task_model.max_count != 0 and task_model.count >= task_model.max_count:
-            self.remove_task(uuid)
+
+        task_state = self.__get_task(uuid)
+        if task_state is None:
+            return
+        if task_state.reached_limit():
+            self.__unschedule_task(uuid)
             return
         logger.debug(f"run bat: {uuid} cwd: {cwd}")
         process_mark_uuid = str(uuid1())
+        limits = limits or ProcessLimits()
 
         self.__send_websocket_action('task:process_start', {
             'uuid': uuid,
@@ -278,15 +366,18 @@ class shellTaskUtils:
             temp_file.write(script.encode(locale.getpreferredencoding()))
             temp_filename = temp_file.name
         # 执行批处理文件并捕获标准输出和标准错误输出
-        self.__process_list[uuid] = subprocess.Popen(
+        process = subprocess.Popen(
             temp_filename,
             shell=True,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE,
+            **limits.popen_kwargs()
         )
-        self.__temp_filename[uuid] = temp_filename
-        self.__process_mark[uuid] = process_mark_uuid
-        self.__record_fd[uuid] = open(os.path.join(save_path, process_mark_uuid), "w+", encoding='utf-8')
+        self.__temp_filename[process_mark_uuid] = temp_filename
+        self.__process_list[process_mark_uuid] = process
+        self.__process_monitor[process_mark_uuid] = ProcessMonitor(process, limits)
+        self.__process_task[process_mark_uuid] = uuid
+        self.__run_log[process_mark_uuid] = self.__task_log.open_run(uuid, process_mark_uuid)
         record_info = (
             f"[INFO]\n"
             f"task uuid: {uuid}\n"
@@ -298,75 +389,98 @@ class shellTaskUtils:
             f"[BAT]\n\n"
             f"[OUTPUT]\n"
         )
-        self.__record_fd[uuid].write(record_info)
-        task_model.count += 1
-        task_model.save()
-        # 如果线程不存在则初始化线程
-        if self.__get_process_thread is None:
-            self.__get_process_thread = Thread(
-                target=self.__get_process_output,
-                args=()
-            )
-            self.__get_process_thread.start()
+        run_log = self.__run_log[process_mark_uuid]
+        run_log.write(record_info)
+        self.__task_state.increment(uuid)
+        self.__task_state.start_run(uuid, process_mark_uuid, run_log.start_time, os.path.basename(run_log.path),
+                                    run_log.size)
+        self.__process_error[process_mark_uuid] = ""
+        self.__output_reader.add(process_mark_uuid, process)
+        return process_mark_uuid, process
+
+    def __on_process_output(self, mark, stream, lines: list[bytes]):
+        """处理进程输出(由输出读取线程回调)"""
+        encoding = locale.getpreferredencoding()
+        uuid = self.__process_task[mark]
+        self.__process_monitor[mark].add_output(sum(len(line) + 1 for line in lines))
+        if stream == "stderr":
+            error = "\n".join(line.decode(encoding, errors="ignore") for line in lines)
+            logger.debug(f'[uuid: {uuid}]Subprogram error: {error}')
+            # 仅保留最后一部分错误输出，避免错误输出过多时占满内存
+            self.__process_error[mark] = (self.__process_error.get(mark, "") + error + "\n")[-self.MAX_ERROR_SIZE:]
+            return
+        timestamp = time.time()
+        output = []
+        for line in lines:
+            line = line.strip().decode(encoding, errors="ignore")
+            if not line:
+                continue
+            logger.debug(f'[uuid: {uuid}]Subprogram output: {line}')
+            output.append(line)
+        if not output:
+            return
+        self.__run_log[mark].write("\n".join(output) + "\n")
+        if self.__output_batcher is not None:
+            self.__output_batcher.add(mark, {'uuid': uuid, 'mark': mark}, output, timestamp)
+            return
+        for line in output:
+            self.__send_websocket_action("task:process_output", {
+                'uuid': uuid,
+                'mark': mark,
+                'line': line,
+                'timestamp': timestamp
+            })
+
+    def __on_process_exit(self, mark, process: subprocess.Popen):
+        """处理进程结束(由输出读取线程回调)"""
+        uuid = self.__process_task[mark]
+        if self.__output_batcher is not None:
+            # 先发送积压的输出，保证输出消息在结束消息之前
+            self.__output_batcher.flush(mark)
+        stderr = self.__process_error.pop(mark, "").strip()
+        if stderr:
+            logger.error(f"执行错误:{stderr}")
+        monitor = self.__process_monitor.pop(mark)
+        monitor.stop()
+        usage = monitor.usage()
+        logger.debug(f"[uuid: {uuid}]进程结束(code:{process.returncode}) {usage}")
+        self.__send_websocket_action("task:process_stop", {
+            'uuid': uuid,
+            'mark': mark,
+            'code': process.returncode,
+            'error': stderr,
+            'usage': usage,
+            'timestamp': time.time()
+        })
+        end_info = (
+            f"[OUTPUT]\n\n"
+            f"[END]\n"
+            f"end time: {time.time()}\n"
+            f"return: {process.returncode}\n"
+            f"usage: {usage}\n"
+        )
+        end_info += f"error: {stderr}\n" if stderr else ""
+        end_info += f"[END]"
 
-    @logger.catch
-    def __get_process_output(self):
-        """获取所有进程输出"""
-        logger.debug("获取进程输出开始")
-        while len(self.__process_list) > 0:
-            close_list = []
-            for i in self.__process_list:
-                process = self.__process_list[i]
-                line = process.stdout.readline()
-                line = line.strip().decode(locale.getpreferredencoding())
-                if line:
-                    logger.debug(f'[uuid: {i}]Subprogram output: {line}')
-                    self.__record_fd[i].write(f"{line}\n")
-                    self.__send_websocket_action("task:process_output", {
-                        'uuid': i,
-                        'mark': self.__process_mark[i],
-                        'line': line,
-                        'timestamp': time.time()
-                    })
-                if process.poll() is not None and not line:
-                    stdout, stderr = process.communicate()
-                    if stderr:
-                        logger.error(f"执行错误:{stderr.decode()}")
-                    logger.debug(f"[uuid: {i}]进程结束(code:{process.poll()})")
-                    self.__send_websocket_action("task:process_stop", {
-                        'uuid': i,
-                        'mark': self.__process_mark[i],
-                        'code': process.returncode,
-                        'error': stderr.decode(),
-                        'timestamp': time.time()
-                    })
-                    end_info = (
-                        f"[OUTPUT]\n\n"
-                        f"[END]\n"
-                        f"end time: {time.time()}\n"
-                        f"return: {process.returncode}\n"
-                    )
-                    end_info += f"error: {stderr.decode()}\n" if stderr else ""
-                    end_info += f"[END]"
-
-                    if sys.platform == 'win32':
-                        temp_filename = self.__temp_filename[i]
-                        # 删除临时批处理文件
-                        if os.path.exists(temp_filename):
-                            os.remove(temp_filename)
-
-                    self.__record_fd[i].write(end_info)
-                    close_list.append(i)
-            for i in close_list:
-                logger.debug(f"delete process: {i}")
-                del self.__process_list[i]
-                self.__record_fd[i].close()
-        logger.debug("获取进程输出结束")
-        self.__get_process_thread = None
+        if sys.platform == 'win32':
+            temp_filename = self.__temp_filename.pop(mark)
+            # 删除临时批处理文件
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+
+        self.__run_log[mark].write(end_info)
+        logger.debug(f"delete process: {uuid}({mark})")
+        self.__process_list.pop(mark, None)
+        self.__process_task.pop(mark, None)
+        record_file = self.__run_log.pop(mark).close(process.returncode)
+        self.__task_state.finish_run(mark, process.returncode, usage, record_file)
+        # 释放执行槽位，启动排队中的任务
+        self.__task_runner.finish(mark)
 
     @logger.catch
     def __handle_start_task(self, uuid: str, exec_type: str, shell: str, cwd: str = None, exec_time: int = None,
-                            exec_week: list[int] = None, exec_count: int = None) -> bool:
+                            exec_week: list[int] = None, exec_count: int = None, priority: int = 0,
+                            overlap: str = OVERLAP_SKIP, limits: dict = None) -> bool:
         """
         处理启动任务请求
         uuid: str 任务唯一标识符
@@ -376,6 +490,9 @@ class shellTaskUtils:
         exec_time: int 运行时间
         exec_week: dict 运行周期(星期)
         exec_count: 运行次数
+        priority: int 优先级
+        overlap: str 上一次运行未结束时的策略
+        limits: dict 资源限制
         """
         if not exec_type:
             logger.warning(f"任务uuid: {uuid}配置失败(缺少任务类型)")
@@ -383,18 +500,14 @@ class shellTaskUtils:
         if not shell:
             logger.warning(f"任务uuid: {uuid}配置失败(缺少任务载荷)")
             return False
-
-        if sys.platform != 'win32':
-            run = self.__run_shell
-        else:
-            run = self.__run_bat
+        limits = ProcessLimits.from_config(limits, config().get_config().get('process_limits'))
 
         match exec_type:
             case "date-time":
                 # 指定时间任务
                 self.__scheduler.add_job(
-                    run,
-                    args=[shell, uuid, cwd],
+                    self.__submit_run,
+                    args=[uuid, shell, cwd, priority, overlap, limits],
                     id=uuid,
                     name=uuid,
                     trigger='date',
@@ -411,8 +524,8 @@ class shellTaskUtils:
                 minutes = (exec_time % 3600) // 60
                 logger.debug(f"hour: {hours} minute: {minutes}")
                 self.__scheduler.add_job(
-                    run,
-                    args=[shell, uuid, cwd],
+                    self.__submit_run,
+                    args=[uuid, shell, cwd, priority, overlap, limits],
                     id=uuid,
                     name=uuid,
                     trigger='cron',
@@ -424,8 +537,8 @@ class shellTaskUtils:
             case "interval":
                 # 间隔任务
                 self.__scheduler.add_job(
-                    run,
-                    args=[shell, uuid, cwd],
+                    self.__submit_run,
+                    args=[uuid, shell, cwd, priority, overlap, limits],
                     id=uuid,
                     trigger='interval',
                     seconds=exec_time,
@@ -460,39 +573,31 @@ class shellTaskUtils:
     def __send_websocket_action(self, action, payload: dict = None):
         if payload is None:
             payload = {}
-
-        self.__websocket_message_queue.put({'action': action, 'data': payload})
-        if self.__handle_websocket_thread is None:
-            self.__handle_websocket_thread = Thread(
-                target=self.__handle_websocket_queue,
-                args=()
-            )
-            self.__handle_websocket_thread.start()
-
-    def __handle_websocket_queue(self):
-        while True:
-            task = self.__websocket_message_queue.get()
-            if not task:
-                break
-            try:
-                asyncio.run(self.__websocket.websocket_send_json(task))
-            except Exception as err:
-                logger.error(f"Send WebSocket Message Error: {err}")
-        self.__handle_websocket_thread = None
+        self.__websocket.send_json_nowait({'action': action, 'data': payload})
 
     @logger.catch
     def __get_task(self, uuid):
-        query = Task.select().where(Task.uuid == uuid)
-        if query.exists():
-            return query.get()  # 获取具体的 Task 对象
-            # 处理找到的 task 对象
-        else:
+        task_state = self.__task_state.get(uuid)
+        if task_state is None:
             logger.warning(f'Task with uuid {uuid} does not exist.')
+        return task_state
+
+    @logger.catch
+    def list_runs(self, task_uuid: str, limit: int = 50, status: str = None) -> list[dict]:
+        """列出任务最近的运行记录"""
+        return self.__task_state.query_runs(task_uuid, limit, status)
+
+    @logger.catch
+    def run_stats(self, task_uuid: str, start: float = None, end: float = None) -> dict:
+        """统计任务的运行情况(失败率、p95 运行时长等)"""
+        return self.__task_state.run_stats(task_uuid, start, end)
 
     @logger.catch
-    def __task_exists(self, uuid):
-        """任务是否已存在于数据库中"""
-        return Task.select().where(Task.uuid == uuid).exists()
+    def tail_run(self, task_uuid: str, mark: str, size: int = 65536) -> str | None:
+        """获取一次运行输出的末尾部分"""
+        if self.__task_log is None:
+            return None
+        return self.__task_log.tail(task_uuid, mark, size)
 
     def close(self):
         """关闭工具实例"""
@@ -501,14 +606,19 @@ class shellTaskUtils:
             job.remove()
         # 删除临时批处理文件
         if sys.platform == 'win32':
-            for temp_filename in self.__temp_filename:
+            for temp_filename in self.__temp_filename.values():
                 if os.path.exists(temp_filename):
                     os.remove(temp_filename)
-        if self.__scheduler.state != 0:
+        if self.__scheduler.state != STATE_STOPPED:
             self.__scheduler.shutdown(wait=False)
+        self.__task_runner.close()
+        unregister_agent_metrics("tasks")
         # 停止正在运行的进程
-        for proces in self.__process_list.values():
-            proces.kill()
-        # 关闭文件流
-        for fd in self.__record_fd.values():
-            fd.close()
+        for proces in list(self.__process_list.values()):
+            kill_process(proces)
+        self.__output_reader.close()
+        # 结束运行日志
+        if self.__task_log is not None:
+            self.__task_log.close()
+        # 写入剩余的任务状态
+        self.__task_state.close()
@@ -0,0 +1,327 @@
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+from utils.logger import logger
+
+INDEX_FILENAME = "index.json"
+LOG_SUFFIX = ".log"
+COMPRESSED_SUFFIX = ".log.gz"
+
+
+class TaskRunLog:
+    """
+    单次任务运行的日志
+
+    输出先写入内存缓冲区，超过 buffer_size 后一次性追加到文件，减少小块写入。
+    """
+    mark: str
+    task_uuid: str
+    path: str
+    start_time: float
+    __store: any
+    __fd: any
+    __buffer: bytearray
+    __buffer_size: int
+    __size: int = 0
+    __lock: threading.Lock
+
+    def __init__(self, store, task_uuid: str, mark: str, path: str, buffer_size: int):
+        self.__store = store
+        self.task_uuid = task_uuid
+        self.mark = mark
+        self.path = path
+        self.start_time = time.time()
+        self.__fd = open(path, "ab", buffering=0)
+        self.__buffer = bytearray()
+        self.__buffer_size = buffer_size
+        self.__lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """已写入的字节数(包含缓冲区)"""
+        return self.__size
+
+    def write(self, text: str):
+        data = text.encode("utf-8", errors="replace")
+        with self.__lock:
+            self.__buffer += data
+            self.__size += len(data)
+            if len(self.__buffer) >= self.__buffer_size:
+                self.__flush()
+
+    def __flush(self):
+        if self.__buffer and self.__fd is not None:
+            self.__fd.write(self.__buffer)
+            self.__buffer.clear()
+
+    def flush(self):
+        with self.__lock:
+            self.__flush()
+
+    def close(self, code: int | None) -> str | None:
+        """结束运行：写入剩余缓冲区并更新索引(压缩与清理在后台完成)，返回最终的日志文件名"""
+        with self.__lock:
+            if self.__fd is None:
+                return None
+            self.__flush()
+            self.__fd.close()
+            self.__fd = None
+        return self.__store.finish_run(self, code)
+
+
+class TaskLogStore:
+    """
+    任务运行日志存储
+
+    每个任务一个目录(record/<任务uuid>/)，每次运行一个日志文件(<mark>.log，结束后可压缩为 .log.gz)，
+    目录下的 index.json 记录所有运行的开始/结束时间、返回值与输出字节数，
+    获取输出末尾时不需要扫描目录(运行记录的查询统计见 TaskRun)。
+    每次运行结束后按数量、保存天数与总大小清理该任务最旧的运行记录。
+
+    索引在内存中维护，运行开始/结束时只更新内存中的索引条目，
+    日志压缩、旧记录清理与 index.json 的写入由单独的后台线程完成，不阻塞输出读取线程。
+
+    索引格式:
+
+    index = [
+        {
+            "mark": "xxxxxxx",  # 运行标记
+            "file": "xxxxxxx.log.gz",  # 日志文件名
+            "start_time": 10000,
+            "end_time": 10010,  # 运行中为 None
+            "code": 0,  # 返回值，运行中为 None
+            "output_bytes": 1024,  # 输出字节数(未压缩)
+            "file_size": 256  # 日志文件大小
+        }
+    ]
+    """
+    __root: str
+    __compress: bool
+    __max_runs: int
+    __max_age: float
+    __max_total_size: int
+    __buffer_size: int
+    __condition: threading.Condition
+    __running: dict[tuple[str, str]: TaskRunLog]
+    __indexes: dict[str: list[dict]]
+    __dirty: set[str]
+    __jobs: deque
+    __thread: threading.Thread
+    __closed: bool = False
+
+    def __init__(self, root: str, task_log_config: dict = None):
+        task_log_config = task_log_config or {}
+        self.__root = root
+        self.__compress = task_log_config.get('compress', True)
+        self.__max_runs = task_log_config.get('max_runs', 100)
+        self.__max_age = task_log_config.get('max_age_days', 30) * 86400
+        self.__max_total_size = task_log_config.get('max_total_size', 100) * 1024 * 1024
+        self.__buffer_size = task_log_config.get('buffer_size', 262144)
+        self.__condition = threading.Condition()
+        self.__running = {}
+        self.__indexes = {}
+        self.__dirty = set()
+        self.__jobs = deque()
+        os.makedirs(root, exist_ok=True)
+        self.__thread = threading.Thread(target=self.__run, name="TaskLogWorker", daemon=True)
+        self.__thread.start()
+
+    def __task_path(self, task_uuid: str) -> str:
+        return os.path.join(self.__root, os.path.basename(task_uuid))
+
+    def __read_index(self, task_uuid: str) -> list[dict]:
+        path = os.path.join(self.__task_path(task_uuid), INDEX_FILENAME)
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"任务日志索引读取失败({task_uuid}): {e}")
+            return []
+
+    def __write_index(self, task_uuid: str, index: list[dict]):
+        path = os.path.join(self.__task_path(task_uuid), INDEX_FILENAME)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(temp_path, path)
+
+    def __index(self, task_uuid: str) -> list[dict]:
+        """获取内存中的索引，首次访问时从文件读取(需持有锁)"""
+        index = self.__indexes.get(task_uuid)
+        if index is None:
+            index = self.__indexes[task_uuid] = self.__read_index(task_uuid)
+        return index
+
+    @staticmethod
+    def __find(index: list[dict], mark: str) -> dict | None:
+        return next((run for run in index if run["mark"] == mark), None)
+
+    def open_run(self, task_uuid: str, mark: str) -> TaskRunLog:
+        """开始一次运行"""
+        task_path = self.__task_path(task_uuid)
+        os.makedirs(task_path, exist_ok=True)
+        run_log = TaskRunLog(self, task_uuid, mark, os.path.join(task_path, mark + LOG_SUFFIX), self.__buffer_size)
+        with self.__condition:
+            self.__running[(task_uuid, mark)] = run_log
+            self.__index(task_uuid).append({
+                "mark": mark,
+                "file": mark + LOG_SUFFIX,
+                "start_time": run_log.start_time,
+                "end_time": None,
+                "code": None,
+                "output_bytes": 0,
+                "file_size": 0,
+            })
+            self.__dirty.add(task_uuid)
+            self.__condition.notify()
+        return run_log
+
+    def finish_run(self, run_log: TaskRunLog, code: int | None) -> str:
+        """
+        运行结束：更新内存中的索引条目，压缩与清理交由后台线程，返回最终的日志文件名
+
+        压缩完成前索引中仍为未压缩的文件名，tail 可照常读取。
+        """
+        with self.__condition:
+            self.__running.pop((run_log.task_uuid, run_log.mark), None)
+            run = self.__find(self.__index(run_log.task_uuid), run_log.mark)
+            if run is not None:
+                run.update({
+                    "end_time": time.time(),
+                    "code": code,
+                    "output_bytes": run_log.size,
+                    "file_size": run_log.size,
+                })
+            self.__dirty.add(run_log.task_uuid)
+            self.__jobs.append(run_log)
+            self.__condition.notify()
+        return run_log.mark + (COMPRESSED_SUFFIX if self.__compress else LOG_SUFFIX)
+
+    def __run(self):
+        """后台线程：压缩日志、清理旧记录并写入有变化的索引"""
+        while True:
+            with self.__condition:
+                while not self.__closed and not self.__jobs and not self.__dirty:
+                    self.__condition.wait()
+                if self.__closed and not self.__jobs and not self.__dirty:
+                    return
+                jobs = list(self.__jobs)
+                self.__jobs.clear()
+            for run_log in jobs:
+                try:
+                    self.__archive(run_log)
+                except Exception as e:
+                    logger.error(f"任务日志归档失败({run_log.path}): {e}")
+            self.__write_dirty()
+
+    def __archive(self, run_log: TaskRunLog):
+        """压缩一次已结束运行的日志，并按保留策略清理该任务的旧记录"""
+        filename = run_log.mark + LOG_SUFFIX
+        if self.__compress:
+            compressed_path = os.path.join(self.__task_path(run_log.task_uuid), run_log.mark + COMPRESSED_SUFFIX)
+            try:
+                with open(run_log.path, "rb") as src, gzip.open(compressed_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.remove(run_log.path)
+                filename = run_log.mark + COMPRESSED_SUFFIX
+            except OSError as e:
+                logger.error(f"任务日志压缩失败({run_log.path}): {e}")
+        file_path = os.path.join(self.__task_path(run_log.task_uuid), filename)
+        file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        with self.__condition:
+            index = self.__index(run_log.task_uuid)
+            run = self.__find(index, run_log.mark)
+            if run is not None:
+                run.update({"file": filename, "file_size": file_size})
+            index, expired = self.__apply_retention(run_log.task_uuid, index)
+            self.__indexes[run_log.task_uuid] = index
+            self.__dirty.add(run_log.task_uuid)
+        for run in expired:
+            try:
+                os.remove(os.path.join(self.__task_path(run_log.task_uuid), run["file"]))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"任务日志删除失败({run['file']}): {e}")
+
+    def __write_dirty(self):
+        """写入有变化的索引文件(仅由后台线程调用)"""
+        with self.__condition:
+            dirty = {task_uuid: [dict(run) for run in self.__index(task_uuid)] for task_uuid in self.__dirty}
+            self.__dirty.clear()
+        for task_uuid, index in dirty.items():
+            try:
+                self.__write_index(task_uuid, index)
+            except OSError as e:
+                logger.error(f"任务日志索引写入失败({task_uuid}): {e}")
+
+    def __apply_retention(self, task_uuid: str, index: list[dict]) -> tuple[list[dict], list[dict]]:
+        """按数量、保存时间与总大小选出最旧的已结束运行记录，返回 (保留的索引, 需删除的记录)(需持有锁)"""
+        now = time.time()
+        finished = [run for run in index if run["end_time"] is not None]
+        total_size = sum(run["file_size"] for run in finished)
+        expired = []
+        count = len(index)
+        for run in sorted(finished, key=lambda item: item["start_time"]):
+            if count <= self.__max_runs and now - run["start_time"] <= self.__max_age \
+                    and total_size <= self.__max_total_size:
+                break
+            expired.append(run)
+            count -= 1
+            total_size -= run["file_size"]
+        if not expired:
+            return index, expired
+        logger.debug(f"任务 {task_uuid} 清理了 {len(expired)} 条运行记录")
+        marks = {run["mark"] for run in expired}
+        return [run for run in index if run["mark"] not in marks], expired
+
+    def tail(self, task_uuid: str, mark: str, size: int = 65536) -> str | None:
+        """获取一次运行输出的最后 size 字节，运行记录不存在时返回 None"""
+        with self.__condition:
+            running = self.__running.get((task_uuid, mark))
+            run = self.__find(self.__index(task_uuid), mark)
+            filename = run["file"] if run is not None else None
+        if running is not None:
+            running.flush()
+        if filename is None:
+            return None
+        path = os.path.join(self.__task_path(task_uuid), filename)
+        if not os.path.exists(path) and filename == mark + LOG_SUFFIX:
+            # 读取索引后后台线程已完成压缩
+            path = os.path.join(self.__task_path(task_uuid), mark + COMPRESSED_SUFFIX)
+        if not os.path.exists(path):
+            return None
+        if path.endswith(".gz"):
+            # 压缩文件只能顺序解压，仅保留末尾部分
+            chunks = deque()
+            kept = 0
+            with gzip.open(path, "rb") as f:
+                while chunk := f.read(65536):
+                    chunks.append(chunk)
+                    kept += len(chunk)
+                    while kept - len(chunks[0]) >= size:
+                        kept -= len(chunks.popleft())
+            data = b"".join(chunks)[-size:]
+        else:
+            with open(path, "rb") as f:
+                f.seek(max(0, os.path.getsize(path) - size))
+                data = f.read()
+        return data.decode("utf-8", errors="replace")
+
+    def close(self):
+        """结束所有运行中的日志(进程已被强制结束，返回值记为 None)，等待后台线程完成压缩与索引写入"""
+        with self.__condition:
+            running = list(self.__running.values())
+        for run_log in running:
+            run_log.close(None)
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+        self.__thread.join()
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+
+from utils.logger import logger
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def task_hash(task: dict) -> str:
+    """计算任务定义的哈希(键顺序无关)"""
+    data = json.dumps(task, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class TaskManifest:
+    """
+    本地任务清单
+
+    在内存中记录调度器中已注册的每个任务的定义哈希，服务端下发任务列表时与之对比，
+    只新增、删除或重新调度有变化的任务，未变化的任务保持原有调度(间隔不重新计时)。
+    调度器不持久化任务，节点重启后清单为空，首次同步时注册全部任务，因此任务哈希不写入文件。
+    每次清单变化版本号加一，版本号保存到 data/tasks/manifest.json，重启后继续递增。
+
+    manifest = {
+        "version": 3  # 清单版本
+    }
+    """
+    __path: str
+    __lock: threading.Lock
+    __version: int = 0
+    __tasks: dict[str: str]
+
+    def __init__(self, path: str):
+        self.__path = os.path.join(path, MANIFEST_FILENAME)
+        self.__lock = threading.Lock()
+        self.__tasks = {}
+        if os.path.exists(self.__path):
+            try:
+                with open(self.__path, "r", encoding="utf-8") as f:
+                    self.__version = json.load(f).get("version", 0)
+            except (OSError, ValueError) as e:
+                logger.error(f"任务清单读取失败: {e}")
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    def __digest(self) -> str:
+        return hashlib.sha256("".join(
+            f"{uuid}:{self.__tasks[uuid]}\n" for uuid in sorted(self.__tasks)
+        ).encode("utf-8")).hexdigest()
+
+    def digest(self) -> str:
+        with self.__lock:
+            return self.__digest()
+
+    def diff(self, task_list: list[dict]) -> tuple[list[dict], list[str], list[dict], int]:
+        """
+        与下发的任务列表对比
+
+        返回 (新增的任务, 删除的任务uuid, 变化的任务, 未变化的任务数)
+        """
+        incoming = {task.get('uuid'): task for task in task_list if task.get('uuid')}
+        with self.__lock:
+            added = [task for uuid, task in incoming.items() if uuid not in self.__tasks]
+            removed = [uuid for uuid in self.__tasks if uuid not in incoming]
+            changed = [
+                task for uuid, task in incoming.items()
+                if uuid in self.__tasks and self.__tasks[uuid] != task_hash(task)
+            ]
+        return added, removed, changed, len(incoming) - len(added) - len(changed)
+
+    def set(self, task: dict):
+        """记录已注册(或重新调度)的任务"""
+        with self.__lock:
+            self.__tasks[task.get('uuid')] = task_hash(task)
+
+    def remove(self, task_uuid: str):
+        with self.__lock:
+            self.__tasks.pop(task_uuid, None)
+
+    def contains(self, task_uuid: str) -> bool:
+        with self.__lock:
+            return task_uuid in self.__tasks
+
+    def save(self):
+        """版本号加一并保存"""
+        with self.__lock:
+            self.__version += 1
+            data = {"version": self.__version}
+        temp_path = self.__path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.__path)
+        except OSError as e:
+            logger.error(f"任务清单保存失败: {e}")
@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import subprocess
+import threading
+import time
+
+from utils.logger import logger
+from utils.processLimits import kill_process
+
+# 同一任务上一次运行尚未结束时的处理策略
+OVERLAP_SKIP = "skip"  # 跳过本次触发
+OVERLAP_QUEUE = "queue"  # 排队，上一次运行结束后再执行(每个任务最多排队一次)
+OVERLAP_KILL = "kill"  # 结束上一次运行后执行
+OVERLAP_POLICIES = (OVERLAP_SKIP, OVERLAP_QUEUE, OVERLAP_KILL)
+
+
+class _PendingRun:
+    """等待执行的一次任务触发"""
+    task_uuid: str
+    args: tuple
+    priority: int
+    submit_time: float
+
+    def __init__(self, task_uuid: str, args: tuple, priority: int):
+        self.task_uuid = task_uuid
+        self.args = args
+        self.priority = priority
+        self.submit_time = time.monotonic()
+
+
+class TaskRunner:
+    """
+    任务执行引擎
+
+    调度器触发任务时不直接创建进程，而是提交到执行引擎：
+    同时运行的任务进程数不超过 max_concurrent，超出的触发按优先级(数值越大越优先，同优先级先到先执行)排队，
+    排队数超过 max_queue 时拒绝新的触发。
+    同一任务的上一次运行尚未结束时按任务的 overlap 策略跳过、排队或结束上一次运行。
+
+    launch(task_uuid, *args) -> (mark, process) | None 创建任务进程，返回 None 表示未启动
+    进程结束后需调用 finish(mark) 释放运行槽位，进程在 launch 返回前结束时也可以先调用 finish。
+    """
+    __launch: callable
+    __max_concurrent: int
+    __max_queue: int
+    __lock: threading.Lock
+    __queue: list[tuple[int, int, _PendingRun]]
+    __counter: itertools.count
+    __running: dict[str: tuple[str, subprocess.Popen]]
+    __task_runs: dict[str: set[str]]
+    __queued_tasks: set[str]
+    __starting: dict[str: int]
+    __finished_early: set[str]
+    __closed: bool = False
+    __started: int = 0
+    __skipped: int = 0
+    __killed: int = 0
+    __rejected: int = 0
+    __max_wait_time: float = 0
+
+    def __init__(self, launch, max_concurrent: int = 4, max_queue: int = 100):
+        self.__launch = launch
+        self.__max_concurrent = max(1, max_concurrent)
+        self.__max_queue = max(0, max_queue)
+        self.__lock = threading.Lock()
+        self.__queue = []
+        self.__counter = itertools.count()
+        self.__running = {}
+        self.__task_runs = {}
+        self.__queued_tasks = set()
+        self.__starting = {}
+        # 启动返回前进程已结束(已调用 finish)的运行标记
+        self.__finished_early = set()
+
+    @classmethod
+    def from_config(cls, launch, runner_config: dict = None):
+        """按配置创建执行引擎"""
+        runner_config = runner_config or {}
+        return cls(launch, runner_config.get('max_concurrent', 4), runner_config.get('max_queue', 100))
+
+    def __active(self) -> int:
+        """运行中与正在启动的进程数"""
+        return len(self.__running) + sum(self.__starting.values())
+
+    def __is_running(self, task_uuid: str) -> bool:
+        return bool(self.__task_runs.get(task_uuid)) or self.__starting.get(task_uuid, 0) > 0
+
+    def submit(self, task_uuid: str, args: tuple = (), priority: int = 0, overlap: str = OVERLAP_SKIP) -> bool:
+        """提交一次任务触发(线程安全)，被跳过或拒绝时返回 False"""
+        to_kill = []
+        pending = _PendingRun(task_uuid, args, priority)
+        with self.__lock:
+            if self.__closed:
+                return False
+            if task_uuid in self.__queued_tasks:
+                # 已有排队中的触发，合并为一次
+                self.__skipped += 1
+                return False
+            running = self.__is_running(task_uuid)
+            if running and overlap not in (OVERLAP_QUEUE, OVERLAP_KILL):
+                self.__skipped += 1
+                logger.debug(f"任务 {task_uuid} 上一次运行尚未结束，跳过本次执行")
+                return False
+            if not running and self.__active() < self.__max_concurrent:
+                self.__starting[task_uuid] = self.__starting.get(task_uuid, 0) + 1
+            else:
+                if len(self.__queue) >= self.__max_queue:
+                    self.__rejected += 1
+                    logger.warning(f"任务排队已满({self.__max_queue})，拒绝执行任务 {task_uuid}")
+                    return False
+                if running and overlap == OVERLAP_KILL:
+                    # 结束上一次运行，进程退出释放槽位后再启动本次运行
+                    to_kill = [self.__running[mark][1] for mark in self.__task_runs.get(task_uuid, ())]
+                    self.__killed += len(to_kill)
+                heapq.heappush(self.__queue, (-priority, next(self.__counter), pending))
+                self.__queued_tasks.add(task_uuid)
+                pending = None
+        for process in to_kill:
+            logger.info(f"任务 {task_uuid} 上一次运行尚未结束，结束进程 {process.pid}")
+            kill_process(process)
+        if pending is not None:
+            self.__start(pending)
+        else:
+            self.__dispatch()
+        return True
+
+    def __start(self, pending: _PendingRun):
+        """启动一次运行(调用前已占用 __starting 槽位)"""
+        result = None
+        released = True
+        try:
+            result = self.__launch(pending.task_uuid, *pending.args)
+        finally:
+            with self.__lock:
+                self.__starting[pending.task_uuid] -= 1
+                if not self.__starting[pending.task_uuid]:
+                    del self.__starting[pending.task_uuid]
+                if result is not None:
+                    mark, process = result
+                    if mark in self.__finished_early:
+                        # 进程在 launch 返回前已结束，不再登记为运行中
+                        self.__finished_early.discard(mark)
+                    else:
+                        self.__running[mark] = (pending.task_uuid, process)
+                        self.__task_runs.setdefault(pending.task_uuid, set()).add(mark)
+                        released = False
+                    self.__started += 1
+                    self.__max_wait_time = max(self.__max_wait_time, time.monotonic() - pending.submit_time)
+                if not self.__starting:
+                    # 没有正在启动的运行时，剩余的标记不属于本执行引擎
+                    self.__finished_early.clear()
+        if released:
+            # 未启动进程或进程已结束，槽位已释放
+            self.__dispatch()
+
+    def finish(self, mark: str):
+        """一次运行结束，释放槽位并启动排队中的任务"""
+        with self.__lock:
+            task_uuid, _ = self.__running.pop(mark, (None, None))
+            if task_uuid is None:
+                if self.__starting:
+                    # 进程交给输出读取线程后可能在 launch 返回前结束，由 __start 处理，
+                    # 启动全部返回后清除未匹配的标记
+                    self.__finished_early.add(mark)
+            else:
+                marks = self.__task_runs.get(task_uuid)
+                marks.discard(mark)
+                if not marks:
+                    del self.__task_runs[task_uuid]
+        self.__dispatch()
+
+    def __dispatch(self):
+        """按优先级启动排队中可以运行的任务"""
+        while True:
+            with self.__lock:
+                if self.__closed or self.__active() >= self.__max_concurrent:
+                    return
+                blocked = []
+                pending = None
+                while self.__queue:
+                    item = heapq.heappop(self.__queue)
+                    if self.__is_running(item[2].task_uuid):
+                        # 同一任务仍在运行(或等待被结束)，保持排队
+                        blocked.append(item)
+                        continue
+                    pending = item[2]
+                    break
+                for item in blocked:
+                    heapq.heappush(self.__queue, item)
+                if pending is None:
+                    return
+                self.__queued_tasks.discard(pending.task_uuid)
+                self.__starting[pending.task_uuid] = self.__starting.get(pending.task_uuid, 0) + 1
+            self.__start(pending)
+
+    def remove(self, task_uuid: str):
+        """删除某个任务所有排队中的触发"""
+        with self.__lock:
+            self.__queue = [item for item in self.__queue if item[2].task_uuid != task_uuid]
+            heapq.heapify(self.__queue)
+            self.__queued_tasks.discard(task_uuid)
+
+    def running(self, task_uuid: str = None) -> list[str]:
+        """获取运行中的进程标记"""
+        with self.__lock:
+            if task_uuid is None:
+                return list(self.__running)
+            return list(self.__task_runs.get(task_uuid, ()))
+
+    def metrics(self) -> dict:
+        """获取执行引擎指标，最大排队时间在读取后重置"""
+        with self.__lock:
+            now = time.monotonic()
+            metrics = {
+                "max_concurrent": self.__max_concurrent,
+                "max_queue": self.__max_queue,
+                "running": len(self.__running),
+                "queued": len(self.__queue),
+                "started": self.__started,
+                "skipped": self.__skipped,
+                "killed": self.__killed,
+                "rejected": self.__rejected,
+                # 毫秒
+                "max_wait_time": round(self.__max_wait_time * 1000, 1),
+                "oldest_wait_time": round(max((now - item[2].submit_time for item in self.__queue), default=0) * 1000, 1),
+            }
+            self.__max_wait_time = 0
+        return metrics
+
+    def close(self):
+        """停止执行引擎，清空排队中的触发(运行中的进程由调用方结束)"""
+        with self.__lock:
+            self.__closed = True
+            self.__queue.clear()
+            self.__queued_tasks.clear()
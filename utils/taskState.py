@@ -0,0 +1,311 @@
+import math
+import threading
+import time
+
+from peewee import fn
+
+from utils.logger import logger
+from utils.model import database, Task, TaskRun
+
+# 运行状态
+RUN_RUNNING = "running"
+RUN_SUCCESS = "success"
+RUN_FAILED = "failed"
+RUN_KILLED = "killed"
+RUN_INTERRUPTED = "interrupted"
+
+
+class TaskState:
+    """内存中的任务状态(对应 Task 表的一行)"""
+    uuid: str
+    name: str
+    count: int
+    max_count: int
+
+    def __init__(self, uuid: str, name: str, count: int = 0, max_count: int = 0):
+        self.uuid = uuid
+        self.name = name
+        self.count = count
+        self.max_count = max_count or 0
+
+    def reached_limit(self) -> bool:
+        """是否已达到最大执行次数"""
+        return bool(self.max_count) and self.count >= self.max_count
+
+
+class TaskStateCache:
+    """
+    任务状态缓存
+
+    init_task_list 时一次性读取 Task 表，之后判断执行次数与累加计数都只访问内存。
+    新建任务、任务与计数变化、运行记录(TaskRun)由单独的写入线程每 flush_interval 秒在一个事务中批量写入数据库，
+    同一任务多次累加只写入最终值；关闭时写入剩余的变化。
+    进程异常退出时最多丢失最近 flush_interval 秒内的计数。
+    运行记录保留 history_days 天，载入时清理更早的记录，并将上次未结束的运行标记为 interrupted。
+    """
+    # 积压的计数变化超过该数量时立即写入
+    MAX_PENDING = 100
+
+    __tasks: dict[str: TaskState]
+    __created: dict[str: TaskState]
+    __dirty: set[str]
+    __runs: dict[str: dict]
+    __write_lock: threading.Lock
+    __lock: threading.Lock
+    __wakeup: threading.Event
+    __thread: threading.Thread | None = None
+    __running: bool = False
+    __flush_interval: float
+    __history_days: float
+
+    def __init__(self, flush_interval: float = 5, history_days: float = 90):
+        self.__tasks = {}
+        self.__created = {}
+        self.__dirty = set()
+        self.__runs = {}
+        self.__lock = threading.Lock()
+        self.__write_lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__flush_interval = flush_interval
+        self.__history_days = history_days
+
+    @classmethod
+    def from_config(cls, task_state_config: dict = None):
+        task_state_config = task_state_config or {}
+        return cls(task_state_config.get('flush_interval', 5), task_state_config.get('history_days', 90))
+
+    def load(self):
+        """从数据库读取所有任务并启动写入线程"""
+        tasks = {
+            row.uuid: TaskState(row.uuid, row.name, row.count, row.max_count)
+            for row in Task.select()
+        }
+        with self.__write_lock, database.atomic():
+            TaskRun.update(status=RUN_INTERRUPTED).where(TaskRun.status == RUN_RUNNING).execute()
+            if self.__history_days:
+                expired = TaskRun.delete().where(TaskRun.start_time < time.time() - self.__history_days * 86400)
+                expired.execute()
+        with self.__lock:
+            self.__tasks = tasks
+        logger.debug(f"已载入 {len(tasks)} 个任务状态")
+        if not self.__running:
+            self.__running = True
+            self.__thread = threading.Thread(target=self.__run, name="TaskStateWriter", daemon=True)
+            self.__thread.start()
+
+    def get(self, uuid: str) -> TaskState | None:
+        with self.__lock:
+            return self.__tasks.get(uuid)
+
+    def ensure(self, uuid: str, name: str, max_count: int = 0) -> TaskState:
+        """获取任务状态，不存在时创建(已存在的任务保留原有的名称与执行次数)"""
+        with self.__lock:
+            state = self.__tasks.get(uuid)
+            if state is None:
+                state = self.__tasks[uuid] = TaskState(uuid, name, 0, max_count)
+                self.__created[uuid] = state
+        return state
+
+    def update(self, uuid: str, name: str, max_count: int = 0) -> TaskState:
+        """更新任务的名称与最大执行次数(任务定义变化时)，保留已执行次数"""
+        with self.__lock:
+            state = self.__tasks.get(uuid)
+            if state is None:
+                state = self.__tasks[uuid] = TaskState(uuid, name, 0, max_count)
+                self.__created[uuid] = state
+            else:
+                state.name = name
+                state.max_count = max_count or 0
+                if uuid not in self.__created:
+                    self.__dirty.add(uuid)
+        return state
+
+    def increment(self, uuid: str) -> int:
+        """执行次数加一，返回新的执行次数"""
+        with self.__lock:
+            state = self.__tasks[uuid]
+            state.count += 1
+            if uuid not in self.__created:
+                self.__dirty.add(uuid)
+            count = state.count
+            pending = len(self.__dirty)
+        if pending >= self.MAX_PENDING:
+            self.__wakeup.set()
+        return count
+
+    def start_run(self, task_uuid: str, mark: str, start_time: float, record_file: str, record_offset: int):
+        """记录一次运行开始"""
+        with self.__lock:
+            self.__runs[mark] = {
+                'mark': mark,
+                'task_uuid': task_uuid,
+                'status': RUN_RUNNING,
+                'start_time': start_time,
+                'end_time': None,
+                'code': None,
+                'duration': None,
+                'output_bytes': 0,
+                'cpu_time': None,
+                'max_rss': None,
+                'limit_exceeded': None,
+                'record_file': record_file,
+                'record_offset': record_offset,
+            }
+
+    def finish_run(self, mark: str, code: int | None, usage: dict, record_file: str = None):
+        """记录一次运行结束，usage 为 ProcessMonitor.usage() 的结果"""
+        if usage.get('limit_exceeded') or (code is not None and code < 0):
+            status = RUN_KILLED
+        elif code == 0:
+            status = RUN_SUCCESS
+        else:
+            status = RUN_FAILED
+        cpu_time = None
+        if 'cpu_user' in usage:
+            cpu_time = round(usage['cpu_user'] + usage['cpu_system'], 3)
+        with self.__lock:
+            run = self.__runs.get(mark)
+            if run is None:
+                # 开始记录已写入数据库
+                run = self.__runs[mark] = {'mark': mark}
+            run.update({
+                'status': status,
+                'end_time': time.time(),
+                'code': code,
+                'duration': usage.get('duration'),
+                'output_bytes': usage.get('output_bytes', 0),
+                'cpu_time': cpu_time,
+                'max_rss': usage.get('max_rss'),
+                'limit_exceeded': usage.get('limit_exceeded'),
+            })
+            if record_file is not None:
+                run['record_file'] = record_file
+
+    def __run(self):
+        while self.__running:
+            self.__wakeup.wait(self.__flush_interval)
+            self.__wakeup.clear()
+            self.__write()
+        self.__write()
+        # 关闭写入线程的数据库连接
+        if not database.is_closed():
+            database.close()
+
+    def __write(self):
+        """将新建的任务与计数变化在一个事务中写入数据库(仅由写入线程调用)"""
+        with self.__write_lock:
+            with self.__lock:
+                if not self.__created and not self.__dirty and not self.__runs:
+                    return
+                created = [
+                    {'uuid': state.uuid, 'name': state.name, 'count': state.count, 'max_count': state.max_count}
+                    for state in self.__created.values()
+                ]
+                updates = []
+                for uuid in self.__dirty:
+                    state = self.__tasks.get(uuid)
+                    if state is not None:
+                        updates.append((uuid, {'name': state.name, 'count': state.count, 'max_count': state.max_count}))
+                runs = self.__runs
+                self.__created.clear()
+                self.__dirty.clear()
+                self.__runs = {}
+            try:
+                with database.atomic():
+                    if created:
+                        Task.insert_many(created).on_conflict_ignore().execute()
+                    for uuid, fields in updates:
+                        Task.update(fields).where(Task.uuid == uuid).execute()
+                    for run in runs.values():
+                        if 'task_uuid' in run:
+                            TaskRun.insert(run).on_conflict_replace().execute()
+                        else:
+                            TaskRun.update({key: value for key, value in run.items() if key != 'mark'}) \
+                                .where(TaskRun.mark == run['mark']).execute()
+            except Exception as e:
+                logger.error(f"任务状态写入失败: {e}")
+                # 下一次重新写入
+                with self.__lock:
+                    for row in created:
+                        state = self.__tasks.get(row['uuid'])
+                        if state is not None:
+                            self.__created.setdefault(row['uuid'], state)
+                    self.__dirty.update(uuid for uuid, _ in updates)
+                    for mark, run in runs.items():
+                        if mark in self.__runs:
+                            run.update(self.__runs[mark])
+                        self.__runs[mark] = run
+
+    def flush(self):
+        """立即写入积压的变化(查询前调用，与写入线程互斥)"""
+        self.__write()
+
+    def query_runs(self, task_uuid: str, limit: int = 50, status: str = None) -> list[dict]:
+        """查询任务最近的运行记录(新的在前)"""
+        self.flush()
+        query = TaskRun.select().where(TaskRun.task_uuid == task_uuid)
+        if status:
+            query = query.where(TaskRun.status == status)
+        query = query.order_by(TaskRun.start_time.desc()).limit(limit)
+        return list(query.dicts())
+
+    def run_stats(self, task_uuid: str, start: float = None, end: float = None) -> dict:
+        """
+        统计任务在时间范围内已结束的运行
+
+        stats = {
+            'total': 10,  # 已结束的运行数
+            'success': 8,
+            'failed': 1,
+            'killed': 1,
+            'interrupted': 0,
+            'failure_rate': 0.2,  # (failed + killed) / total
+            'avg_duration': 1.5,  # 秒
+            'p95_duration': 3.2,
+            'max_duration': 4.0,
+            'avg_output_bytes': 1024,
+            'last_run': 10000  # 最近一次运行的开始时间
+        }
+        """
+        self.flush()
+        conditions = [TaskRun.task_uuid == task_uuid, TaskRun.status != RUN_RUNNING]
+        if start is not None:
+            conditions.append(TaskRun.start_time >= start)
+        if end is not None:
+            conditions.append(TaskRun.start_time <= end)
+        stats = {'total': 0, RUN_SUCCESS: 0, RUN_FAILED: 0, RUN_KILLED: 0, RUN_INTERRUPTED: 0}
+        for row in TaskRun.select(TaskRun.status, fn.COUNT(TaskRun.mark).alias('count')) \
+                .where(*conditions).group_by(TaskRun.status).dicts():
+            stats[row['status']] = row['count']
+            stats['total'] += row['count']
+        summary = TaskRun.select(
+            fn.AVG(TaskRun.duration).alias('avg_duration'),
+            fn.MAX(TaskRun.duration).alias('max_duration'),
+            fn.AVG(TaskRun.output_bytes).alias('avg_output_bytes'),
+            fn.MAX(TaskRun.start_time).alias('last_run'),
+            fn.COUNT(TaskRun.duration).alias('timed'),
+        ).where(*conditions).dicts().get()
+        p95_duration = None
+        if summary['timed']:
+            # 最近秩法，与占用汇总的 p95 计算方式一致
+            offset = max(0, math.ceil(0.95 * summary['timed']) - 1)
+            p95_duration = TaskRun.select(TaskRun.duration) \
+                .where(*conditions, TaskRun.duration.is_null(False)) \
+                .order_by(TaskRun.duration).offset(offset).limit(1).scalar()
+        stats.update({
+            'failure_rate': round((stats[RUN_FAILED] + stats[RUN_KILLED]) / stats['total'], 4) if stats['total'] else 0,
+            'avg_duration': round(summary['avg_duration'], 3) if summary['avg_duration'] is not None else None,
+            'p95_duration': p95_duration,
+            'max_duration': summary['max_duration'],
+            'avg_output_bytes': round(summary['avg_output_bytes']) if summary['avg_output_bytes'] is not None else None,
+            'last_run': summary['last_run'],
+        })
+        return stats
+
+    def close(self):
+        """停止写入线程并写入剩余的变化"""
+        if not self.__running:
+            return
+        self.__running = False
+        self.__wakeup.set()
+        self.__thread.join(timeout=10)
@@ -1,22 +1,231 @@
+import hashlib
+import hmac
+import os
+import time
+from threading import Lock, Timer
+
 import paramiko
 
+from utils.logger import logger
+
+
+class _PooledTransport:
+    """连接池中的一个已认证 SSH 连接"""
+    client: paramiko.SSHClient
+    target: tuple[str, int, str]
+    password_digest: bytes
+    channels: set
+    pending: int
+    exhausted: bool
+    idle_since: float | None
+
+    def __init__(self, client: paramiko.SSHClient, target: tuple[str, int, str], password_digest: bytes):
+        self.client = client
+        self.target = target
+        self.password_digest = password_digest
+        self.channels = set()
+        # 正在打开的通道数
+        self.pending = 0
+        # 服务端拒绝打开更多通道(如超出 MaxSessions)后不再复用
+        self.exhausted = False
+        self.idle_since = None
+
+    def is_active(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+
+class SSHTransportPool:
+    """
+    SSH 连接池
+
+    按 (host, port, username) 复用已认证的 SSH 连接，在已有连接上通过 invoke_shell 打开新的终端通道，
+    避免每个终端都重新进行 TCP 握手、密钥交换和密码认证。
+    仅当密码与建立连接时一致才会复用，空闲超时的连接会被关闭。
+    """
+    # 单个连接上的最大通道数(OpenSSH MaxSessions 默认为 10)
+    MAX_CHANNELS_PER_TRANSPORT = 8
+    # 单个目标的最大连接数
+    MAX_TRANSPORTS_PER_TARGET = 4
+    # 连接空闲多久后关闭(秒)
+    IDLE_TIMEOUT = 300
+
+    __transports: dict[tuple: list[_PooledTransport]]
+    __connecting: dict[tuple: int]
+    __channel_owner: dict[int: _PooledTransport]
+    __lock: Lock
+    __secret: bytes
+
+    def __init__(self):
+        self.__transports = {}
+        # 正在建立的连接数，计入单个目标的连接数上限
+        self.__connecting = {}
+        self.__channel_owner = {}
+        self.__lock = Lock()
+        # 仅用于在内存中比较密码是否一致，不保存明文密码
+        self.__secret = os.urandom(32)
+
+    def __digest(self, password) -> bytes:
+        return hmac.new(self.__secret, str(password).encode('utf-8'), hashlib.sha256).digest()
+
+    def acquire(self, hostname, port, username, password):
+        """获取一个终端通道"""
+        target = (hostname, int(port), username)
+        digest = self.__digest(password)
+        while True:
+            inactive = []
+            with self.__lock:
+                pooled = self.__find_transport(target, digest, inactive)
+                if pooled is None:
+                    connections = len(self.__transports.get(target, [])) + self.__connecting.get(target, 0)
+                    if connections >= self.MAX_TRANSPORTS_PER_TARGET:
+                        full = True
+                    else:
+                        # 先占位，避免并发新建连接时超出连接数上限
+                        full = False
+                        self.__connecting[target] = self.__connecting.get(target, 0) + 1
+                else:
+                    # 先占位，避免并发获取时超出通道上限
+                    pooled.idle_since = None
+                    pooled.pending += 1
+            for item in inactive:
+                item.client.close()
+            if pooled is None:
+                if full:
+                    raise RuntimeError(f"{username}@{hostname}:{port} 的终端连接数已达上限")
+                break
+            try:
+                channel = pooled.client.invoke_shell()
+            except Exception as err:
+                logger.debug(f"复用SSH连接打开终端失败: {err}")
+                with self.__lock:
+                    pooled.pending -= 1
+                    pooled.exhausted = True
+                    in_use = bool(pooled.channels)
+                if not in_use:
+                    self.__drop(pooled)
+                continue
+            with self.__lock:
+                pooled.pending -= 1
+                pooled.channels.add(channel)
+                self.__channel_owner[id(channel)] = pooled
+            logger.debug(f"复用SSH连接: {username}@{hostname}:{port}")
+            return channel
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            client.connect(hostname, port, username, password)
+            channel = client.invoke_shell()
+        except Exception:
+            client.close()
+            with self.__lock:
+                self.__release_connecting(target)
+            raise
+        pooled = _PooledTransport(client, target, digest)
+        pooled.channels.add(channel)
+        with self.__lock:
+            self.__release_connecting(target)
+            self.__transports.setdefault(target, []).append(pooled)
+            self.__channel_owner[id(channel)] = pooled
+        logger.debug(f"新建SSH连接: {username}@{hostname}:{port}")
+        return channel
+
+    def __release_connecting(self, target):
+        """释放新建连接的占位(需持有锁)"""
+        self.__connecting[target] -= 1
+        if not self.__connecting[target]:
+            del self.__connecting[target]
+
+    def __find_transport(self, target, digest, inactive: list) -> _PooledTransport | None:
+        """查找可复用的连接(需持有锁)，已断开的连接移出连接池并放入 inactive，由调用方在锁外关闭"""
+        for pooled in list(self.__transports.get(target, [])):
+            if not pooled.is_active():
+                self.__remove(pooled)
+                inactive.append(pooled)
+                continue
+            if pooled.exhausted or not hmac.compare_digest(pooled.password_digest, digest):
+                continue
+            if len(pooled.channels) + pooled.pending < self.MAX_CHANNELS_PER_TRANSPORT:
+                return pooled
+        return None
+
+    def release(self, channel):
+        """关闭终端通道并将连接归还连接池"""
+        try:
+            channel.close()
+        except Exception:
+            pass
+        with self.__lock:
+            pooled = self.__channel_owner.pop(id(channel), None)
+            if pooled is None:
+                return
+            pooled.channels.discard(channel)
+            if pooled.channels or pooled.pending:
+                return
+            pooled.idle_since = time.monotonic()
+        timer = Timer(self.IDLE_TIMEOUT, self.evict_idle)
+        timer.daemon = True
+        timer.start()
+
+    def evict_idle(self):
+        """关闭空闲超时的连接"""
+        now = time.monotonic()
+        with self.__lock:
+            expired = [
+                pooled
+                for transports in self.__transports.values()
+                for pooled in transports
+                if pooled.idle_since is not None and now - pooled.idle_since >= self.IDLE_TIMEOUT
+            ]
+            for pooled in expired:
+                self.__remove(pooled)
+        for pooled in expired:
+            logger.debug(f"关闭空闲SSH连接: {pooled.target[2]}@{pooled.target[0]}:{pooled.target[1]}")
+            pooled.client.close()
+
+    def __drop(self, pooled: _PooledTransport):
+        with self.__lock:
+            self.__remove(pooled)
+        pooled.client.close()
+
+    def __remove(self, pooled: _PooledTransport):
+        """从连接池移除连接(需持有锁)"""
+        transports = self.__transports.get(pooled.target, [])
+        if pooled in transports:
+            transports.remove(pooled)
+        if not transports:
+            self.__transports.pop(pooled.target, None)
+        for channel in pooled.channels:
+            self.__channel_owner.pop(id(channel), None)
+
+    def close(self):
+        """关闭全部连接"""
+        with self.__lock:
+            transports = [pooled for items in self.__transports.values() for pooled in items]
+            self.__transports.clear()
+            self.__channel_owner.clear()
+        for pooled in transports:
+            pooled.client.close()
+
+
+transport_pool = SSHTransportPool()
+
 
 class Terminal():
     def __init__(self):
         self.channel = None
-        self.client= paramiko.SSHClient()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
     def start(self, hostname, port, username, password):
         try:
-            # 连接到服务器
-            self.client.connect(hostname, port, username, password)
-            # 打开一个伪终端
-            self.channel = self.client.invoke_shell()
+            # 从连接池获取一个伪终端
+            self.channel = transport_pool.acquire(hostname, port, username, password)
             return self.channel
-        except:
+        except Exception as err:
+            logger.debug(f"打开终端失败: {err}")
             return False
 
-
     def terminal_close(self):
-        self.client.close()
+        if self.channel is not None:
+            transport_pool.release(self.channel)
+            self.channel = None
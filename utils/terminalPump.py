@@ -0,0 +1,279 @@
+import os
+import selectors
+import sys
+import time
+from threading import Thread, Lock, current_thread
+
+from utils.logger import logger
+
+
+class _PumpSession:
+    """一个终端会话的读取状态"""
+    session_id: str
+    channel: any
+    on_output: callable
+    on_close: callable
+    buffer: bytearray
+    deadline: float | None
+    thread: Thread | None
+    closed: bool
+    finished: bool
+
+    def __init__(self, session_id: str, channel, on_output, on_close):
+        self.session_id = session_id
+        self.channel = channel
+        self.on_output = on_output
+        self.on_close = on_close
+        self.buffer = bytearray()
+        self.deadline = None
+        # 读取该会话的线程(Windows 下为轮询线程)
+        self.thread = None
+        # 已注销，读取线程不再读取
+        self.closed = False
+        # 已发送剩余输出并调用 on_close
+        self.finished = False
+
+
+class TerminalPump:
+    """
+    终端输出泵
+
+    所有终端会话共用一个线程，通过 select 阻塞等待 paramiko 通道可读，空闲会话不产生任何唤醒。
+    突发输出时一次读空通道缓冲区，并在很短的延迟内将多次读取合并为一帧发送。
+
+    on_output(data: bytes) -> 合并后的一帧终端输出
+    on_close() -> 会话结束(远端关闭或被注销)，仅调用一次
+    会话的缓冲区只由读取线程访问，在其他线程注销时由读取线程发送剩余输出并调用 on_close，
+    on_output 与 on_close 总是在同一线程中依次调用。
+    关闭后线程退出时关闭 selector 与唤醒管道。
+    """
+    # 单次读取的最大字节数
+    READ_SIZE = 32768
+    # 单帧最大字节数，超出后立即发送
+    MAX_FRAME_SIZE = 65536
+    # 合并输出的最大延迟(秒)
+    FRAME_LATENCY = 0.005
+    # Windows 下无数据时的轮询间隔(秒)
+    POLL_INTERVAL = 0.02
+
+    __sessions: dict[str: _PumpSession]
+    __closing: list[_PumpSession]
+    __lock: Lock
+    __selector: selectors.BaseSelector | None = None
+    __thread: Thread | None = None
+    __running: bool = False
+    __closed: bool = False
+    __wakeup_r: int = -1
+    __wakeup_w: int = -1
+
+    def __init__(self, name: str = "TerminalPump"):
+        self.__name = name
+        self.__sessions = {}
+        # 已在其他线程注销、等待读取线程结束的会话
+        self.__closing = []
+        self.__lock = Lock()
+        if sys.platform != 'win32':
+            self.__selector = selectors.DefaultSelector()
+            self.__wakeup_r, self.__wakeup_w = os.pipe()
+            os.set_blocking(self.__wakeup_r, False)
+            os.set_blocking(self.__wakeup_w, False)
+            self.__selector.register(self.__wakeup_r, selectors.EVENT_READ, None)
+
+    def register(self, session_id: str, channel, on_output, on_close=None):
+        """注册一个终端会话"""
+        session = _PumpSession(session_id, channel, on_output, on_close)
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError(f"{self.__name}: 终端输出泵已关闭")
+            self.__sessions[session_id] = session
+            if sys.platform == 'win32':
+                # winpty 不提供可 select 的文件描述符，退化为每个会话一个轮询线程
+                session.thread = Thread(target=self.__poll_session, args=(session,), daemon=True)
+                session.thread.start()
+                return
+            self.__selector.register(channel.fileno(), selectors.EVENT_READ, session)
+            if not self.__running:
+                self.__running = True
+                self.__thread = Thread(target=self.__run, name=self.__name, daemon=True)
+                self.__thread.start()
+            session.thread = self.__thread
+        self.__wakeup()
+
+    def unregister(self, session_id: str):
+        """
+        注销一个终端会话，发送剩余输出
+
+        在读取线程中调用时立即结束会话，否则交由读取线程发送剩余输出并调用 on_close。
+        """
+        with self.__lock:
+            session = self.__sessions.pop(session_id, None)
+            if session is None:
+                return
+            session.closed = True
+            if sys.platform != 'win32':
+                try:
+                    self.__selector.unregister(session.channel.fileno())
+                except (KeyError, ValueError, OSError):
+                    pass
+            owner = session.thread
+            handoff = owner is not None and owner is not current_thread() and owner.is_alive()
+            if handoff and sys.platform != 'win32':
+                self.__closing.append(session)
+        if not handoff:
+            self.__close_session(session)
+        elif sys.platform != 'win32':
+            self.__wakeup()
+
+    def __wakeup(self):
+        """唤醒阻塞在 select 上的线程"""
+        if sys.platform == 'win32':
+            return
+        with self.__lock:
+            # 唤醒管道关闭后文件描述符可能被复用，不能再写入
+            if self.__wakeup_w < 0:
+                return
+            try:
+                os.write(self.__wakeup_w, b"\0")
+            except (BlockingIOError, OSError):
+                pass
+
+    def __run(self):
+        logger.debug(f"{self.__name}: 终端输出泵已启动")
+        try:
+            self.__loop()
+        finally:
+            self.__close_pending()
+            self.__release()
+        logger.debug(f"{self.__name}: 终端输出泵已停止")
+
+    def __loop(self):
+        while self.__running:
+            with self.__lock:
+                deadlines = [s.deadline for s in self.__sessions.values() if s.deadline is not None]
+            # 没有待发送的输出时无限期阻塞
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                events = self.__selector.select(timeout)
+            except OSError as err:
+                logger.error(f"{self.__name}: select error: {err}")
+                continue
+            for key, _ in events:
+                session: _PumpSession = key.data
+                if session is None:
+                    try:
+                        while os.read(self.__wakeup_r, 4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                self.__read_session(session)
+            now = time.monotonic()
+            with self.__lock:
+                due = [s for s in self.__sessions.values() if s.deadline is not None and s.deadline <= now]
+            for session in due:
+                self.__flush(session)
+            self.__close_pending()
+
+    def __close_pending(self):
+        """结束在其他线程注销的会话(仅由读取线程调用)"""
+        with self.__lock:
+            closing = self.__closing
+            self.__closing = []
+        for session in closing:
+            self.__close_session(session)
+
+    def __read_session(self, session: _PumpSession):
+        """读空通道缓冲区"""
+        channel = session.channel
+        closed = False
+        try:
+            while channel.recv_ready():
+                data = channel.recv(self.READ_SIZE)
+                if not data:
+                    closed = True
+                    break
+                session.buffer += data
+                if len(session.buffer) >= self.MAX_FRAME_SIZE:
+                    self.__flush(session)
+            if not closed and (channel.closed or channel.eof_received) and not channel.recv_ready():
+                closed = True
+        except Exception as err:
+            logger.error(f"[Session: {session.session_id}] Get terminal output error! {err}")
+            closed = True
+        if closed:
+            logger.debug(f"[Session: {session.session_id}] 远端已关闭终端")
+            self.unregister(session.session_id)
+            return
+        if session.buffer and session.deadline is None:
+            session.deadline = time.monotonic() + self.FRAME_LATENCY
+
+    def __flush(self, session: _PumpSession):
+        """发送积压的输出"""
+        session.deadline = None
+        if not session.buffer:
+            return
+        data = bytes(session.buffer)
+        session.buffer.clear()
+        try:
+            session.on_output(data)
+        except Exception as err:
+            logger.error(f"[Session: {session.session_id}] Send terminal output error! {err}")
+
+    def __close_session(self, session: _PumpSession):
+        with self.__lock:
+            if session.finished:
+                return
+            session.finished = True
+        self.__flush(session)
+        if session.on_close is None:
+            return
+        try:
+            session.on_close()
+        except Exception as err:
+            logger.error(f"[Session: {session.session_id}] Close terminal session error! {err}")
+
+    def __poll_session(self, session: _PumpSession):
+        """轮询读取终端输出(Windows)"""
+        while not session.closed:
+            try:
+                output = session.channel.read()
+            except Exception as err:
+                logger.error(f"[Session: {session.session_id}] Get terminal output error! {err}")
+                self.unregister(session.session_id)
+                break
+            if output:
+                session.buffer += output.encode('utf-8')
+                self.__flush(session)
+            else:
+                time.sleep(self.POLL_INTERVAL)
+        # 在其他线程注销时由本线程结束会话
+        self.__close_session(session)
+
+    def __release(self):
+        """关闭 selector 与唤醒管道(线程退出后调用)"""
+        with self.__lock:
+            if self.__selector is not None:
+                self.__selector.close()
+                self.__selector = None
+            if self.__wakeup_r >= 0:
+                os.close(self.__wakeup_r)
+                os.close(self.__wakeup_w)
+                self.__wakeup_r = self.__wakeup_w = -1
+
+    def close(self):
+        """注销全部会话，停止线程并释放文件描述符(在会话回调中调用时不等待线程)"""
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+        for session_id in list(self.__sessions.keys()):
+            self.unregister(session_id)
+        with self.__lock:
+            self.__running = False
+            thread = self.__thread
+        if thread is None:
+            self.__release()
+            return
+        self.__wakeup()
+        if thread is not current_thread():
+            thread.join()
@@ -0,0 +1,235 @@
+"""
+终端录像
+
+录像文件(<session_uuid>.rec):
+| 文件头 | 块 | 块 | ... |
+文件头: magic(4s) 版本(B) 压缩方式(B) 开始时间戳(d)
+块头: 压缩后长度(I) 原始长度(I) 块内第一段输出的时间偏移(d) 块内最后一段输出的时间偏移(d)
+块体(压缩前): 由多段输出组成，每段为 时间偏移毫秒(I) 长度(I) 数据
+
+索引文件(<session_uuid>.idx)为稀疏的 时间→文件偏移 表，每个块一项:
+块内第一段输出的时间偏移(d) 块在录像文件中的偏移(Q)
+
+回放时通过索引二分查找即可直接定位到任意时刻所在的块，无需读取整个文件。
+"""
+import bisect
+import gzip
+import os
+import struct
+import time
+from threading import Lock, Timer
+
+from utils.logger import logger
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+MAGIC = b"SMTR"
+VERSION = 1
+
+COMPRESSION_NONE = 0
+COMPRESSION_GZIP = 1
+COMPRESSION_ZSTD = 2
+COMPRESSION_NAMES = {
+    "none": COMPRESSION_NONE,
+    "gzip": COMPRESSION_GZIP,
+    "zstd": COMPRESSION_ZSTD,
+}
+
+RECORD_SUFFIX = ".rec"
+INDEX_SUFFIX = ".idx"
+
+_HEADER = struct.Struct("<4sBBd")
+_BLOCK_HEADER = struct.Struct("<IIdd")
+_CHUNK_HEADER = struct.Struct("<II")
+_INDEX_ENTRY = struct.Struct("<dQ")
+
+
+def _compress(compression: int, data: bytes) -> bytes:
+    if compression == COMPRESSION_GZIP:
+        return gzip.compress(data, compresslevel=6)
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def _decompress(compression: int, data: bytes) -> bytes:
+    if compression == COMPRESSION_GZIP:
+        return gzip.decompress(data)
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("录像使用 zstd 压缩，请先安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+class TerminalRecordWriter:
+    """
+    终端录像写入器
+
+    块中最早的输出写入 FLUSH_INTERVAL 秒后由定时器写入文件，会话空闲时录像同样最多延迟 FLUSH_INTERVAL 秒落盘。
+    """
+    # 块原始大小达到该值后写入文件
+    BLOCK_SIZE = 65536
+    # 块中最早的输出超过该时间(秒)后写入文件
+    FLUSH_INTERVAL = 5
+
+    __lock: Lock
+    __timer: Timer | None = None
+    __closed: bool = False
+
+    def __init__(self, path: str, compression: str = "gzip"):
+        """
+        :param path: 录像文件路径(不含后缀)
+        :param compression: 压缩方式 none / gzip / zstd
+        """
+        self.__compression = COMPRESSION_NAMES.get(compression, COMPRESSION_GZIP)
+        if self.__compression == COMPRESSION_ZSTD and zstandard is None:
+            logger.warning("未安装 zstandard，终端录像改用 gzip 压缩")
+            self.__compression = COMPRESSION_GZIP
+        self.__start_time = time.time()
+        self.__start_monotonic = time.monotonic()
+        self.__fd = open(path + RECORD_SUFFIX, "wb")
+        self.__index_fd = open(path + INDEX_SUFFIX, "wb")
+        self.__fd.write(_HEADER.pack(MAGIC, VERSION, self.__compression, self.__start_time))
+        self.__block = bytearray()
+        self.__block_first = 0.0
+        self.__block_last = 0.0
+        self.__lock = Lock()
+
+    def write(self, data: bytes):
+        """写入一段终端输出"""
+        if not data:
+            return
+        with self.__lock:
+            if self.__closed:
+                return
+            offset = time.monotonic() - self.__start_monotonic
+            if not self.__block:
+                self.__block_first = offset
+                self.__timer = Timer(self.FLUSH_INTERVAL, self.flush)
+                self.__timer.daemon = True
+                self.__timer.start()
+            self.__block_last = offset
+            self.__block += _CHUNK_HEADER.pack(int(offset * 1000), len(data))
+            self.__block += data
+            if len(self.__block) >= self.BLOCK_SIZE:
+                self.__flush()
+
+    def flush(self):
+        """将当前块写入文件"""
+        with self.__lock:
+            if not self.__closed:
+                self.__flush()
+
+    def __flush(self):
+        """需持有锁"""
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        if not self.__block:
+            return
+        raw = bytes(self.__block)
+        self.__block.clear()
+        body = _compress(self.__compression, raw)
+        position = self.__fd.tell()
+        self.__fd.write(_BLOCK_HEADER.pack(len(body), len(raw), self.__block_first, self.__block_last))
+        self.__fd.write(body)
+        self.__fd.flush()
+        self.__index_fd.write(_INDEX_ENTRY.pack(self.__block_first, position))
+        self.__index_fd.flush()
+
+    def close(self):
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__flush()
+            self.__closed = True
+        self.__fd.close()
+        self.__index_fd.close()
+
+
+class TerminalRecordReader:
+    """终端录像读取器"""
+    start_time: float
+    duration: float
+
+    def __init__(self, path: str):
+        """
+        :param path: 录像文件路径(不含后缀)
+        """
+        self.__fd = open(path + RECORD_SUFFIX, "rb")
+        magic, version, self.__compression, self.start_time = _HEADER.unpack(self.__fd.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("不是有效的终端录像文件")
+        if version > VERSION:
+            raise ValueError(f"不支持的终端录像版本: {version}")
+        self.__times, self.__offsets = self.__load_index(path + INDEX_SUFFIX)
+        self.duration = self.__read_duration()
+
+    def __load_index(self, index_path: str) -> tuple[list[float], list[int]]:
+        """读取索引，索引文件缺失或损坏时扫描块头重建"""
+        times, offsets = [], []
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as fd:
+                data = fd.read()
+            for first, position in _INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % _INDEX_ENTRY.size]):
+                times.append(first)
+                offsets.append(position)
+            return times, offsets
+        position = _HEADER.size
+        self.__fd.seek(position)
+        while True:
+            header = self.__fd.read(_BLOCK_HEADER.size)
+            if len(header) < _BLOCK_HEADER.size:
+                break
+            length, _, first, _ = _BLOCK_HEADER.unpack(header)
+            times.append(first)
+            offsets.append(position)
+            position += _BLOCK_HEADER.size + length
+            self.__fd.seek(position)
+        return times, offsets
+
+    def __read_duration(self) -> float:
+        if not self.__offsets:
+            return 0.0
+        self.__fd.seek(self.__offsets[-1])
+        header = self.__fd.read(_BLOCK_HEADER.size)
+        if len(header) < _BLOCK_HEADER.size:
+            return self.__times[-1]
+        return _BLOCK_HEADER.unpack(header)[3]
+
+    def chunks(self, start: float = 0.0):
+        """
+        从指定时刻开始依次读取输出
+        :param start: 开始时间(相对录像开始的秒数)
+        :return: (时间偏移秒数, 数据) 生成器
+        """
+        index = max(0, bisect.bisect_right(self.__times, start) - 1)
+        if index >= len(self.__offsets):
+            return
+        self.__fd.seek(self.__offsets[index])
+        while True:
+            header = self.__fd.read(_BLOCK_HEADER.size)
+            if len(header) < _BLOCK_HEADER.size:
+                return
+            length, raw_length, _, last = _BLOCK_HEADER.unpack(header)
+            body = self.__fd.read(length)
+            if len(body) < length:
+                return
+            if last < start:
+                continue
+            raw = _decompress(self.__compression, body)
+            position = 0
+            while position < raw_length:
+                offset_ms, size = _CHUNK_HEADER.unpack_from(raw, position)
+                position += _CHUNK_HEADER.size
+                data = raw[position:position + size]
+                position += size
+                if offset_ms / 1000 >= start:
+                    yield offset_ms / 1000, data
+
+    def close(self):
+        self.__fd.close()
@@ -1,12 +1,14 @@
-import asyncio
+import codecs
 import os
 import sys
 import uuid
 import locale
-from time import sleep
 
 import utils.websocket as WebSocket
-from threading import Thread
+from utils.binaryProtocol import pack_session_frame, FRAME_TERMINAL_OUTPUT
+from utils.config import config
+from utils.terminalRecord import TerminalRecordWriter
+from utils.terminalPump import TerminalPump
 
 if sys.platform == 'win32':
     from winpty import PTY as WinPty
@@ -17,18 +19,26 @@ from utils.logger import logger
 
 
 class tty_service:
-    __terminal: Terminal
-    __session: dict[str: any] = {}
-    __thread: dict[str: Thread] = {}
+    __session: dict[str: any]
+    __terminals: dict[str: Terminal]
+    __pump: TerminalPump
+
+    def __init__(self):
+        # 所有会话共用一个输出泵
+        self.__pump = TerminalPump()
+        # 每次连接创建新的实例，会话不能放在类属性中共享
+        self.__session = {}
+        self.__terminals = {}
 
     def create_session(self, host=None, port=None, username=None, password=None):
         logger.debug("初始化终端")
         """创建终端会话"""
         child = None
         login_status = False
+        terminal = None
         if sys.platform != 'win32':
-            self.__terminal = Terminal()
-            child = self.__terminal.start(host, port, username, password)
+            terminal = Terminal()
+            child = terminal.start(host, port, username, password)
             logger.debug('unix mode')
             if child is False:
                 logger.warning("终端登录失败")
@@ -45,6 +55,8 @@ class tty_service:
         session_uuid = str(uuid.uuid1())
         if login_status:
             self.__session[session_uuid] = child
+            if terminal is not None:
+                self.__terminals[session_uuid] = terminal
             logger.debug(f'create session uuid: {session_uuid}')
         else:
             del child
@@ -80,57 +92,70 @@ class tty_service:
             if sys.platform != 'win32':
                 self.__session[session_id].send(command)
             else:
+                if isinstance(command, bytes):
+                    command = command.decode('utf-8', errors='ignore')
                 self.__session[session_id].write(command)
         else:
             logger.warning(f"[{session_id}]终端会话不存在")
 
     @logger.catch
-    def terminal_output(self, session_id, ws: WebSocket):
-        async def __send(ws, data):
-            await ws.websocket_send_json({'action': 'terminal:output', 'data': {'uuid': session_id, "output": data}})
+    def terminal_output(self, session_id, ws: WebSocket, binary: bool = False):
+        """
+        开始转发终端输出
+        :param binary: 使用二进制帧发送原始字节，否则解码后以 JSON 发送
+        """
+        # 增量解码，避免多字节字符在读取边界处被截断
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
 
-        if session_id in self.__session:
-            self.__thread[session_id] = Thread(
-                target=self.__get_terminal_output,
-                                               args=(session_id, lambda data: asyncio.run(__send(ws, data))))
-            self.__thread[session_id].start()
-        else:
-            raise RuntimeError("终端会话不存在")
+        def __send(data: bytes):
+            if binary:
+                ws.send_bytes_nowait(pack_session_frame(FRAME_TERMINAL_OUTPUT, session_id, data))
+                return
+            output = decoder.decode(data)
+            if output:
+                ws.send_json_nowait({'action': 'terminal:output', 'data': {'uuid': session_id, "output": output}})
 
-    @logger.catch
-    def __get_terminal_output(self, session_id, callback):
+        if session_id not in self.__session:
+            raise RuntimeError("终端会话不存在")
         base_path = os.path.join(os.getcwd(), "data", "terminal_record")
         if not os.path.exists(base_path):
             os.mkdir(base_path)
-        fd = open(str(os.path.join(os.getcwd(), os.path.join(base_path, session_id))), 'w+')
-        while self.__session.get(session_id) is not None:
-            output = ""
-            if sys.platform != 'win32':
-                if self.__session[session_id].recv_ready():
-                    try:
-                        output = self.__session[session_id].recv(1024).decode('utf-8')
-                    except Exception as e:
-                        logger.error(f"[Session: {session_id}] Get terminal output error! {e}")
-            else:
-                output = self.__session[session_id].read()
-            if output != "":
-                fd.write(output)
-                callback(output)
-            else:
-                sleep(0.02)
-        fd.close()
-        logger.debug(f'session {session_id} get output stop')
+        terminal_config = config().get_config().get('terminal', {})
+        record = TerminalRecordWriter(
+            str(os.path.join(base_path, session_id)),
+            terminal_config.get('record_compression', 'gzip')
+        )
+
+        def __output(data: bytes):
+            record.write(data)
+            __send(data)
+
+        def __close():
+            record.close()
+            logger.debug(f'session {session_id} get output stop')
+            # 远端关闭终端时释放会话与通道(主动关闭时会话已移除)
+            if session_id in self.__session:
+                self.close_session(session_id)
+
+        self.__pump.register(session_id, self.__session[session_id], __output, __close)
 
     @logger.catch
     def close_session(self, session_id):
         logger.debug("关闭终端会话.....")
         """关闭终端会话"""
-        if session_id in self.__session:
-            del self.__session[session_id]
+        # 先移除会话，注销时的 on_close 回调不会重复关闭
+        if self.__session.pop(session_id, None) is not None:
+            self.__pump.unregister(session_id)
+            # 关闭通道，SSH连接归还连接池
+            terminal = self.__terminals.pop(session_id, None)
+            if terminal is not None:
+                terminal.terminal_close()
         else:
             logger.warning(f"[{session_id}]终端会话不存在")
+
     @logger.catch
     def close(self):
         temp = list(self.__session.keys())
         for session_id in temp:
             self.close_session(session_id)
+        self.__pump.close()
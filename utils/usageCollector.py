@@ -0,0 +1,205 @@
+import asyncio
+import base64
+import gzip
+import time
+
+from utils.logger import logger
+from utils.metricsBuffer import MetricsRingBuffer, FIELDS, RECORD, pack_sample
+from utils.usageRollup import UsageRollup
+from utils.usageEncoding import UsageEncoder
+import utils.websocket as websocket
+
+
+class UsageCollector:
+    """
+    节点占用采集器
+
+    采集协程独立于 WebSocket 连接运行，每次采样都写入本地环形缓冲区，连接就绪时同时实时上报。
+    每次采样同时写入多粒度汇总(UsageRollup)，供 node:query_history 查询。
+    连接断开期间的采样只写入缓冲区，重新连接后按批压缩补发(node:upload_history_data)，
+    补发速率受 backfill_rate 限制，补发期间实时上报照常进行。
+    记录在实际写入 WebSocket 后才计为已上报，且已上报位置只越过连续已发送的记录，
+    发送队列满或连接断开而丢弃的记录会被补发。
+
+    服务端在 node:init_config 中指定 usage_encoding 为 "binary" 时，实时上报改用二进制帧，
+    帧中不包含的 cgroup、容器与磁盘明细通过 node:usage_extra 以 JSON 发送(见 UsageEncoder)。
+
+    补发数据格式:
+
+    history = {
+        'action': 'node:upload_history_data',
+        'data': {
+            'fields': ["timestamp", "cpu_usage", ...],  # 字段名
+            'format': "<dffffQQQQQQQQ",  # 记录的 struct 格式(小端)
+            'compression': "gzip",
+            'seq': 100,  # 第一条记录的序号
+            'count': 500,  # 记录条数
+            'start_time': 10000,  # 第一条记录的时间戳
+            'end_time': 11000,  # 最后一条记录的时间戳
+            'records': "base64"  # gzip 压缩后 base64 编码的记录数据
+        }
+    }
+    """
+    __collect: any
+    __websocket: websocket
+    __buffer: MetricsRingBuffer
+    __rollup: UsageRollup
+    __interval: float
+    __backfill_batch_size: int
+    __backfill_rate: float
+    __task: asyncio.Task = None
+    __backfill_task: asyncio.Task = None
+    __encoder: UsageEncoder | None = None
+    __sent_ahead: dict[int: int]
+
+    def __init__(self, collect, ws: websocket, buffer: MetricsRingBuffer, rollup: UsageRollup, interval: float,
+                 backfill_batch_size: int = 500, backfill_rate: float = 2):
+        """
+        :param collect: 采集协程函数，返回节点占用数据
+        :param buffer: 本地环形缓冲区
+        :param rollup: 多粒度汇总，创建时使用缓冲区中已有的记录填充
+        :param interval: 采样间隔(秒)
+        :param backfill_batch_size: 每批补发的记录数
+        :param backfill_rate: 每秒最多补发的批数
+        """
+        self.__collect = collect
+        self.__websocket = ws
+        self.__buffer = buffer
+        self.__rollup = rollup
+        self.__interval = interval
+        self.__backfill_batch_size = max(1, backfill_batch_size)
+        self.__backfill_rate = backfill_rate
+        # 已发送但之前仍有未发送记录的序号区间 起始序号 -> 结束序号
+        self.__sent_ahead = {}
+        oldest_seq = buffer.oldest_seq
+        _, data = buffer.read(oldest_seq, buffer.write_seq - oldest_seq)
+        for record in RECORD.iter_unpack(data):
+            rollup.add_record(record)
+
+    def start(self):
+        """启动采集(在事件循环内调用)"""
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.__run())
+
+    def set_interval(self, interval: float):
+        if interval and interval > 0:
+            self.__interval = interval
+
+    def set_encoding(self, encoding: str):
+        """
+        设置实时上报编码: json / binary(每次连接就绪时调用)
+
+        二进制编码沿用已有的编码器并重置字典，新连接的第一帧前以新的版本号重新发送字典，
+        不会沿用上一个连接的字典。
+        """
+        if encoding != "binary":
+            self.__encoder = None
+        elif self.__encoder is None:
+            self.__encoder = UsageEncoder()
+        else:
+            self.__encoder.reset()
+
+    def start_backfill(self):
+        """补发连接断开期间未上报的记录(在事件循环内调用)"""
+        if self.__backfill_task is not None and not self.__backfill_task.done():
+            return
+        # 补发会重新发送未上报位置之后的所有记录
+        self.__sent_ahead.clear()
+        if self.__buffer.forwarded_seq >= self.__buffer.write_seq:
+            return
+        self.__backfill_task = asyncio.create_task(self.__backfill(self.__buffer.write_seq))
+
+    def query_history(self, start: float, end: float, resolution: str = None, max_points: int = 1000) -> dict:
+        """查询汇总数据"""
+        return self.__rollup.query(start, end, resolution, max_points)
+
+    def stop(self):
+        for task in (self.__task, self.__backfill_task):
+            if task is not None:
+                task.cancel()
+        self.__task = None
+        self.__backfill_task = None
+        self.__buffer.close()
+
+    async def __run(self):
+        loop = asyncio.get_running_loop()
+        next_time = loop.time() + self.__interval
+        while True:
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+            next_time += self.__interval
+            if next_time < loop.time():
+                # 采样落后时不补采，从当前时刻重新计时
+                next_time = loop.time() + self.__interval
+            try:
+                await self.__collect_once()
+            except Exception as e:
+                logger.error(f"节点占用采集失败: {e}")
+
+    async def __collect_once(self):
+        timestamp = time.time()
+        node_usage = await self.__collect()
+        if node_usage is None:
+            return
+        record = pack_sample(timestamp, node_usage)
+        seq = self.__buffer.append(record)
+        self.__rollup.add_record(RECORD.unpack(record))
+        if not self.__websocket.is_connected():
+            return
+        on_sent = lambda: self.__mark_sent(seq, seq + 1)
+        if self.__encoder is not None:
+            dictionary, frame = self.__encoder.encode(timestamp, node_usage)
+            if dictionary is not None:
+                self.__websocket.send_json_nowait({'action': 'node:usage_dictionary', 'data': dictionary})
+            self.__websocket.send_bytes_nowait(frame, on_sent)
+            extra = self.__encoder.extra(timestamp, node_usage)
+            if extra is not None:
+                self.__websocket.send_json_nowait({'action': 'node:usage_extra', 'data': extra})
+        else:
+            node_usage["timestamp"] = timestamp
+            self.__websocket.send_json_nowait({'action': 'node:upload_running_data', 'data': node_usage}, on_sent)
+
+    def __mark_sent(self, start_seq: int, end_seq: int):
+        """
+        [start_seq, end_seq) 的记录已写入 WebSocket(在事件循环中由发送协程回调)
+
+        只有之前的记录都已发送时才前移已上报位置，出现未发送的记录时开始补发。
+        """
+        forwarded = max(self.__buffer.forwarded_seq, self.__buffer.oldest_seq)
+        if end_seq <= forwarded:
+            return
+        self.__sent_ahead[start_seq] = max(end_seq, self.__sent_ahead.get(start_seq, end_seq))
+        while True:
+            ready = [seq for seq in self.__sent_ahead if seq <= forwarded]
+            if not ready:
+                break
+            for seq in ready:
+                forwarded = max(forwarded, self.__sent_ahead.pop(seq))
+        self.__buffer.mark_forwarded(forwarded)
+        if self.__sent_ahead and self.__websocket.is_connected():
+            # 中间有记录被丢弃
+            self.start_backfill()
+
+    async def __backfill(self, end_seq: int):
+        seq = self.__buffer.forwarded_seq
+        logger.info(f"开始补发 {end_seq - max(seq, self.__buffer.oldest_seq)} 条历史占用记录")
+        while seq < end_seq and self.__websocket.is_connected():
+            start_seq, data = self.__buffer.read(seq, min(self.__backfill_batch_size, end_seq - seq))
+            if not data:
+                break
+            count = len(data) // RECORD.size
+            first = RECORD.unpack_from(data, 0)
+            last = RECORD.unpack_from(data, (count - 1) * RECORD.size)
+            self.__websocket.send_json_nowait({'action': 'node:upload_history_data', 'data': {
+                'fields': FIELDS,
+                'format': RECORD.format,
+                'compression': "gzip",
+                'seq': start_seq,
+                'count': count,
+                'start_time': first[0],
+                'end_time': last[0],
+                'records': base64.b64encode(gzip.compress(data)).decode()
+            }}, lambda batch_start=start_seq, batch_end=start_seq + count: self.__mark_sent(batch_start, batch_end))
+            seq = start_seq + count
+            await asyncio.sleep(1 / self.__backfill_rate if self.__backfill_rate > 0 else 0)
+        if seq >= end_seq and self.__websocket.is_connected():
+            logger.info("历史占用记录补发完成")
@@ -0,0 +1,148 @@
+import struct
+
+import utils.binaryProtocol as binaryProtocol
+
+# 占用数据二进制编码的 schema id
+USAGE_SCHEMA_V1 = 1
+
+# 帧头: 帧类型, schema id, 字典版本, 时间戳
+USAGE_HEADER = struct.Struct("<BBHd")
+# 汇总指标: CPU占用, 1/5/15分钟负载, 内存总量/已用, 交换分区总量/已用, 磁盘读/写速率, 网络发送/接收速率
+USAGE_SUMMARY = struct.Struct("<ffffQQQQQQQQ")
+# 节点端自身指标: 事件循环延迟(最近/最大, 毫秒), 执行器运行中/排队/已拒绝任务数
+USAGE_AGENT = struct.Struct("<ffHHI")
+ARRAY_LENGTH = struct.Struct("<H")
+# 分区用量未知(从未成功获取)时写入的值
+UNKNOWN_SIZE = 0xFFFFFFFFFFFFFFFF
+# 不在 schema 1 中、通过 node:usage_extra 以 JSON 发送的可选项
+EXTRA_SECTIONS = ("cgroup", "containers")
+EXTRA_DISK_SECTIONS = ("devices", "top_processes")
+
+
+class UsageEncoder:
+    """
+    节点占用数据二进制编码器(schema 1)
+
+    网卡名与分区信息不写入每一帧，而是按出现顺序编入字典，字典变化时先通过
+    node:usage_dictionary 消息发送，之后的帧只携带字典版本号与按字典顺序排列的定长数组:
+
+    | 1B 帧类型 0x03 | 1B schema id | 2B 字典版本 | 8B 时间戳 |
+    | 汇总指标 <ffffQQQQQQQQ> | 节点端指标 <ffHHI> |
+    | 2B 核心数 n | n * float32 核心占用 |
+    | 2B 网卡数 n | n * (uint64 发送速率, uint64 接收速率) |
+    | 2B 分区数 n | n * (uint64 总量, uint64 已用) |
+
+    分区用量未知时总量与已用均为 UNKNOWN_SIZE(0xFFFFFFFFFFFFFFFF)。
+
+    字典格式:
+
+    dictionary = {
+        'action': 'node:usage_dictionary',
+        'data': {
+            'schema': 1,
+            'version': 1,  # 字典版本，与帧中的字典版本对应
+            'nics': ["eth0", "lo"],
+            'partitions': [{"device": "/dev/sda1", "mount_point": "/", "fs_type": "ext4"}]
+        }
+    }
+
+    cgroup、containers、disk.devices 与 disk.top_processes 长度与结构不固定，不写入二进制帧，
+    采样中包含这些项时在帧之后以 JSON 发送，结构与 node:upload_running_data 中相同，按时间戳与帧对应:
+
+    extra = {
+        'action': 'node:usage_extra',
+        'data': {
+            'timestamp': 10000.0,  # 与帧中的时间戳相同
+            'cgroup': {...},
+            'containers': [...],
+            'disk': {'devices': {...}, 'top_processes': [...]}
+        }
+    }
+    """
+    __version: int = 0
+    __nics: tuple | None = None
+    __partitions: tuple | None = None
+
+    def reset(self):
+        """重置字典，下一帧前以新的版本号重新发送字典(重新连接后调用)"""
+        self.__nics = None
+        self.__partitions = None
+
+    def encode(self, timestamp: float, node_usage: dict) -> tuple[dict | None, bytes]:
+        """编码一次采样，返回 (字典变化时的字典消息数据, 二进制帧)"""
+        network_io = node_usage["network"]["io"]
+        partition_list = node_usage["disk"].get("partition_list") or []
+        nics = tuple(nic for nic in network_io if nic != "_all")
+        partitions = tuple((item["device"], item["mount_point"], item["fs_type"]) for item in partition_list)
+        dictionary = None
+        if nics != self.__nics or partitions != self.__partitions:
+            self.__nics = nics
+            self.__partitions = partitions
+            self.__version = self.__version % 0xFFFF + 1
+            dictionary = {
+                'schema': USAGE_SCHEMA_V1,
+                'version': self.__version,
+                'nics': list(nics),
+                'partitions': [
+                    {"device": device, "mount_point": mount_point, "fs_type": fs_type}
+                    for device, mount_point, fs_type in partitions
+                ]
+            }
+
+        loadavg = node_usage.get("loadavg") or (0, 0, 0)
+        disk_io = node_usage["disk"]["io"]
+        network_all = network_io["_all"]
+        agent = node_usage.get("agent") or {}
+        loop_lag = agent.get("loop_lag") or {}
+        executor = agent.get("executor") or {}
+        core_usage = node_usage["cpu"]["core_usage"]
+
+        parts = [
+            USAGE_HEADER.pack(binaryProtocol.FRAME_USAGE, USAGE_SCHEMA_V1, self.__version, timestamp),
+            USAGE_SUMMARY.pack(
+                node_usage["cpu"]["usage"],
+                *loadavg[:3],
+                node_usage["memory"]["total"],
+                node_usage["memory"]["used"],
+                node_usage["swap"]["total"],
+                node_usage["swap"]["used"],
+                disk_io["read_bytes"],
+                disk_io["write_bytes"],
+                network_all["bytes_sent"],
+                network_all["bytes_recv"],
+            ),
+            USAGE_AGENT.pack(
+                loop_lag.get("last", 0),
+                loop_lag.get("max", 0),
+                executor.get("active", 0),
+                executor.get("queued", 0),
+                executor.get("rejected", 0),
+            ),
+            ARRAY_LENGTH.pack(len(core_usage)),
+            struct.pack(f"<{len(core_usage)}f", *core_usage),
+            ARRAY_LENGTH.pack(len(nics)),
+        ]
+        nic_values = []
+        for nic in nics:
+            nic_values += (network_io[nic]["bytes_sent"], network_io[nic]["bytes_recv"])
+        parts.append(struct.pack(f"<{len(nic_values)}Q", *nic_values))
+        parts.append(ARRAY_LENGTH.pack(len(partition_list)))
+        partition_values = []
+        for item in partition_list:
+            if item["total"] is None:
+                partition_values += (UNKNOWN_SIZE, UNKNOWN_SIZE)
+            else:
+                partition_values += (item["total"], item["used"])
+        parts.append(struct.pack(f"<{len(partition_values)}Q", *partition_values))
+        return dictionary, b"".join(parts)
+
+    @staticmethod
+    def extra(timestamp: float, node_usage: dict) -> dict | None:
+        """二进制帧不包含的可选项(node:usage_extra 消息数据)，没有可选项时返回 None"""
+        extra = {key: node_usage[key] for key in EXTRA_SECTIONS if key in node_usage}
+        disk = {key: node_usage["disk"][key] for key in EXTRA_DISK_SECTIONS if key in node_usage["disk"]}
+        if disk:
+            extra["disk"] = disk
+        if not extra:
+            return None
+        return {"timestamp": timestamp, **extra}
@@ -0,0 +1,167 @@
+import math
+from collections import deque
+
+from utils.metricsBuffer import FIELDS
+
+# 参与汇总的指标
+ROLLUP_FIELDS = (
+    "cpu_usage",
+    "load_1",
+    "memory_used",
+    "swap_used",
+    "disk_read_bytes",
+    "disk_write_bytes",
+    "network_bytes_sent",
+    "network_bytes_recv",
+)
+# 每个指标的统计值
+ROLLUP_STATS = ("min", "max", "avg", "p95")
+# (名称, 粒度秒数, 最多保留的桶数)
+DEFAULT_TIERS = (
+    ("1s", 1, 3600),
+    ("1m", 60, 1440),
+    ("1h", 3600, 720),
+)
+
+
+def percentile(values: list, percent: float) -> float:
+    """最近秩法计算百分位数"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class RollupTier:
+    """
+    单一粒度的汇总
+
+    已结束的桶保存在定长队列中，超出数量后丢弃最旧的桶；
+    当前桶保留原始值以计算 p95。
+    桶的格式为 (起始时间戳, 采样数, [[min, max, avg, p95], ...])，指标顺序与 ROLLUP_FIELDS 一致。
+    """
+    name: str
+    step: int
+    __buckets: deque
+    __current_start: float | None = None
+    __first_timestamp: float | None = None
+    __current_values: list[list[float]]
+
+    def __init__(self, name: str, step: int, capacity: int):
+        self.name = name
+        self.step = step
+        self.__buckets = deque(maxlen=max(1, capacity))
+        self.__current_values = [[] for _ in ROLLUP_FIELDS]
+
+    def add(self, timestamp: float, values: list[float]):
+        start = timestamp - timestamp % self.step
+        if self.__current_start is None:
+            self.__first_timestamp = timestamp
+            self.__current_start = start
+        elif start > self.__current_start:
+            self.__buckets.append(self.__current_bucket())
+            self.__current_start = start
+            self.__current_values = [[] for _ in ROLLUP_FIELDS]
+        # 时钟回拨时落入当前桶
+        for field_values, value in zip(self.__current_values, values):
+            field_values.append(value)
+
+    def __current_bucket(self) -> tuple:
+        stats = []
+        for field_values in self.__current_values:
+            stats.append([
+                min(field_values),
+                max(field_values),
+                sum(field_values) / len(field_values),
+                percentile(field_values, 95),
+            ])
+        return self.__current_start, len(self.__current_values[0]), stats
+
+    @property
+    def oldest(self) -> float | None:
+        """保存的最早数据时间"""
+        if self.__first_timestamp is None:
+            return None
+        if self.__buckets:
+            return max(self.__first_timestamp, self.__buckets[0][0])
+        return self.__first_timestamp
+
+    def buckets(self, start: float, end: float) -> list[tuple]:
+        """获取与时间范围重叠的桶(包含未结束的当前桶)"""
+        start -= self.step
+        result = [bucket for bucket in self.__buckets if start < bucket[0] <= end]
+        if self.__current_start is not None and self.__current_values[0] and \
+                start < self.__current_start <= end:
+            result.append(self.__current_bucket())
+        return result
+
+
+class UsageRollup:
+    """
+    节点占用多粒度汇总
+
+    每次采样同时写入 1s / 1m / 1h 三个粒度，每个粒度的桶数有上限。
+    查询时自动选择覆盖时间范围且点数不超过上限的最细粒度，仍超过上限时合并相邻的桶
+    (合并后的 p95 取各桶 p95 的最大值，为偏保守的近似)。
+    """
+    __tiers: list[RollupTier]
+    __indexes: list[int]
+
+    def __init__(self, tiers: tuple = DEFAULT_TIERS):
+        self.__tiers = [RollupTier(name, step, capacity) for name, step, capacity in tiers]
+        self.__indexes = [FIELDS.index(field) for field in ROLLUP_FIELDS]
+
+    def add_record(self, record: tuple):
+        """写入一条采样记录(字段顺序与 metricsBuffer.FIELDS 一致)"""
+        values = [record[index] for index in self.__indexes]
+        for tier in self.__tiers:
+            tier.add(record[0], values)
+
+    def __select_tier(self, start: float, end: float, max_points: int) -> RollupTier:
+        candidates = [tier for tier in self.__tiers if (end - start) / tier.step <= max_points] or [self.__tiers[-1]]
+        for tier in candidates:
+            if tier.oldest is not None and tier.oldest <= start:
+                return tier
+        # 没有粒度覆盖起始时间时，选择保存数据最早的粒度
+        return min(candidates, key=lambda tier: math.inf if tier.oldest is None else tier.oldest)
+
+    @staticmethod
+    def __merge(buckets: list[tuple]) -> tuple:
+        count = sum(bucket[1] for bucket in buckets)
+        stats = []
+        for index in range(len(ROLLUP_FIELDS)):
+            items = [bucket[2][index] for bucket in buckets]
+            stats.append([
+                min(item[0] for item in items),
+                max(item[1] for item in items),
+                sum(item[2] * bucket[1] for item, bucket in zip(items, buckets)) / count,
+                max(item[3] for item in items),
+            ])
+        return buckets[0][0], count, stats
+
+    def query(self, start: float, end: float, resolution: str = None, max_points: int = 1000) -> dict:
+        """
+        查询时间范围内的汇总数据
+        :param resolution: 指定粒度(1s / 1m / 1h)，为空时自动选择
+        :param max_points: 最多返回的点数
+        """
+        max_points = max(1, max_points)
+        tier = None
+        if resolution:
+            tier = next((item for item in self.__tiers if item.name == resolution), None)
+            if tier is None:
+                raise ValueError(f"未知的粒度: {resolution}")
+        else:
+            tier = self.__select_tier(start, end, max_points)
+        buckets = tier.buckets(start, end)
+        step = tier.step
+        if len(buckets) > max_points:
+            group = math.ceil(len(buckets) / max_points)
+            buckets = [self.__merge(buckets[i:i + group]) for i in range(0, len(buckets), group)]
+            step *= group
+        return {
+            "resolution": tier.name,
+            "step": step,
+            "fields": ROLLUP_FIELDS,
+            "stats": ROLLUP_STATS,
+            # [起始时间戳, 采样数, [[min, max, avg, p95], ...]]
+            "points": [list(bucket) for bucket in buckets],
+        }
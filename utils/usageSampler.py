@@ -0,0 +1,135 @@
+import time
+
+import psutil
+
+from utils.procfs import create_usage_source
+
+
+class UsageSampler:
+    """
+    节点占用采样器
+
+    保存上一次采样时的CPU时间、磁盘和网络计数器，每次采样时用单调时钟计算与上一次之间的真实间隔，
+    据此计算CPU占用率与每秒速率。采样不需要等待，所有指标覆盖同一个时间窗口。
+    计数器由 utils.procfs 读取，Linux 下默认直接解析 /proc。
+    开启分设备统计时，disk.devices 中包含每个磁盘的 IOPS、吞吐、忙碌百分比与平均队列深度。
+    """
+    __source: any
+    __last_time: float
+    __last: any
+
+    def __init__(self, fast_path: bool = True, per_device: bool = False):
+        self.__source = create_usage_source(fast_path, per_device)
+        self.__last_time = time.monotonic()
+        self.__last = self.__source.read()
+
+    def __cpu_usage(self, cpu: list) -> tuple[float, list[float]]:
+        core_usage = []
+        all_total = all_busy = 0.0
+        for (old_total, old_busy), (new_total, new_busy) in zip(self.__last.cpu, cpu):
+            total = new_total - old_total
+            busy = new_busy - old_busy
+            all_total += total
+            all_busy += busy
+            core_usage.append(self.__percent(busy, total))
+        return self.__percent(all_busy, all_total), core_usage
+
+    @staticmethod
+    def __percent(busy: float, total: float) -> float:
+        if total <= 0:
+            return 0.0
+        return round(min(100.0, max(0.0, busy / total * 100)), 1)
+
+    @staticmethod
+    def __rate(new: int, old: int, elapsed: float) -> int:
+        """每秒速率，计数器重置时返回 0"""
+        if new < old or elapsed <= 0:
+            return 0
+        return int((new - old) / elapsed)
+
+    def sample(self) -> dict:
+        """采样，返回与上一次采样之间的占用情况"""
+        now = time.monotonic()
+        snapshot = self.__source.read()
+        elapsed = now - self.__last_time
+        last = self.__last
+
+        cpu_usage, core_usage = self.__cpu_usage(snapshot.cpu)
+
+        disk = {"read_bytes": 0, "write_bytes": 0}
+        if snapshot.disk and last.disk:
+            disk = {
+                "read_bytes": self.__rate(snapshot.disk[0], last.disk[0], elapsed),
+                "write_bytes": self.__rate(snapshot.disk[1], last.disk[1], elapsed),
+            }
+        devices = None
+        if snapshot.devices is not None and last.devices is not None:
+            devices = self.__device_usage(snapshot.devices, last.devices, elapsed)
+        network = {}
+        all_sent = all_recv = 0
+        for nic, (bytes_sent, bytes_recv) in snapshot.network.items():
+            last_nic = last.network.get(nic)
+            if last_nic is None:
+                continue
+            sent = self.__rate(bytes_sent, last_nic[0], elapsed)
+            recv = self.__rate(bytes_recv, last_nic[1], elapsed)
+            all_sent += sent
+            all_recv += recv
+            network[nic] = {"bytes_sent": sent, "bytes_recv": recv}
+        network = {"_all": {"bytes_sent": all_sent, "bytes_recv": all_recv}, **network}
+
+        self.__last_time = now
+        self.__last = snapshot
+        node_usage = {
+            "loadavg": psutil.getloadavg(),
+            "cpu": {
+                "usage": cpu_usage,
+                "core_usage": core_usage,
+            },
+            "memory": {
+                # 总量
+                "total": snapshot.memory[0],
+                # 已用
+                "used": snapshot.memory[1],
+            },
+            "swap": {
+                # 总量
+                "total": snapshot.swap[0],
+                # 使用中
+                "used": snapshot.swap[1],
+            },
+            "disk": {
+                "io": disk,
+            },
+            "network": {
+                "io": network
+            }
+        }
+        if devices is not None:
+            node_usage["disk"]["devices"] = devices
+        return node_usage
+
+    def __device_usage(self, devices: dict, last_devices: dict, elapsed: float) -> dict:
+        result = {}
+        elapsed_ms = elapsed * 1000
+        for name, counters in devices.items():
+            last = last_devices.get(name)
+            if last is None or not any(counters):
+                # 新出现或从未使用过的设备
+                continue
+            result[name] = {
+                "read_iops": self.__rate(counters.reads, last.reads, elapsed),
+                "write_iops": self.__rate(counters.writes, last.writes, elapsed),
+                "read_bytes": self.__rate(counters.read_bytes, last.read_bytes, elapsed),
+                "write_bytes": self.__rate(counters.write_bytes, last.write_bytes, elapsed),
+                # 忙碌时间占比(%)
+                "busy": self.__percent(counters.busy_time - last.busy_time, elapsed_ms),
+                # 平均队列深度
+                "queue_depth": round(max(0, counters.weighted_time - last.weighted_time) / elapsed_ms, 2)
+                if elapsed_ms > 0 else 0.0,
+                "in_flight": counters.in_flight,
+            }
+        return result
+
+    def close(self):
+        self.__source.close()
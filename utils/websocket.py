@@ -5,22 +5,32 @@ import time
 
 import aiohttp
 from aiohttp import web, ClientWebSocketResponse
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from utils.auth import authenticate
+import utils.binaryProtocol as binaryProtocol
 from utils.downloadFileUtil import DownloadFileUtil
+from utils.executor import run_blocking, start_loop_lag_monitor, ExecutorBusyError
 from utils.logger import logger
-from utils.node import update_node_usage, update_node_info, start_get_process_list, \
-    stop_get_process_list, kill_process
+from utils.node import update_node_info, start_get_process_list, stop_get_process_list, \
+    resync_process_list, kill_process, start_usage_collector, resume_usage_upload, query_usage_history, \
+    start_process_io_top, stop_process_io_top
 from utils.tty import tty_service
 from utils.shellTaskUtils import shellTaskUtils
 from utils.executeUtils import executeUtils
 
 
 class WebSocket:
+    # 发送队列最大长度，队列满时丢弃新消息
+    SEND_QUEUE_SIZE = 4096
+    # 连接断开后保留在发送队列中的消息(任务与命令在断线期间继续运行)，
+    # 其余消息(进程列表增量、终端输出、实时占用等)只对原连接有意义，断开时丢弃
+    DURABLE_ACTIONS = frozenset((
+        'task:process_start', 'task:process_output', 'task:process_stop',
+        'execute:start', 'execute:output', 'execute:stop',
+    ))
+
     __session: aiohttp.ClientSession
-    __ws: aiohttp.client_ws.ClientWebSocketResponse
-    __scheduler: AsyncIOScheduler = None
+    __ws: aiohttp.client_ws.ClientWebSocketResponse = None
     __node_config: dict
     __tty_service: tty_service = None
     __shell_task_service: shellTaskUtils = None
@@ -28,6 +38,12 @@ class WebSocket:
     __download_file_service: DownloadFileUtil = None
     __config = None
     __data_path: str
+    __loop: asyncio.AbstractEventLoop = None
+    __send_queue: asyncio.Queue = None
+    __send_dropped: int = 0
+    __in_flight: tuple | None = None
+    __binary_terminal: bool = False
+    __connected: bool = False
 
     def __init__(self, session: aiohttp.ClientSession):
         # 初始化数据存储路径
@@ -50,6 +66,15 @@ class WebSocket:
             "node_token": self.__config()['server']['client_token'],
         }
 
+        # 所有模块的出站消息都经由此队列，由单个发送协程写入 WebSocket
+        self.__loop = asyncio.get_running_loop()
+        self.__send_queue = asyncio.Queue(self.SEND_QUEUE_SIZE)
+        start_loop_lag_monitor()
+        # 占用采集独立于连接运行，断开期间的采样写入本地缓冲区
+        start_usage_collector(self)
+        # 任务调度独立于连接运行，断线重连时只同步有变化的任务
+        self.__shell_task_service = shellTaskUtils(self)
+
         while True:
             try:
                 # 发送节点认证请求
@@ -58,29 +83,35 @@ class WebSocket:
                     time.sleep(5)
                     continue
                 self.__tty_service = tty_service()
-                self.__shell_task_service = shellTaskUtils(self)
                 self.__shell_execute_service = executeUtils(self)
                 self.__download_file_service = DownloadFileUtil(self, self.__session, download_file_url)
-                self.__scheduler = AsyncIOScheduler()
                 async with self.__session.ws_connect(ws_url, autoping=True) as ws:
                     logger.success("WebSocket已连接")
                     self.__ws = ws
+                    send_task = asyncio.create_task(self.__send_handler(ws))
                     recv_task = asyncio.create_task(self.message_handler())
-                    await recv_task
+                    try:
+                        await recv_task
+                    finally:
+                        send_task.cancel()
             except aiohttp.ClientError as err:
                 logger.error(f"WebSocket connection failed. Retrying...({err})")
             finally:
                 await asyncio.sleep(5)
+            self.__connected = False
             await stop_get_process_list()
-            if self.__scheduler and self.__scheduler.state != 0:
-                self.__scheduler.shutdown(wait=False)
-            if self.__shell_task_service:
-                self.__shell_task_service.close()
-                del self.__shell_task_service
+            await stop_process_io_top()
             if self.__tty_service:
-                del self.__tty_service
+                # 关闭全部终端会话，释放输出泵与SSH通道
+                self.__tty_service.close()
+                self.__tty_service = None
+            if self.__shell_execute_service:
+                # 运行中的命令结束后释放输出读取器
+                self.__shell_execute_service.close()
+                self.__shell_execute_service = None
             if self.__download_file_service:
                 del self.__download_file_service
+            self.__discard_stale()
 
 
     async def message_handler(self):
@@ -94,16 +125,23 @@ class WebSocket:
                     actions = {
                         "node:close": self._close,
                         "node:init_config": self._init_node_config,
+                        "node:query_history": self._query_history,
                         "terminal:create_session": self._terminal__create_session,
                         "terminal:close_session": self._terminal__close_session,
                         "terminal:input": self._terminal__input,
                         "terminal:resize": self._terminal__resize,
                         "process_list:start": self._process_list__start,
                         "process_list:stop": self._process_list__stop,
+                        "process_list:resync": self._process_list__resync,
                         "process_list:kill": self._process_list__kill,
+                        "process_io:start": self._process_io__start,
+                        "process_io:stop": self._process_io__stop,
                         "task:add": self._add_task,
                         "task:remove": self._remove_task,
                         "task:reload": self._reload_task,
+                        "task:list_runs": self._list_task_runs,
+                        "task:tail_run": self._tail_task_run,
+                        "task:run_stats": self._task_run_stats,
                         "execute:run_shell": self._execute_shell,
                         "download_file:add_tasks": self._download_files
                     }
@@ -113,22 +151,53 @@ class WebSocket:
                         return
                     try:
                         await actions[action](data.get('data'))
+                    except ExecutorBusyError as e:
+                        logger.warning(f"Action {action} rejected: {e}")
+                        await self.__reply_busy(action, data.get('data'))
                     except Exception as e:
                         logger.error(f"Action {action} Execute Error: {e}")
                         return
                 case web.WSMsgType.BINARY:
-                    pass
+                    try:
+                        self.__binary_message_handler(msg.data)
+                    except Exception as e:
+                        logger.error(f"Binary Message Handle Error: {e}")
                 case web.WSMsgType.CLOSE:
-                    self.__scheduler.shutdown()
-                    del self.__tty_service
-                    del self.__shell_task_service
+                    self.__connected = False
                     logger.info("连接已断开")
             # await asyncio.sleep(0.2)
 
+    async def __reply_busy(self, action: str, payload=None):
+        """
+        阻塞调用执行器繁忙、请求被拒绝时通知服务端，服务端可稍后重试
+
+        busy = {
+            'action': 'node:busy',
+            'data': {
+                'request': "task:add",  # 被拒绝的请求
+                'uuid': "xxxxxxxx",  # 请求中的 id/index/uuid(存在时原样返回)
+            }
+        }
+        """
+        data = {'request': action}
+        if isinstance(payload, dict):
+            data.update({key: payload[key] for key in ('id', 'index', 'uuid') if key in payload})
+        await self.websocket_send_json({'action': 'node:busy', 'data': data})
+
+    def __binary_message_handler(self, data: bytes):
+        """处理二进制消息"""
+        match binaryProtocol.get_frame_type(data):
+            case binaryProtocol.FRAME_TERMINAL_INPUT:
+                tty_session_uuid, command = binaryProtocol.unpack_session_frame(data)
+                self.__tty_service.send_command(tty_session_uuid, command)
+            case frame_type:
+                logger.error(f"Undefined binary frame type: {frame_type}")
+
     async def _close(self, payload=None):
         """关闭节点端"""
         logger.info(f'Close......')
-        self.__scheduler.shutdown()
+        self.__shell_task_service.close()
+        self.__connected = False
         await stop_get_process_list()
         return exit(0)
 
@@ -137,13 +206,30 @@ class WebSocket:
         logger.debug(f'Init node config....')
         await update_node_info(self)
         self.__node_config = payload
+        # 服务端支持二进制终端帧时，终端输出使用二进制帧发送
+        self.__binary_terminal = bool(payload.get('binary_terminal', False))
         await self._start_node_usage_upload_task()
         if self.__config().get("safe").get("execute_command"):
             # 加载任务列表
-            self.__shell_task_service.init_task_list(self.__node_config.get('task'))
+            await run_blocking(self.__shell_task_service.init_task_list, self.__node_config.get('task'))
         logger.info("node ready!")
 
     @logger.catch
+    async def _query_history(self, payload=None):
+        """
+        查询节点本地的占用汇总数据
+
+        payload = {
+            'id': "xxxxxxxx",  # 请求标识，原样返回
+            'start': 10000,  # 起始时间戳，默认为一小时前
+            'end': 13600,  # 结束时间戳，默认为当前时间
+            'resolution': "1m",  # 粒度: 1s / 1m / 1h，为空时自动选择
+            'max_points': 1000  # 最多返回的点数
+        }
+        """
+        await query_usage_history(self, payload or {})
+
+    @logger.catch(exclude=ExecutorBusyError)
     async def _terminal__create_session(self, payload=None):
         """创建终端Session"""
         index = payload['index']
@@ -159,7 +245,21 @@ class WebSocket:
                     "index": index
                 }
             })
-        tty_session_uuid, login_status = self.__tty_service.create_session(host, port, username, password)
+        # SSH 登录为阻塞调用
+        try:
+            tty_session_uuid, login_status = await run_blocking(
+                self.__tty_service.create_session, host, port, username, password
+            )
+        except ExecutorBusyError:
+            logger.warning("阻塞调用执行器繁忙，终端登录被拒绝")
+            await self.websocket_send_json({
+                "action": "terminal:login_failed",
+                "data": {
+                    "index": index,
+                    "reason": "busy"
+                }
+            })
+            return
         if login_status:
             logger.debug(f"inti tty succeed; session uuid: {tty_session_uuid}")
             await self.websocket_send_json({
@@ -170,7 +270,11 @@ class WebSocket:
                 }
             })
             # 获取终端输出
-            self.__tty_service.terminal_output(tty_session_uuid, self)
+            self.__tty_service.terminal_output(
+                tty_session_uuid,
+                self,
+                payload.get('binary', self.__binary_terminal)
+            )
             return
         await self.websocket_send_json({
             "action": "terminal:login_failed",
@@ -203,7 +307,7 @@ class WebSocket:
     @logger.catch
     async def _process_list__start(self, payload=None):
         """开始获取进程列表"""
-        await start_get_process_list(self)
+        await start_get_process_list(self, payload)
 
     @logger.catch
     async def _process_list__stop(self, payload=None):
@@ -211,6 +315,11 @@ class WebSocket:
         await stop_get_process_list()
 
     @logger.catch
+    async def _process_list__resync(self, payload=None):
+        """重新发送完整进程列表"""
+        await resync_process_list()
+
+    @logger.catch(exclude=ExecutorBusyError)
     async def _process_list__kill(self, payload=None):
         """杀死一个进程"""
         pid = payload['pid']
@@ -218,39 +327,124 @@ class WebSocket:
         if pid:
             await kill_process(pid, tree_mode)
 
+    @logger.catch(exclude=ExecutorBusyError)
+    async def _process_io__start(self, payload=None):
+        """订阅进程 I/O 排行(payload: {'top': 10})"""
+        await start_process_io_top(payload)
+
+    @logger.catch
+    async def _process_io__stop(self, payload=None):
+        """取消订阅进程 I/O 排行"""
+        await stop_process_io_top()
+
     @logger.catch
     async def _start_node_usage_upload_task(self):
-        """启动调度器：上传节点状态"""
-        # 调度方法为 update_node_usage，触发器选择 interval(间隔性)，间隔时长为 2 秒
-        self.__scheduler.add_job(
-            update_node_usage,
-            'interval',
-            seconds=self.__node_config['upload_data_interval'],
-            args=[self]
+        """开始上报节点状态：按服务端要求的间隔上报，并补发断开期间的记录"""
+        self.__connected = True
+        # 服务端支持时占用数据使用二进制帧上报
+        resume_usage_upload(
+            self.__node_config['upload_data_interval'],
+            self.__node_config.get('usage_encoding', "json")
         )
-        # 启动调度任务
-        self.__scheduler.start()
 
-    @logger.catch
+    @logger.catch(exclude=ExecutorBusyError)
     async def _add_task(self, data: dict):
         """添加任务"""
         if self.__config().get("safe").get("execute_command") is False:
             return
-        self.__shell_task_service.add_task(data)
+        await run_blocking(self.__shell_task_service.add_task, data)
 
-    @logger.catch
+    @logger.catch(exclude=ExecutorBusyError)
     async def _remove_task(self, data):
         """删除一个任务"""
         if self.__config().get("safe").get("execute_command") is False:
             return
-        self.__shell_task_service.remove_task(data)
+        await run_blocking(self.__shell_task_service.remove_task, data)
 
-    @logger.catch
+    @logger.catch(exclude=ExecutorBusyError)
     async def _reload_task(self, data):
         """重载一个任务"""
         if self.__config().get("safe").get("execute_command") is False:
             return
-        self.__shell_task_service.reload_task(data)
+        await run_blocking(self.__shell_task_service.reload_task, data)
+
+    @logger.catch(exclude=ExecutorBusyError)
+    async def _list_task_runs(self, payload=None):
+        """
+        列出任务最近的运行记录
+
+        payload = {
+            'uuid': "xxxxxxxx",  # 任务uuid
+            'limit': 50,  # 最多返回的记录数
+            'status': "failed"  # 仅返回该状态的记录，可选
+        }
+        """
+        payload = payload or {}
+        task_uuid = payload.get('uuid')
+        runs = await run_blocking(
+            self.__shell_task_service.list_runs,
+            task_uuid,
+            payload.get('limit', 50),
+            payload.get('status')
+        )
+        await self.websocket_send_json({
+            'action': 'task:list_runs',
+            'data': {
+                'uuid': task_uuid,
+                'runs': runs or []
+            }
+        })
+
+    @logger.catch(exclude=ExecutorBusyError)
+    async def _task_run_stats(self, payload=None):
+        """
+        统计任务的运行情况
+
+        payload = {
+            'uuid': "xxxxxxxx",  # 任务uuid
+            'start': 10000,  # 起始时间戳，可选
+            'end': 13600  # 结束时间戳，可选
+        }
+        """
+        payload = payload or {}
+        task_uuid = payload.get('uuid')
+        stats = await run_blocking(
+            self.__shell_task_service.run_stats,
+            task_uuid,
+            payload.get('start'),
+            payload.get('end')
+        )
+        await self.websocket_send_json({
+            'action': 'task:run_stats',
+            'data': {
+                'uuid': task_uuid,
+                'stats': stats
+            }
+        })
+
+    @logger.catch(exclude=ExecutorBusyError)
+    async def _tail_task_run(self, payload=None):
+        """
+        获取一次任务运行输出的末尾部分
+
+        payload = {
+            'uuid': "xxxxxxxx",  # 任务uuid
+            'mark': "xxxxxxx",  # 运行标记
+            'size': 65536  # 最多返回的字节数
+        }
+        """
+        payload = payload or {}
+        task_uuid = payload.get('uuid')
+        mark = payload.get('mark')
+        output = await run_blocking(self.__shell_task_service.tail_run, task_uuid, mark, payload.get('size', 65536))
+        await self.websocket_send_json({
+            'action': 'task:tail_run',
+            'data': {
+                'uuid': task_uuid,
+                'mark': mark,
+                'output': output
+            }
+        })
 
     @logger.catch
     async def _execute_shell(self, data):
@@ -261,9 +455,10 @@ class WebSocket:
             data.get('task_uuid'),
             data.get('base_path'),
             data.get("shell"),
+            data.get("limits"),
         )
 
-    @logger.catch
+    @logger.catch(exclude=ExecutorBusyError)
     async def _download_files(self, data):
         """下载文件"""
         if self.__config().get("safe").get("download_file") is False:
@@ -271,25 +466,115 @@ class WebSocket:
         task_id = data.get('task')
         save_path = data.get('save_path')
         save_path = save_path if save_path else os.path.join(os.getcwd(), 'data/download')
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
+        await run_blocking(os.makedirs, save_path, exist_ok=True)
         for file in data.get('files'):
             if not task_id or not file:
                 logger.warning("参数不完整")
                 return
             await self.__download_file_service.download_file(task_id, file, save_path, True, file)
 
-    @logger.catch
     async def websocket_send_json(self, data: dict):
+        """发送消息(在事件循环内调用)"""
+        self.__enqueue(data)
+
+    def send_json_nowait(self, data: dict, on_sent=None):
+        """
+        发送消息(线程安全，不阻塞)
+        可在任意线程中调用，消息交由事件循环中的发送协程统一发送
+        :param on_sent: 消息写入 WebSocket 后在事件循环中调用，消息被丢弃时不会调用
+        """
+        self.__put_nowait(data, on_sent)
+
+    def send_bytes_nowait(self, data: bytes, on_sent=None):
+        """发送二进制帧(线程安全，不阻塞)"""
+        self.__put_nowait(data, on_sent)
+
+    def __put_nowait(self, data: dict | bytes, on_sent=None):
+        if self.__loop is None:
+            return
         try:
-            # logger.debug(f"send: {data}")
-            await self.__ws.send_str(json.dumps(data))
-        except ConnectionResetError as e:
-            logger.error(e)
-            self.__scheduler.shutdown(wait=False)
-            await stop_get_process_list()
-            await self.__ws.close()
-            logger.info('Stop WebSocket...')
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.__loop:
+            self.__enqueue(data, on_sent)
+        else:
+            try:
+                self.__loop.call_soon_threadsafe(self.__enqueue, data, on_sent)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    def __enqueue(self, data: dict | bytes, on_sent=None):
+        """将消息放入发送队列(仅在事件循环线程中调用)"""
+        try:
+            self.__send_queue.put_nowait((data, on_sent))
+        except asyncio.QueueFull:
+            self.__send_dropped += 1
+            if self.__send_dropped % 1000 == 1:
+                logger.warning(f"发送队列已满，已丢弃 {self.__send_dropped} 条消息")
+
+    def __is_durable(self, data: dict | bytes) -> bool:
+        return isinstance(data, dict) and data.get('action') in self.DURABLE_ACTIONS
+
+    def __discard_stale(self):
+        """连接断开后丢弃发送队列中的非持久消息(仅在事件循环线程中调用)"""
+        if self.__send_queue is None:
+            return
+        if self.__in_flight is not None and not self.__is_durable(self.__in_flight[0]):
+            self.__in_flight = None
+        kept = []
+        discarded = 0
+        while not self.__send_queue.empty():
+            item = self.__send_queue.get_nowait()
+            if self.__is_durable(item[0]):
+                kept.append(item)
+            else:
+                discarded += 1
+        for item in kept:
+            self.__send_queue.put_nowait(item)
+        if discarded:
+            logger.debug(f"连接已断开，丢弃 {discarded} 条未发送的消息")
+
+    async def __send_handler(self, ws: ClientWebSocketResponse):
+        """
+        发送协程：从发送队列中取出消息并写入 WebSocket
+
+        连接断开或发送协程被取消时，正在发送的消息不会丢失，保留到下一个连接最先发送(可能重复发送一次)，
+        其中的非持久消息随断开时的清理一起丢弃。
+        """
+        while not ws.closed:
+            if self.__in_flight is None:
+                self.__in_flight = await self.__send_queue.get()
+            data, on_sent = self.__in_flight
+            try:
+                # logger.debug(f"send: {data}")
+                if isinstance(data, bytes):
+                    await ws.send_bytes(data)
+                else:
+                    await ws.send_str(json.dumps(data))
+            except ConnectionResetError as e:
+                logger.error(e)
+                self.__connected = False
+                await stop_get_process_list()
+                await ws.close()
+                logger.info('Stop WebSocket...')
+                return
+            except Exception as e:
+                if ws.closed:
+                    return
+                logger.error(f"Send WebSocket Message Error: {e}")
+            else:
+                if on_sent is not None:
+                    try:
+                        on_sent()
+                    except Exception as e:
+                        logger.error(f"Send WebSocket Message Callback Error: {e}")
+            self.__in_flight = None
+
+    def is_connected(self) -> bool:
+        """连接是否已就绪(已收到节点配置)"""
+        return self.__connected and self.__ws is not None and not self.__ws.closed
 
     @logger.catch
     def get_base_data_save_path(self):